@@ -0,0 +1,437 @@
+"""Offline theme clustering and sentiment scoring of the free-text feedback.
+
+    python analytics.py               # analyse responses added since the last run
+    python analytics.py --rebuild     # forget the model and analyse everything again
+
+Responses are read in id order, in chunks, from just past the stored
+watermark. Each chunk is tokenised, hashed into a sparse term-count matrix
+and scored against a sentiment lexicon in a process pool. The parent
+process folds the chunk into a persisted theme model (TF-IDF weighting
+plus online spherical k-means) and upserts one row per response into
+fit5122_comment_analysis. At the end the watermark and the model are saved
+and fit5122_comment_themes is rewritten, all in one transaction.
+"""
+import argparse
+import io
+import json
+import logging
+import math
+import multiprocessing
+import os
+import re
+import time
+import zlib
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import partial
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import delete, func, insert, or_, select, text
+
+import database
+from database import (FIT5122AnalyticsState, FIT5122CommentAnalysis, FIT5122CommentTheme, FIT5122SurveyResponse,
+                      dialect_insert, env_int)
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_CHUNK_SIZE = env_int("ANALYTICS_CHUNK_SIZE", 5000)
+ANALYTICS_THEMES = env_int("ANALYTICS_THEMES", 12)
+# Hashed term columns; 2**16 keeps the persisted centroids to a few MB
+ANALYTICS_FEATURES = env_int("ANALYTICS_FEATURES", 2 ** 16)
+ANALYTICS_WORKERS = env_int("ANALYTICS_WORKERS", os.cpu_count() or 1)
+# Rows younger than this wait for the next run: ids are taken before commit, so
+# a lower id can still become visible after a higher one has been analysed
+ANALYTICS_SETTLE_SECONDS = env_int("ANALYTICS_SETTLE_SECONDS", 300)
+# Optional "word<TAB>score" file that extends or overrides the built-in lexicon
+ANALYTICS_LEXICON = os.getenv("ANALYTICS_LEXICON")
+
+STATE_NAME = "comments"
+# Advisory lock key that keeps two runs from interleaving (PostgreSQL)
+ANALYTICS_LOCK_KEY = 512202502
+TEXT_FIELDS = ("positive_aspects", "improvement_suggestions", "technical_issues", "additional_comments")
+
+TOKEN_PATTERN = re.compile(r"[a-z][a-z']+")
+STOPWORDS = frozenset("""
+    about after all also and any are because been before being but can could did does doing each for from
+    get got had has have having her here him his how its just more most much off once only other our out
+    over own same she should some such than that the their them then there these they this those through
+    too under until very was were what when where which while who why will with would you your into
+    it's i'm i've we're they're lab labs unit week weeks
+""".split())
+NEGATORS = frozenset("""
+    not no never nothing none neither nor cannot can't don't didn't doesn't isn't wasn't weren't aren't
+    won't wouldn't shouldn't couldn't hardly barely without lack lacked
+""".split())
+INTENSIFIERS = {"very": 1.5, "really": 1.5, "extremely": 2.0, "super": 1.5, "so": 1.3, "quite": 1.2,
+                "too": 1.2, "slightly": 0.6, "somewhat": 0.7, "bit": 0.7}
+LEXICON = {
+    # Positive
+    "good": 1.0, "great": 2.0, "excellent": 2.5, "amazing": 2.5, "awesome": 2.0, "fantastic": 2.5,
+    "perfect": 2.0, "best": 2.0, "helpful": 1.5, "useful": 1.5, "clear": 1.5, "engaging": 1.5,
+    "interesting": 1.5, "enjoy": 1.5, "enjoyed": 1.5, "enjoyable": 1.5, "love": 2.0, "loved": 2.0,
+    "like": 0.8, "liked": 1.0, "fun": 1.5, "supportive": 1.5, "organised": 1.0, "organized": 1.0,
+    "fair": 1.0, "easy": 1.0, "informative": 1.5, "responsive": 1.0, "friendly": 1.5, "patient": 1.0,
+    "thorough": 1.0, "practical": 1.0, "relevant": 1.0, "improved": 1.0, "happy": 1.5, "thanks": 1.0,
+    "thank": 1.0, "appreciate": 1.5, "appreciated": 1.5, "recommend": 1.5, "knowledgeable": 1.5,
+    "approachable": 1.5, "well": 0.5, "nice": 1.0, "valuable": 1.5, "smooth": 1.0, "fast": 0.5,
+    # Negative
+    "bad": -1.5, "poor": -1.5, "terrible": -2.5, "awful": -2.5, "worst": -2.5, "hate": -2.5,
+    "confusing": -1.5, "confused": -1.5, "unclear": -1.5, "vague": -1.5, "difficult": -1.0,
+    "hard": -0.5, "boring": -1.5, "slow": -1.0, "late": -1.0, "unfair": -2.0, "useless": -2.0,
+    "unhelpful": -2.0, "broken": -1.5, "crash": -1.5, "crashed": -1.5, "crashes": -1.5,
+    "crashing": -1.5, "bug": -1.0, "bugs": -1.0, "buggy": -1.5, "error": -1.0, "errors": -1.0,
+    "issue": -0.5, "issues": -0.5, "problem": -1.0, "problems": -1.0, "frustrating": -2.0,
+    "frustrated": -2.0, "stressful": -1.5, "overwhelming": -1.5, "rushed": -1.5,
+    "disorganised": -2.0, "disorganized": -2.0, "inconsistent": -1.5, "missing": -1.0, "lag": -1.0,
+    "laggy": -1.5, "noisy": -1.0, "cold": -0.5, "fail": -1.5, "failed": -1.5, "disappointing": -2.0,
+    "disappointed": -2.0, "waste": -2.0, "outdated": -1.5, "dropped": -1.0, "annoying": -1.5,
+}
+
+
+def load_lexicon(path):
+    lexicon = dict(LEXICON)
+    if path:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                word, _, score = line.strip().partition("\t")
+                if word and score and not word.startswith("#"):
+                    lexicon[word.lower()] = float(score)
+    return lexicon
+
+
+lexicon = load_lexicon(ANALYTICS_LEXICON)
+
+
+def sentiment(tokens):
+    """Lexicon score in (-1, 1), or None when no word carries sentiment.
+
+    A negator flips (and damps) the next three words; an intensifier scales
+    the next one. The sum is squashed like VADER's compound score.
+    """
+    total, scored, negated, boost = 0.0, False, 0, 1.0
+    for token in tokens:
+        if token in NEGATORS:
+            negated = 3
+            continue
+        if token in INTENSIFIERS:
+            boost = INTENSIFIERS[token]
+            continue
+        value = lexicon.get(token)
+        if value is not None:
+            total += value * boost * (-0.75 if negated else 1.0)
+            scored = True
+        boost = 1.0
+        if negated:
+            negated -= 1
+    if not scored:
+        return None
+    return total / math.sqrt(total * total + 15)
+
+
+def term_bucket(token, n_features):
+    # crc32 rather than hash(): string hashes differ between processes
+    return zlib.crc32(token.encode()) % n_features
+
+
+def analyse_chunk(rows, n_features=ANALYTICS_FEATURES):
+    """Tokenise, hash and score one chunk of (id, *text fields) rows. Runs in the pool.
+
+    Returns (ids, term counts as a CSR matrix, sentiments, token counts,
+    {bucket: a token that hashed to it}).
+    """
+    ids, sentiments, token_counts, names = [], [], [], {}
+    indptr, indices, data = [0], [], []
+    # Feedback reuses a small vocabulary, so each distinct token is hashed once per chunk
+    buckets = {}
+    for row in rows:
+        tokens = TOKEN_PATTERN.findall(" ".join(value for value in row[1:] if value).lower())
+        counts = {}
+        for token, count in Counter(tokens).items():
+            bucket = buckets.get(token)
+            if bucket is None:
+                if len(token) < 3 or token in STOPWORDS or token in NEGATORS:
+                    bucket = buckets[token] = -1
+                else:
+                    bucket = buckets[token] = term_bucket(token, n_features)
+                    names.setdefault(bucket, token)
+            if bucket >= 0:
+                counts[bucket] = counts.get(bucket, 0) + count
+        indices.extend(counts)
+        data.extend(counts.values())
+        indptr.append(len(indices))
+        ids.append(row[0])
+        sentiments.append(sentiment(tokens))
+        token_counts.append(len(tokens))
+    matrix = sparse.csr_matrix(
+        (np.array(data, dtype=np.float32), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+        shape=(len(rows), n_features),
+    )
+    return ids, matrix, sentiments, token_counts, names
+
+
+class ThemeModel:
+    """Online spherical k-means over L2-normalised TF-IDF vectors of hashed terms.
+
+    Document frequencies, centroids and per-theme counts are persisted, so a
+    run only folds in the new responses: each chunk is assigned to the
+    nearest centroids, which then move towards it (mini-batch k-means with
+    a per-theme learning rate of 1 / documents seen).
+    """
+
+    def __init__(self, themes=ANALYTICS_THEMES, n_features=ANALYTICS_FEATURES):
+        self.themes = themes
+        self.n_features = n_features
+        self.df = np.zeros(n_features, dtype=np.int64)
+        self.docs = 0
+        self.centroids = None
+        self.counts = np.zeros(themes, dtype=np.int64)
+        self.names = {}
+
+    def observe(self, counts, names):
+        # Each row holds a bucket at most once, so bincount of the indices is a document frequency
+        self.df += np.bincount(counts.indices, minlength=self.n_features)
+        self.docs += int(np.count_nonzero(np.diff(counts.indptr)))
+        for bucket, token in names.items():
+            self.names.setdefault(bucket, token)
+
+    def vectorise(self, counts):
+        idf = (np.log((1 + self.docs) / (1 + self.df)) + 1).astype(np.float32)
+        weighted = counts.multiply(idf).tocsr()
+        norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        return sparse.diags(1 / norms) @ weighted
+
+    def initialise(self, vectors, seed=5122, iterations=10):
+        """k-means++ seeding and a few Lloyd iterations on the first chunk."""
+        rng = np.random.default_rng(seed)
+        rows = vectors[np.diff(vectors.indptr) > 0]
+        chosen = [int(rng.integers(rows.shape[0]))]
+        distance = 1 - (rows @ rows[chosen[0]].T).toarray().ravel()
+        for _ in range(1, self.themes):
+            weights = np.clip(distance, 0, None) ** 2
+            total = weights.sum()
+            pick = int(rng.choice(rows.shape[0], p=weights / total)) if total > 0 else int(rng.integers(rows.shape[0]))
+            chosen.append(pick)
+            distance = np.minimum(distance, 1 - (rows @ rows[pick].T).toarray().ravel())
+        self.centroids = rows[chosen].toarray().astype(np.float32)
+        for _ in range(iterations):
+            assigned = self.assign(rows)
+            self.centroids = self._normalise(self._sums(rows, assigned), fallback=self.centroids)
+
+    def assign(self, vectors):
+        """Nearest theme per row by cosine similarity; -1 for rows without terms."""
+        similarity = np.asarray(vectors @ self.centroids.T)
+        assigned = similarity.argmax(axis=1)
+        assigned[np.diff(vectors.indptr) == 0] = -1
+        return assigned
+
+    def fit_batch(self, vectors, assigned):
+        sums = self._sums(vectors, assigned)
+        batch = np.bincount(assigned[assigned >= 0], minlength=self.themes)
+        seen = self.counts + batch
+        moved = batch > 0
+        self.centroids[moved] = (
+            self.centroids[moved] * (self.counts[moved] / seen[moved])[:, None] + sums[moved] / seen[moved][:, None]
+        )
+        self.centroids = self._normalise(self.centroids, fallback=self.centroids)
+        self.counts = seen
+
+    def _sums(self, vectors, assigned):
+        valid = np.flatnonzero(assigned >= 0)
+        membership = sparse.csr_matrix(
+            (np.ones(len(valid), dtype=np.float32), (assigned[valid], valid)), shape=(self.themes, vectors.shape[0])
+        )
+        return (membership @ vectors).toarray()
+
+    @staticmethod
+    def _normalise(matrix, fallback):
+        norms = np.linalg.norm(matrix, axis=1)
+        # A theme that attracted nothing keeps its previous centroid
+        return np.where(norms[:, None] > 0, matrix / np.where(norms > 0, norms, 1)[:, None], fallback).astype(np.float32)
+
+    def top_terms(self, theme, n=10):
+        weights = self.centroids[theme]
+        top = np.argsort(weights)[::-1][:n]
+        return [self.names.get(int(bucket), f"#{bucket}") for bucket in top if weights[bucket] > 0]
+
+    def to_bytes(self):
+        buffer = io.BytesIO()
+        buckets = np.fromiter(self.names, dtype=np.int64, count=len(self.names))
+        np.savez_compressed(
+            buffer, df=self.df, docs=np.int64(self.docs), counts=self.counts,
+            centroids=self.centroids if self.centroids is not None else np.zeros((0, self.n_features), np.float32),
+            buckets=buckets, tokens=np.array([self.names[int(b)] for b in buckets], dtype=str),
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, blob):
+        saved = np.load(io.BytesIO(blob))
+        model = cls(themes=len(saved["counts"]), n_features=len(saved["df"]))
+        model.df = saved["df"]
+        model.docs = int(saved["docs"])
+        model.counts = saved["counts"]
+        model.centroids = saved["centroids"] if len(saved["centroids"]) else None
+        model.names = dict(zip(saved["buckets"].tolist(), saved["tokens"].tolist()))
+        return model
+
+
+def source_query(cutoff):
+    table = FIT5122SurveyResponse.__table__
+    columns = [table.c[field] for field in TEXT_FIELDS]
+    return (
+        select(table.c.id, *columns)
+        .where(table.c.timestamp < cutoff, or_(*(column.isnot(None) for column in columns)))
+        .order_by(table.c.id)
+    )
+
+
+def read_chunks(engine, query, after, chunk_size):
+    """Keyset pagination on id: every chunk is a short, separate read."""
+    id_column = FIT5122SurveyResponse.__table__.c.id
+    while True:
+        with engine.connect() as conn:
+            rows = conn.execute(query.where(id_column > after).limit(chunk_size)).all()
+        if not rows:
+            return
+        after = rows[-1][0]
+        yield [tuple(row) for row in rows]
+
+
+def map_ordered(function, chunks, workers):
+    """function(chunk) for every chunk, in order, on a process pool with a bounded backlog."""
+    if workers <= 1:
+        yield from map(function, chunks)
+        return
+    # spawn: the parent holds open database connections that a fork would share
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(function, chunk))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def save_results(engine, ids, assigned, sentiments, token_counts):
+    stmt = dialect_insert(engine.dialect.name)(FIT5122CommentAnalysis)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["response_id"],
+        set_={"theme": stmt.excluded.theme, "sentiment": stmt.excluded.sentiment,
+              "tokens": stmt.excluded.tokens, "analysed_at": func.now()},
+    )
+    params = [
+        {"response_id": response_id, "theme": int(theme) if theme is not None and theme >= 0 else None,
+         "sentiment": score, "tokens": tokens}
+        for response_id, theme, score, tokens in zip(ids, assigned, sentiments, token_counts)
+    ]
+    with engine.begin() as conn:
+        conn.execute(stmt, params)
+
+
+def save_state(engine, model, watermark):
+    """Watermark, model and theme summaries, committed together."""
+    analysis = FIT5122CommentAnalysis.__table__
+    with engine.begin() as conn:
+        conn.execute(delete(FIT5122AnalyticsState).where(FIT5122AnalyticsState.name == STATE_NAME))
+        conn.execute(insert(FIT5122AnalyticsState), {
+            "name": STATE_NAME, "watermark": watermark, "model": model.to_bytes(),
+        })
+        conn.execute(delete(FIT5122CommentTheme))
+        if model.centroids is None:
+            return
+        summaries = conn.execute(
+            select(analysis.c.theme, func.count(), func.avg(analysis.c.sentiment))
+            .where(analysis.c.theme.isnot(None))
+            .group_by(analysis.c.theme)
+        ).all()
+        if summaries:
+            conn.execute(insert(FIT5122CommentTheme), [
+                {"theme": theme, "size": size, "mean_sentiment": mean, "top_terms": model.top_terms(theme)}
+                for theme, size, mean in summaries
+            ])
+
+
+def run(engine, chunk_size=ANALYTICS_CHUNK_SIZE, workers=ANALYTICS_WORKERS, themes=ANALYTICS_THEMES,
+        rebuild=False):
+    """Analyse the responses added since the last run; returns a summary, or None if a run is in progress."""
+    with engine.connect() as lock:
+        if engine.dialect.name == "postgresql":
+            if not lock.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": ANALYTICS_LOCK_KEY}).scalar():
+                logger.warning("Another analytics run holds the lock; skipping")
+                return None
+        try:
+            return _run(engine, chunk_size, workers, themes, rebuild)
+        finally:
+            if engine.dialect.name == "postgresql":
+                lock.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ANALYTICS_LOCK_KEY})
+                lock.commit()
+
+
+def _run(engine, chunk_size, workers, themes, rebuild):
+    started = time.perf_counter()
+    if rebuild:
+        with engine.begin() as conn:
+            conn.execute(delete(FIT5122CommentAnalysis))
+            conn.execute(delete(FIT5122CommentTheme))
+            conn.execute(delete(FIT5122AnalyticsState))
+
+    with engine.connect() as conn:
+        state = conn.execute(
+            select(FIT5122AnalyticsState.watermark, FIT5122AnalyticsState.model)
+            .where(FIT5122AnalyticsState.name == STATE_NAME)
+        ).first()
+    watermark = state.watermark if state else 0
+    # A saved model keeps its own theme count and feature space; --rebuild to change them
+    model = ThemeModel.from_bytes(state.model) if state and state.model else ThemeModel(themes, ANALYTICS_FEATURES)
+
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=ANALYTICS_SETTLE_SECONDS)
+    chunks = read_chunks(engine, source_query(cutoff), watermark, chunk_size)
+    processed = 0
+    new_watermark = watermark
+    for ids, counts, sentiments, token_counts, names in map_ordered(
+        partial(analyse_chunk, n_features=model.n_features), chunks, workers
+    ):
+        model.observe(counts, names)
+        vectors = model.vectorise(counts)
+        if model.centroids is None and np.count_nonzero(np.diff(vectors.indptr)) >= model.themes:
+            model.initialise(vectors)
+        if model.centroids is None:
+            # Too little text to form the themes yet: store the sentiment, and leave
+            # the watermark here so these rows are clustered once there is more
+            save_results(engine, ids, [None] * len(ids), sentiments, token_counts)
+            processed += len(ids)
+            continue
+        assigned = model.assign(vectors)
+        model.fit_batch(vectors, assigned)
+        save_results(engine, ids, assigned, sentiments, token_counts)
+        processed += len(ids)
+        new_watermark = ids[-1]
+        logger.info("Analysed responses up to id %d", new_watermark)
+
+    if model.centroids is None:
+        # Nothing was clustered, so the document frequencies must not count these rows twice
+        model = ThemeModel(model.themes, model.n_features)
+    save_state(engine, model, new_watermark)
+    return {
+        "processed": processed,
+        "watermark": new_watermark,
+        "themes": model.themes if model.centroids is not None else 0,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Comment themes and sentiment (incremental)")
+    parser.add_argument("--rebuild", action="store_true", help="discard the model and results and start over")
+    parser.add_argument("--chunk-size", type=int, default=ANALYTICS_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=ANALYTICS_WORKERS)
+    parser.add_argument("--themes", type=int, default=ANALYTICS_THEMES, help="themes for a new model")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    summary = run(database.get_engine(), args.chunk_size, args.workers, args.themes, args.rebuild)
+    if summary is not None:
+        print(json.dumps(summary))
@@ -0,0 +1,70 @@
+import functools
+import json
+import os
+import stat
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.staticfiles import StaticFiles
+
+from database import env_int
+from pages import parse_accept_encoding
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+# Sources in assets/, build output (committed, so deploys need no toolchain) in static/
+ASSETS_DIR = os.path.join(APP_DIR, "assets")
+STATIC_DIR = os.path.join(APP_DIR, "static")
+STATIC_URL = "/static"
+MANIFEST_FILE = os.path.join(STATIC_DIR, "manifest.json")
+# Built file names carry a content hash, so browsers may keep them for good
+ASSET_MAX_AGE = env_int("ASSET_MAX_AGE", 365 * 24 * 3600)
+
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+@functools.lru_cache(maxsize=None)
+def load_manifest():
+    """{"app.css": "app.<hash>.css", ...} as written by build_assets.py."""
+    try:
+        with open(MANIFEST_FILE) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise RuntimeError(f"{MANIFEST_FILE} is missing; run python build_assets.py") from None
+
+
+def asset_url(name):
+    return f"{STATIC_URL}/{load_manifest()[name]}"
+
+
+class StaticAssets(StaticFiles):
+    """StaticFiles that serves the build's precompressed variants, cached as immutable.
+
+    A request for app.<hash>.css from a client accepting brotli gets
+    app.<hash>.css.br as is, with Content-Encoding set; nothing is
+    compressed per request.
+    """
+
+    def __init__(self, directory=STATIC_DIR, max_age=ASSET_MAX_AGE, **kwargs):
+        super().__init__(directory=directory, **kwargs)
+        self.cache_control = f"public, max-age={max_age}, immutable"
+
+    async def get_response(self, path, scope):
+        response = None
+        accept_encoding = Headers(scope=scope).get("accept-encoding")
+        if accept_encoding and scope["method"] in ("GET", "HEAD"):
+            accepted = parse_accept_encoding(accept_encoding)
+            for encoding, suffix in ENCODINGS:
+                if encoding not in accepted and "*" not in accepted:
+                    continue
+                full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+                if stat_result and stat.S_ISREG(stat_result.st_mode):
+                    # The media type is guessed from the name without the suffix
+                    response = self.file_response(full_path, stat_result, scope)
+                    if response.status_code == 200:
+                        response.headers["Content-Encoding"] = encoding
+                    break
+        if response is None:
+            response = await super().get_response(path, scope)
+        response.headers["Cache-Control"] = self.cache_control
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
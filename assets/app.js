@@ -0,0 +1,118 @@
+// Page behaviour for the survey forms; built into static/ by build_assets.py
+
+// Highlight the chosen option of a 1-5 rating question
+document.addEventListener('change', function (event) {
+    const radio = event.target;
+    const group = radio.closest('.rating-group');
+    if (radio.type !== 'radio' || !group) {
+        return;
+    }
+    group.querySelectorAll('.rating-option').forEach(option => {
+        option.classList.remove('rating-selected');
+    });
+    radio.nextElementSibling.classList.add('rating-selected');
+});
+
+document.addEventListener('DOMContentLoaded', function () {
+    // The server's dedup nonce; randomUUID needs HTTPS, getRandomValues does not
+    const submissionId = document.getElementById('submission_id');
+    if (submissionId && window.crypto && crypto.randomUUID) {
+        submissionId.value = crypto.randomUUID();
+    } else if (submissionId && window.crypto && crypto.getRandomValues) {
+        submissionId.value = Array.from(
+            crypto.getRandomValues(new Uint8Array(16)), b => b.toString(16).padStart(2, '0')).join('');
+    }
+
+    // Ratings restored by the browser (back button, form autofill)
+    document.querySelectorAll('.rating-group input[type="radio"]:checked').forEach(radio => {
+        radio.nextElementSibling.classList.add('rating-selected');
+    });
+
+    // Disable the button once the form is sent
+    document.querySelectorAll('form[data-submit-once]').forEach(form => {
+        form.addEventListener('submit', function () {
+            const submitBtn = this.querySelector('button[type="submit"]');
+            submitBtn.disabled = true;
+            submitBtn.innerHTML = 'Submitting...';
+            submitBtn.classList.remove('hover:scale-105', 'hover:bg-blue-700');
+        });
+    });
+});
+
+// Timing beacon for forms with data-beacon: page load, time to the first
+// answer, time spent on each field and whether the survey was completed.
+// Sent once: when the page is left unsubmitted, or, after a submit, by the
+// page the response leads to, so a submission the server turns down
+// (422, 503) is not counted as completed. Only a page marked
+// data-beacon-completed (the thank-you page) counts it as completed.
+const PENDING_BEACON = 'pendingBeacon';
+
+document.addEventListener('DOMContentLoaded', function () {
+    let pending = null;
+    try {
+        pending = JSON.parse(sessionStorage.getItem(PENDING_BEACON));
+        sessionStorage.removeItem(PENDING_BEACON);
+    } catch (error) {
+        return;
+    }
+    if (pending && navigator.sendBeacon) {
+        pending.beacon.completed = document.querySelector('[data-beacon-completed]') !== null;
+        navigator.sendBeacon(pending.url, new Blob([JSON.stringify(pending.beacon)], {type: 'text/plain'}));
+    }
+});
+
+document.addEventListener('DOMContentLoaded', function () {
+    const form = document.querySelector('form[data-beacon]');
+    if (!form || !navigator.sendBeacon) {
+        return;
+    }
+    const dwell = {};
+    let firstAnswer = null;
+    let lastAnswer = null;
+    let lastField = null;
+    let sent = false;
+
+    form.addEventListener('change', function (event) {
+        const field = event.target.name;
+        if (!field || field === 'submission_id') {
+            return;
+        }
+        const now = performance.now();
+        if (firstAnswer === null) {
+            firstAnswer = now;
+        }
+        // Time since the previous answer (or since the page started) counts towards this field
+        dwell[field] = Math.round((dwell[field] || 0) + now - (lastAnswer === null ? 0 : lastAnswer));
+        lastAnswer = now;
+        lastField = field;
+    });
+
+    function collect() {
+        const navigation = performance.getEntriesByType ? performance.getEntriesByType('navigation')[0] : null;
+        return {
+            load_ms: navigation ? Math.round(navigation.loadEventEnd || navigation.domContentLoadedEventEnd) : null,
+            first_answer_ms: firstAnswer === null ? null : Math.round(firstAnswer),
+            total_ms: Math.round(performance.now()),
+            dwell: dwell,
+            completed: false,
+            last_field: lastField,
+        };
+    }
+
+    form.addEventListener('submit', function () {
+        // Left for the next page to send, once the outcome of the submission is known
+        try {
+            sessionStorage.setItem(PENDING_BEACON, JSON.stringify({url: form.dataset.beacon, beacon: collect()}));
+            sent = true;
+        } catch (error) {
+            // No storage: sent on pagehide, as not completed
+        }
+    });
+    window.addEventListener('pagehide', function () {
+        if (sent) {
+            return;
+        }
+        sent = true;
+        navigator.sendBeacon(form.dataset.beacon, new Blob([JSON.stringify(collect())], {type: 'text/plain'}));
+    });
+});
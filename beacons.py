@@ -0,0 +1,209 @@
+import asyncio
+import json
+import logging
+import math
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select
+
+import database
+from database import FIT5122BeaconHistogram, dialect_insert, env_int, new_session
+from metrics import BEACONS
+from schemas import SurveySubmission
+
+logger = logging.getLogger(__name__)
+
+# Aggregated counts are added to the table this often
+BEACON_FLUSH_SECONDS = env_int("BEACON_FLUSH_SECONDS", 15)
+# Larger bodies are refused unread; a full beacon is a few hundred bytes
+BEACON_MAX_BYTES = env_int("BEACON_MAX_BYTES", 4096)
+
+# Upper bounds (ms) of the duration buckets; the last bucket takes everything longer
+BUCKET_BOUNDS_MS = (100, 250, 500, 1000, 2500, 5000, 10000, 20000, 30000, 60000, 120000, 300000, 600000)
+# Durations past this are clock trouble, not people, and are dropped
+MAX_DURATION_MS = 24 * 3600 * 1000
+
+# Form fields in page order; dwell is accepted for these only, so the set of metrics is fixed
+FIELDS = tuple(name for name in SurveySubmission.model_fields if name != "submission_id")
+DURATIONS = {"load_ms": "page_load", "first_answer_ms": "first_answer", "total_ms": "time_on_page"}
+# Categorical metrics: bucket 0/1 for outcome; for abandoned_after, the 1-based
+# position in FIELDS of the last field answered (0: left without answering)
+OUTCOME = "outcome"
+ABANDONED_AFTER = "abandoned_after"
+
+
+class InvalidBeacon(ValueError):
+    pass
+
+
+def duration_bucket(ms):
+    return bisect_left(BUCKET_BOUNDS_MS, ms)
+
+
+def valid_duration(value):
+    # bool is an int; true/false are not durations
+    return (isinstance(value, (int, float)) and not isinstance(value, bool)
+            and math.isfinite(value) and 0 <= value <= MAX_DURATION_MS)
+
+
+def parse_beacon(body):
+    """(metric, bucket) pairs of one beacon; InvalidBeacon if it isn't one.
+
+    A beacon is a JSON object: load_ms, first_answer_ms and total_ms,
+    dwell ({field: ms}), completed (bool) and last_field. Values out of
+    range or fields not on the form are skipped rather than failing it.
+    """
+    try:
+        beacon = json.loads(body)
+    except ValueError as e:
+        raise InvalidBeacon(f"not JSON: {e}")
+    if not isinstance(beacon, dict):
+        raise InvalidBeacon("not a JSON object")
+
+    observations = []
+    for key, metric in DURATIONS.items():
+        value = beacon.get(key)
+        if valid_duration(value):
+            observations.append((metric, duration_bucket(value)))
+    dwell = beacon.get("dwell")
+    if isinstance(dwell, dict):
+        for field in FIELDS:
+            value = dwell.get(field)
+            if valid_duration(value):
+                observations.append((f"dwell:{field}", duration_bucket(value)))
+    completed = beacon.get("completed") is True
+    observations.append((OUTCOME, 1 if completed else 0))
+    if not completed:
+        last_field = beacon.get("last_field")
+        observations.append((ABANDONED_AFTER, FIELDS.index(last_field) + 1 if last_field in FIELDS else 0))
+    return observations
+
+
+class BeaconStats:
+    """Counts of client timing beacons, aggregated in memory and flushed in bulk.
+
+    record() only increments counters in a dict whose keys are drawn from a
+    fixed set of metrics and buckets, so memory stays bounded whatever the
+    beacon rate. Every ``flush_interval`` seconds the counts are swapped
+    out and added to the current hour's rows of fit5122_beacon_histograms
+    in one upsert; if that fails they are merged back for the next flush.
+    """
+
+    def __init__(self, flush_interval=BEACON_FLUSH_SECONDS):
+        self.flush_interval = flush_interval
+        self.counts = {}
+        self.task = None
+
+    def record(self, observations):
+        counts = self.counts
+        for key in observations:
+            counts[key] = counts.get(key, 0) + 1
+
+    async def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        if not self.counts:
+            return 0
+        counts, self.counts = self.counts, {}
+        period = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        table = FIT5122BeaconHistogram.__table__
+        stmt = dialect_insert(database.DB_BACKEND)(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["period_start", "metric", "bucket"],
+            set_={"count": table.c.count + stmt.excluded.count},
+        )
+        # Sorted so concurrent flushes from several workers lock rows in the same order
+        params = [{"period_start": period, "metric": metric, "bucket": bucket, "count": count}
+                  for (metric, bucket), count in sorted(counts.items())]
+        db = new_session()
+        try:
+            await db.execute(stmt, params)
+            await db.commit()
+        except Exception as e:
+            logger.warning("Beacon flush failed, keeping the counts for the next one: %s", e)
+            for key, count in counts.items():
+                self.counts[key] = self.counts.get(key, 0) + count
+            return 0
+        finally:
+            await db.close()
+        return len(params)
+
+
+def percentile(histogram, fraction):
+    """Upper bound (ms) of the bucket holding the given fraction of observations; None past the last bound."""
+    total = sum(histogram)
+    if not total:
+        return None
+    seen = 0
+    for bucket, count in enumerate(histogram):
+        seen += count
+        if seen >= fraction * total:
+            return BUCKET_BOUNDS_MS[bucket] if bucket < len(BUCKET_BOUNDS_MS) else None
+    return None
+
+
+async def beacon_summary(db, hours):
+    """Beacon analytics for the last ``hours`` hours, from the hourly rows."""
+    since = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0) - timedelta(hours=hours - 1)
+    table = FIT5122BeaconHistogram.__table__
+    result = await db.execute(
+        select(table.c.metric, table.c.bucket, func.sum(table.c.count))
+        .where(table.c.period_start >= since)
+        .group_by(table.c.metric, table.c.bucket)
+    )
+    histograms = {}
+    for metric, bucket, count in result.all():
+        size = {OUTCOME: 2, ABANDONED_AFTER: len(FIELDS) + 1}.get(metric, len(BUCKET_BOUNDS_MS) + 1)
+        if 0 <= bucket < size:
+            histograms.setdefault(metric, [0] * size)[bucket] += int(count)
+
+    outcome = histograms.pop(OUTCOME, [0, 0])
+    abandoned_after = histograms.pop(ABANDONED_AFTER, [0] * (len(FIELDS) + 1))
+    sessions = sum(outcome)
+    return {
+        "hours": hours,
+        "bucket_bounds_ms": list(BUCKET_BOUNDS_MS),
+        "sessions": sessions,
+        "completed": outcome[1],
+        "abandoned": outcome[0],
+        "abandonment_rate": round(outcome[0] / sessions, 4) if sessions else None,
+        "abandoned_after": dict(zip(("none",) + FIELDS, abandoned_after)),
+        "timings": {
+            metric: {"count": sum(histogram), "p50_ms": percentile(histogram, 0.5),
+                     "p90_ms": percentile(histogram, 0.9), "histogram": histogram}
+            for metric, histogram in sorted(histograms.items())
+        },
+    }
+
+
+beacon_stats = BeaconStats()
+
+
+def record_beacon(body):
+    """Record one beacon body; returns False if it was not a beacon."""
+    try:
+        observations = parse_beacon(body)
+    except InvalidBeacon:
+        BEACONS.labels("invalid").inc()
+        return False
+    beacon_stats.record(observations)
+    BEACONS.labels("accepted").inc()
+    return True
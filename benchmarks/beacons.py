@@ -0,0 +1,211 @@
+"""Beacon benchmark: /beacon throughput, and its effect on survey submissions.
+
+Starts the app from --app-dir under uvicorn (one worker, fresh SQLite
+database) and sends beacons over --connections keep-alive connections
+for --seconds as fast as the server takes them, recording beacons per
+second and their latency. Survey submissions are timed on their own,
+during that saturating load, and during a steady --rate beacons per
+second, to show what beacons cost the submission path. Results are
+appended to benchmarks/results/beacons.json:
+
+    python benchmarks/beacons.py --connections 50 --label "in-memory aggregation"
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+from datetime import datetime, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS_FILE = os.path.join(HERE, "results", "beacons.json")
+
+BEACON = json.dumps({
+    "load_ms": 820, "first_answer_ms": 4100, "total_ms": 61000, "completed": False,
+    "last_field": "teaching_effectiveness",
+    "dwell": {"participated_fully": 4100, "lab_session": 3000, "unit_content_quality": 5200,
+              "teaching_effectiveness": 2500},
+}).encode()
+FORM = urllib.parse.urlencode({
+    "participated_fully": "true", "unit_content_quality": "4", "overall_experience": "5", "consent_given": "on",
+}).encode()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection, as a browser would reuse for beacons."""
+
+    def __init__(self, port):
+        self.port = port
+        self.reader = self.writer = None
+
+    async def post(self, path, body, content_type):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection("127.0.0.1", self.port)
+        self.writer.write(
+            f"POST {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+        )
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        length = 0
+        for line in head.split(b"\r\n"):
+            if line.lower().startswith(b"content-length:"):
+                length = int(line.split(b":", 1)[1])
+        if length:
+            await self.reader.readexactly(length)
+        if b"connection: close" in head.lower():
+            self.writer.close()
+            self.writer = None
+        return int(head.split(b" ", 2)[1])
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+async def beacon_load(port, connections, seconds, latencies, statuses, rate=0):
+    """Beacons over keep-alive connections; unpaced when rate is 0, else rate per second in total."""
+    deadline = time.perf_counter() + seconds
+    interval = connections / rate if rate else 0
+
+    async def worker():
+        connection = Connection(port)
+        try:
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                status = await connection.post("/beacon", BEACON, "text/plain")
+                latencies.append(time.perf_counter() - started)
+                statuses[status] = statuses.get(status, 0) + 1
+                if interval:
+                    await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
+        finally:
+            connection.close()
+
+    await asyncio.gather(*(worker() for _ in range(connections)))
+
+
+async def submissions(port, count):
+    connection = Connection(port)
+    samples = []
+    try:
+        for _ in range(count):
+            started = time.perf_counter()
+            await connection.post("/submit-survey", FORM, "application/x-www-form-urlencoded")
+            samples.append(time.perf_counter() - started)
+            await asyncio.sleep(0.02)
+    finally:
+        connection.close()
+    return round(statistics.median(samples) * 1e3, 2)
+
+
+async def measure(port, connections, seconds, submits, rate):
+    alone = await submissions(port, submits)
+    latencies, statuses = [], {}
+    load = asyncio.create_task(beacon_load(port, connections, seconds, latencies, statuses))
+    await asyncio.sleep(0.5)
+    saturated = await submissions(port, submits)
+    await load
+    latencies.sort()
+    paced_latencies, paced_statuses = [], {}
+    load = asyncio.create_task(beacon_load(port, connections, seconds, paced_latencies, paced_statuses, rate))
+    await asyncio.sleep(0.5)
+    paced = await submissions(port, submits)
+    await load
+    for status, count in paced_statuses.items():
+        statuses[status] = statuses.get(status, 0) + count
+    return {
+        "beacons_per_second": round(len(latencies) / seconds),
+        "beacon_ms_p50": round(latencies[len(latencies) // 2] * 1e3, 2),
+        "beacon_ms_p99": round(latencies[int(len(latencies) * 0.99)] * 1e3, 2),
+        "beacon_statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "submit_ms_p50_alone": alone,
+        "submit_ms_p50_saturated": saturated,
+        "paced_beacons_per_second": round(len(paced_latencies) / seconds),
+        "submit_ms_p50_paced": paced,
+    }
+
+
+def git_commit(app_dir):
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=app_dir,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app-dir", default=os.path.dirname(HERE))
+    parser.add_argument("--connections", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--rate", type=int, default=1000, help="beacons per second in the steady phase")
+    parser.add_argument("--submits", type=int, default=50, help="submissions timed per phase")
+    parser.add_argument("--label", default="")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    port = free_port()
+    with tempfile.TemporaryDirectory(prefix="beacon-bench-") as tmp:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp}/beacon_bench.db", SPOOL_DIR=os.path.join(tmp, "spool"))
+        # One client address sends everything
+        env["RATE_LIMIT_ENABLED"] = "false"
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning",
+             "--no-access-log"],
+            cwd=args.app_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            deadline = time.perf_counter() + 30
+            while True:
+                try:
+                    socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                    break
+                except OSError:
+                    if time.perf_counter() > deadline:
+                        raise RuntimeError("server did not start")
+                    time.sleep(0.05)
+            time.sleep(1)
+            measured = asyncio.run(measure(port, args.connections, args.seconds, args.submits, args.rate))
+        finally:
+            server.terminate()
+            server.wait()
+
+    result = {
+        "label": args.label,
+        "commit": git_commit(args.app_dir),
+        "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "connections": args.connections,
+        "seconds": args.seconds,
+        "rate": args.rate,
+        **measured,
+    }
+    print(json.dumps(result, indent=2))
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+        history = []
+        if os.path.exists(RESULTS_FILE):
+            with open(RESULTS_FILE) as f:
+                history = json.load(f)
+        history.append(result)
+        with open(RESULTS_FILE, "w") as f:
+            json.dump(history, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
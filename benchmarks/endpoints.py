@@ -0,0 +1,262 @@
+"""Endpoint benchmark: throughput and latency of /, /survey, /submit-survey and /health.
+
+The app runs under the production profile (gunicorn.conf.py) against a
+fresh SQLite file, or against the PostgreSQL database given with
+--database-url (rows are added to it, nothing is removed). Each endpoint is
+then loaded in turn for a fixed duration by client processes holding
+keep-alive connections. Submissions are randomized: every LAB_SESSIONS
+value is cycled through, ratings are sometimes left out, and free-text
+answers range from empty to a few thousand characters. DB commits per
+second come from the db_commit_duration_seconds counter on /metrics.
+Results are appended to benchmarks/results/endpoints.json:
+
+    python benchmarks/endpoints.py --label "sqlite baseline"
+    python benchmarks/endpoints.py --database-url postgresql://postgres@127.0.0.1:5432/bench --label pg
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+import uuid
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+RESULTS_FILE = os.path.join(HERE, "results", "endpoints.json")
+sys.path.insert(0, APP_DIR)
+
+ENDPOINTS = ("/", "/survey", "/submit-survey", "/health")
+RATINGS = ("unit_content_quality", "teaching_effectiveness", "assessment_fairness",
+           "learning_resources", "overall_experience")
+TEXT_FIELDS = ("positive_aspects", "improvement_suggestions", "technical_issues", "additional_comments")
+WORDS = (
+    "lab tutor assignment feedback lecture slides recording week quiz marking rubric python "
+    "database query schema deadline clear helpful confusing slow fast examples practice "
+    "content pace workload group session room wifi laptop moodle forum consultation"
+).split()
+COMMITS_PATTERN = re.compile(rb"^db_commit_duration_seconds_count(?:\{[^}]*\})? (\S+)$", re.MULTILINE)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def free_text(rng):
+    # Mostly short answers, some empty, a few essays
+    kind = rng.random()
+    if kind < 0.3:
+        return ""
+    count = rng.randint(3, 40) if kind < 0.9 else rng.randint(200, 600)
+    return " ".join(rng.choice(WORDS) for _ in range(count))
+
+
+def submissions(seed):
+    """Endless randomized form bodies, covering every lab session (and none)."""
+    from main import LAB_SESSIONS
+
+    rng = random.Random(seed)
+    sessions = list(LAB_SESSIONS) + [None]
+    rng.shuffle(sessions)
+    for lab_session in itertools.cycle(sessions):
+        form = {"submission_id": uuid.UUID(int=rng.getrandbits(128)).hex,
+                "participated_fully": rng.choice(("true", "false"))}
+        if lab_session is not None:
+            form["lab_session"] = lab_session
+        for field in RATINGS:
+            if rng.random() < 0.85:
+                form[field] = rng.randint(1, 5)
+        for field in TEXT_FIELDS:
+            text = free_text(rng)
+            if text:
+                form[field] = text
+        form["consent_given"] = "on"
+        yield urlencode(form).encode()
+
+
+def build_request(path, body=None):
+    if body is None:
+        return f"GET {path} HTTP/1.1\r\nHost: bench\r\n\r\n".encode()
+    return (
+        f"POST {path} HTTP/1.1\r\nHost: bench\r\n"
+        f"Content-Type: application/x-www-form-urlencoded\r\nContent-Length: {len(body)}\r\n\r\n"
+    ).encode() + body
+
+
+async def connection(port, path, bodies, deadline, samples, errors):
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    except OSError:
+        errors.append("connect")
+        return
+    try:
+        while time.perf_counter() < deadline:
+            request = build_request(path, next(bodies) if bodies is not None else None)
+            started = time.perf_counter()
+            writer.write(request)
+            head = await reader.readuntil(b"\r\n\r\n")
+            status = int(head.split(b" ", 2)[1])
+            length = 0
+            for line in head.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            await reader.readexactly(length)
+            samples.append(time.perf_counter() - started)
+            if status >= 400:
+                errors.append(status)
+    except (OSError, asyncio.IncompleteReadError):
+        errors.append("connection")
+    finally:
+        writer.close()
+
+
+def client(port, path, connections, duration, seed, output):
+    samples, errors = [], []
+    bodies = submissions(seed) if path == "/submit-survey" else None
+
+    async def run():
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(
+            connection(port, path, bodies, deadline, samples, errors) for _ in range(connections)
+        ))
+
+    asyncio.run(run())
+    output.put((samples, [str(error) for error in errors]))
+
+
+def commits(port):
+    # Summed over every label set and worker; None when metrics are disabled
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            body = response.read()
+    except OSError:
+        return None
+    values = COMMITS_PATTERN.findall(body)
+    return sum(float(value) for value in values) if values else 0.0
+
+
+def percentile(samples, fraction):
+    return round(samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1e3, 2)
+
+
+def run_endpoint(port, path, args, seed):
+    before = commits(port)
+    output = multiprocessing.Queue()
+    clients = [
+        multiprocessing.Process(target=client, args=(port, path, args.connections, args.duration, seed + i, output))
+        for i in range(args.clients)
+    ]
+    for process in clients:
+        process.start()
+    samples, errors = [], []
+    for _ in clients:
+        client_samples, client_errors = output.get()
+        samples += client_samples
+        errors += client_errors
+    for process in clients:
+        process.join()
+    after = commits(port)
+
+    samples.sort()
+    result = {
+        "requests": len(samples),
+        "errors": len(errors),
+        "rps": round(len(samples) / args.duration, 1),
+        "p50_ms": percentile(samples, 0.50) if samples else None,
+        "p95_ms": percentile(samples, 0.95) if samples else None,
+        "p99_ms": percentile(samples, 0.99) if samples else None,
+        "commits_per_s": round((after - before) / args.duration, 1) if None not in (before, after) else None,
+    }
+    if errors:
+        result["error_kinds"] = {kind: errors.count(kind) for kind in sorted(set(errors))}
+    return result
+
+
+def wait_ready(port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/readyz", timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not become ready")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", help="default: a fresh SQLite file")
+    parser.add_argument("--endpoints", nargs="+", default=list(ENDPOINTS), choices=ENDPOINTS)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--clients", type=int, default=2, help="client processes")
+    parser.add_argument("--connections", type=int, default=16, help="keep-alive connections per client")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per endpoint")
+    parser.add_argument("--seed", type=int, default=5122)
+    parser.add_argument("--label", default="")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="survey-bench-")
+    database_url = args.database_url or f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+    port = free_port()
+    env = dict(
+        os.environ, DATABASE_URL=database_url, PORT=str(port), WEB_CONCURRENCY=str(args.workers),
+        PROMETHEUS_MULTIPROC_DIR=os.path.join(scratch, "metrics"), METRICS_ENABLED="true",
+        LOG_LEVEL="WARNING",
+        # Worker recycling would reset connections mid-run
+        GUNICORN_MAX_REQUESTS="0",
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--log-level", "warning", "main:app"],
+        cwd=APP_DIR, env=env,
+    )
+    try:
+        wait_ready(port)
+        endpoints = {path: run_endpoint(port, path, args, args.seed) for path in args.endpoints}
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+
+    from sqlalchemy.engine import make_url
+
+    result = {
+        "label": args.label,
+        "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "cpus": len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count(),
+        "database": make_url(database_url).get_backend_name(),
+        "ingest_mode": os.getenv("INGEST_MODE", "direct"),
+        "workers": args.workers,
+        "connections": args.clients * args.connections,
+        "duration_s": args.duration,
+        "endpoints": endpoints,
+    }
+    print(json.dumps(result, indent=2))
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+        history = []
+        if os.path.exists(RESULTS_FILE):
+            with open(RESULTS_FILE) as f:
+                history = json.load(f)
+        history.append(result)
+        with open(RESULTS_FILE, "w") as f:
+            json.dump(history, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
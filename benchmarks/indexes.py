@@ -0,0 +1,150 @@
+"""Index check: EXPLAIN the analytic filters against a populated table.
+
+Fills a fresh SQLite file (or the PostgreSQL database given with
+--database-url, which should be empty) with --rows responses spread over
+six months, ANALYZEs it and runs migrate.check_indexes(), which fails a
+query whose plan doesn't use its index. With --partition (PostgreSQL) it
+then converts the table to monthly partitions, checks the plans again and
+checks that a repeated submission id is still refused. Exits 1 if any
+check fails; results are appended to benchmarks/results/indexes.json:
+
+    python benchmarks/indexes.py --database-url postgresql://localhost/empty --partition
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import uuid
+from datetime import datetime, timedelta, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+RESULTS_FILE = os.path.join(HERE, "results", "indexes.json")
+sys.path.insert(0, APP_DIR)
+
+FIRST_DAY = datetime(2025, 7, 1, tzinfo=timezone.utc)
+DAYS = 184
+
+
+def fill(engine, rows, seed):
+    from sqlalchemy import insert
+
+    from database import FIT5122SurveyResponse
+    from main import LAB_SESSIONS
+
+    rng = random.Random(seed)
+    table = FIT5122SurveyResponse.__table__
+    batch = []
+    with engine.begin() as conn:
+        for i in range(rows):
+            batch.append({
+                "participated_fully": rng.random() < 0.8,
+                "consent_given": rng.random() < 0.9,
+                "lab_session": rng.choice(LAB_SESSIONS),
+                "overall_experience": rng.randint(1, 5),
+                "timestamp": FIRST_DAY + timedelta(seconds=rng.uniform(0, DAYS * 86400)),
+                "submission_id": uuid.UUID(int=rng.getrandbits(128)).hex,
+            })
+            if len(batch) == 5000 or i == rows - 1:
+                conn.execute(insert(table), batch)
+                batch = []
+
+
+def run_checks(engine, stage):
+    from migrate import check_indexes
+
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    with engine.begin() as conn:
+        results = check_indexes(conn)
+    for name, index, used, plan in results:
+        print(f"{'ok  ' if used else 'FAIL'} {stage}: {name} ({index})")
+        if not used:
+            print("     " + plan.replace("\n", "\n     "))
+    return {name: {"index": index, "used": used, "plan": plan} for name, index, used, plan in results}
+
+
+def duplicate_refused(engine):
+    """Whether inserting a row with an already stored submission id fails."""
+    from sqlalchemy import insert, select
+    from sqlalchemy.exc import IntegrityError
+
+    from database import FIT5122SurveyResponse
+
+    table = FIT5122SurveyResponse.__table__
+    with engine.connect() as conn:
+        submission_id = conn.execute(select(table.c.submission_id).limit(1)).scalar()
+        try:
+            # Another month, so the copy would land in a different partition
+            conn.execute(insert(table), {"submission_id": submission_id, "participated_fully": True,
+                                         "timestamp": FIRST_DAY + timedelta(days=DAYS + 45)})
+        except IntegrityError:
+            return True
+        finally:
+            conn.rollback()
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", help="default: a fresh SQLite file")
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--partition", action="store_true", help="also check after partitioning (PostgreSQL)")
+    parser.add_argument("--seed", type=int, default=5122)
+    parser.add_argument("--label", default="")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tempfile.mkdtemp(prefix='survey-indexes-')}/bench.db"
+    import database
+    from migrate import convert_to_partitioned, upgrade
+
+    database.configure()
+    if args.partition and database.DB_BACKEND != "postgresql":
+        parser.error("--partition needs a PostgreSQL --database-url")
+    with database.engine.begin() as conn:
+        upgrade(conn)
+    fill(database.engine, args.rows, args.seed)
+
+    checks = {"unpartitioned": run_checks(database.engine, "unpartitioned")}
+    duplicates = {"unpartitioned": duplicate_refused(database.engine)}
+    if args.partition:
+        with database.engine.begin() as conn:
+            convert_to_partitioned(conn)
+        checks["partitioned"] = run_checks(database.engine, "partitioned")
+        duplicates["partitioned"] = duplicate_refused(database.engine)
+    for stage, refused in duplicates.items():
+        print(f"{'ok  ' if refused else 'FAIL'} {stage}: repeated submission id refused")
+
+    passed = all(refused for refused in duplicates.values()) and all(
+        check["used"] for stage in checks.values() for check in stage.values()
+    )
+    result = {
+        "label": args.label,
+        "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "database": database.DB_BACKEND,
+        "rows": args.rows,
+        "passed": passed,
+        "checks": checks,
+        "duplicate_refused": duplicates,
+    }
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+        history = []
+        if os.path.exists(RESULTS_FILE):
+            with open(RESULTS_FILE) as f:
+                history = json.load(f)
+        history.append(result)
+        with open(RESULTS_FILE, "w") as f:
+            json.dump(history, f, indent=2)
+            f.write("\n")
+    raise SystemExit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Metrics overhead benchmark: per-request cost of MetricsMiddleware and engine instrumentation.
+
+Each configuration runs in a fresh interpreter (METRICS_ENABLED is read at
+import) and drives the ASGI app directly, without sockets or an HTTP
+client, so the difference between runs is the instrumentation itself.
+Off and on runs alternate for several rounds and the fastest round of
+each is kept, which filters out most scheduler noise. Results are
+appended to benchmarks/results/metrics_overhead.json:
+
+    python benchmarks/metrics_overhead.py --label "prometheus_client middleware"
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+RESULTS_FILE = os.path.join(HERE, "results", "metrics_overhead.json")
+PATHS = ("/livez", "/health", "/survey")
+
+
+async def call(app, path):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1),
+        "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+
+async def run_worker(requests, warmup):
+    sys.path.insert(0, APP_DIR)
+    from main import create_app
+
+    app = create_app()
+    results = {}
+    async with app.router.lifespan_context(app):
+        for path in PATHS:
+            for _ in range(warmup):
+                await call(app, path)
+            samples = []
+            for _ in range(requests):
+                started = time.perf_counter()
+                await call(app, path)
+                samples.append(time.perf_counter() - started)
+            samples.sort()
+            results[path] = {
+                "mean_us": round(statistics.fmean(samples) * 1e6, 1),
+                "p50_us": round(samples[len(samples) // 2] * 1e6, 1),
+                "p99_us": round(samples[int(len(samples) * 0.99)] * 1e6, 1),
+            }
+    return results
+
+
+def measure(enabled, requests, warmup):
+    env = dict(os.environ, METRICS_ENABLED="true" if enabled else "false")
+    env.setdefault("DATABASE_URL", "sqlite:///./metrics_bench.db")
+    output = subprocess.run(
+        [sys.executable, __file__, "--worker", "--requests", str(requests), "--warmup", str(warmup)],
+        cwd=APP_DIR, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--warmup", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--label", default="")
+    parser.add_argument("--no-save", action="store_true")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(asyncio.run(run_worker(args.requests, args.warmup))))
+        return
+
+    rounds = {False: [], True: []}
+    for _ in range(args.rounds):
+        for enabled in (False, True):
+            rounds[enabled].append(measure(enabled, args.requests, args.warmup))
+    off, on = (
+        {path: min((run[path] for run in rounds[enabled]), key=lambda stats: stats["mean_us"]) for path in PATHS}
+        for enabled in (False, True)
+    )
+    result = {
+        "label": args.label,
+        "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "requests": args.requests,
+        "rounds": args.rounds,
+        "paths": {
+            path: {
+                "off": off[path],
+                "on": on[path],
+                "overhead_us": round(on[path]["mean_us"] - off[path]["mean_us"], 1),
+            }
+            for path in PATHS
+        },
+    }
+    print(json.dumps(result, indent=2))
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+        history = []
+        if os.path.exists(RESULTS_FILE):
+            with open(RESULTS_FILE) as f:
+                history = json.load(f)
+        history.append(result)
+        with open(RESULTS_FILE, "w") as f:
+            json.dump(history, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
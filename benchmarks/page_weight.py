@@ -0,0 +1,159 @@
+"""Page weight benchmark: bytes and load time of each page and the assets it references.
+
+Starts the app from --app-dir (another checkout can be compared) under
+uvicorn, fetches each page and every stylesheet/script it references the
+way a browser would on a first visit, and records the transferred bytes
+per encoding and the time to load the page plus its same-origin assets.
+Third-party URLs are listed, and fetched only with --external (they are
+not reachable from every build machine). Results are appended to
+benchmarks/results/page_weight.json:
+
+    git worktree add /tmp/baseline HEAD~1
+    python benchmarks/page_weight.py --app-dir /tmp/baseline --label "tailwind play cdn"
+    python benchmarks/page_weight.py --label "self-hosted build"
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS_FILE = os.path.join(HERE, "results", "page_weight.json")
+PAGES = ("/", "/survey", "/thank-you")
+ENCODINGS = ("identity", "gzip", "br")
+REFERENCE_PATTERN = re.compile(r'<(?:script[^>]*\ssrc|link[^>]*\shref)="([^"]+)"')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def fetch(url, encoding="br", timeout=10):
+    """(status, transferred bytes, decoded text or None, seconds)."""
+    request = urllib.request.Request(url, headers={"Accept-Encoding": encoding, "User-Agent": "page-weight"})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            body = response.read()
+            content_encoding = response.headers.get("Content-Encoding")
+            status = response.status
+    except urllib.error.HTTPError as e:
+        return e.code, 0, None, time.perf_counter() - started
+    elapsed = time.perf_counter() - started
+    text = None
+    if content_encoding in (None, "identity"):
+        text = body.decode("utf-8", "replace")
+    return status, len(body), text, elapsed
+
+
+def page_weight(base, path, external):
+    _, _, html, _ = fetch(base + path, "identity")
+    page = {"html": {encoding: fetch(base + path, encoding)[1] for encoding in ENCODINGS}, "assets": []}
+    for url in REFERENCE_PATTERN.findall(html):
+        if url.startswith("//"):
+            url = "https:" + url
+        same_origin = url.startswith("/")
+        asset = {"url": url, "same_origin": same_origin}
+        if same_origin or external:
+            full = base + url if same_origin else url
+            try:
+                asset.update({encoding: fetch(full, encoding)[1] for encoding in ("identity", "br")})
+            except OSError as e:
+                asset["error"] = str(e)
+        page["assets"].append(asset)
+    page["br_total"] = page["html"]["br"] + sum(asset.get("br", 0) for asset in page["assets"])
+    page["third_party_requests"] = sum(1 for asset in page["assets"] if not asset["same_origin"])
+    return page, [url for url in REFERENCE_PATTERN.findall(html) if url.startswith("/")]
+
+
+def load_time(base, path, same_origin, repeat):
+    # Sequential first-visit load of the page and its same-origin assets, brotli
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fetch(base + path)
+        for url in same_origin:
+            fetch(base + url)
+        samples.append(time.perf_counter() - started)
+    return round(statistics.median(samples) * 1e3, 2)
+
+
+def git_commit(app_dir):
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=app_dir,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app-dir", default=os.path.dirname(HERE))
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--external", action="store_true", help="also fetch third-party assets")
+    parser.add_argument("--label", default="")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "sqlite:///./page_weight_bench.db")
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=args.app_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.perf_counter() + 30
+        while True:
+            try:
+                if fetch(base + "/livez")[0] == 200:
+                    break
+            except OSError:
+                if time.perf_counter() > deadline:
+                    raise RuntimeError("server did not start")
+                time.sleep(0.05)
+        pages = {}
+        for path in PAGES:
+            page, same_origin = page_weight(base, path, args.external)
+            page["load_ms_median"] = load_time(base, path, same_origin, args.repeat)
+            pages[path] = page
+    finally:
+        server.terminate()
+        server.wait()
+
+    result = {
+        "label": args.label,
+        "commit": git_commit(args.app_dir),
+        "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "external_fetched": args.external,
+        "pages": pages,
+    }
+    print(json.dumps(result, indent=2))
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+        history = []
+        if os.path.exists(RESULTS_FILE):
+            with open(RESULTS_FILE) as f:
+                history = json.load(f)
+        history.append(result)
+        with open(RESULTS_FILE, "w") as f:
+            json.dump(history, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
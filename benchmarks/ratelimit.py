@@ -0,0 +1,81 @@
+"""Rate limit check: forwarded clients get separate buckets behind a proxy.
+
+Starts the production profile (gunicorn -c gunicorn.conf.py, one worker)
+with a small burst, then sends POSTs through "the proxy" (a loopback
+connection carrying X-Forwarded-For): one client until it is refused with
+a 429, then a second client, which must still get through. Exits 1 if
+the limit is not applied per forwarded client:
+
+    python benchmarks/ratelimit.py
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def statuses(client, forwarded_for, count):
+    # An empty form: the limiter counts it before validation answers 422
+    return [client.post("/submit-survey", data={}, headers={"X-Forwarded-For": forwarded_for}).status_code
+            for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--burst", type=int, default=5)
+    args = parser.parse_args()
+
+    port = free_port()
+    with tempfile.TemporaryDirectory(prefix="ratelimit-check-") as tmp:
+        env = dict(os.environ, PORT=str(port), WEB_CONCURRENCY="1", DATABASE_URL=f"sqlite:///{tmp}/check.db",
+                   SPOOL_DIR=os.path.join(tmp, "spool"), RATE_LIMIT_ENABLED="true", RATE_LIMIT_BACKEND="memory",
+                   RATE_LIMIT_BURST=str(args.burst), RATE_LIMIT_PER_MINUTE="1")
+        env.pop("FORWARDED_ALLOW_IPS", None)
+        server = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--log-level", "warning", "main:app"],
+            cwd=APP_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=10) as client:
+                deadline = time.perf_counter() + 60
+                while True:
+                    try:
+                        client.get("/readyz").raise_for_status()
+                        break
+                    except httpx.HTTPError:
+                        if time.perf_counter() > deadline:
+                            raise RuntimeError("server did not become ready")
+                        time.sleep(0.2)
+                first = statuses(client, "203.0.113.7", args.burst + 1)
+                second = statuses(client, "198.51.100.23", 1)
+        finally:
+            server.terminate()
+            server.wait()
+
+    checks = [
+        ("first client gets its burst", 429 not in first[:-1]),
+        ("first client is refused past it", first[-1] == 429),
+        ("second client has its own bucket", second[0] != 429),
+    ]
+    for name, passed in checks:
+        print(f"{'ok  ' if passed else 'FAIL'} {name}")
+    print(f"     statuses: first {first}, second {second}")
+    raise SystemExit(0 if all(passed for _, passed in checks) else 1)
+
+
+if __name__ == "__main__":
+    main()
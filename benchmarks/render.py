@@ -0,0 +1,117 @@
+"""Render benchmark: cost of producing the survey page's HTML.
+
+Each measurement runs in a fresh interpreter in --app-dir, which can be
+another checkout, so the inline f-string pages and the template layer
+are compared like for like. It times the import of main.py, the first
+render of the survey page, and then repeated renders. The first render
+is measured twice: once with an empty TEMPLATE_CACHE_DIR, which parses
+and compiles every template, and once with the bytecode cache a previous
+process left behind. Results are appended to benchmarks/results/render.json:
+
+    git worktree add /tmp/baseline HEAD~1
+    python benchmarks/render.py --app-dir /tmp/baseline --label "inline f-strings"
+    python benchmarks/render.py --label "jinja2 + bytecode cache"
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS_FILE = os.path.join(HERE, "results", "render.json")
+
+RENDER_SNIPPET = """
+import json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+key = tuple(main.LAB_SESSIONS)
+html = main.survey_pages.render(key)
+first = time.perf_counter()
+samples = []
+for _ in range(int(sys.argv[1])):
+    t = time.perf_counter()
+    main.survey_pages.render(key)
+    samples.append(time.perf_counter() - t)
+samples.sort()
+print("RESULT", json.dumps({
+    "import_ms": (imported - started) * 1e3,
+    "first_render_ms": (first - imported) * 1e3,
+    "render_us": samples[len(samples) // 2] * 1e6,
+    "bytes": len(html.encode()),
+}))
+"""
+
+
+def measure(app_dir, env, renders):
+    output = subprocess.run(
+        [sys.executable, "-c", RENDER_SNIPPET, str(renders)], cwd=app_dir, env=env,
+        capture_output=True, text=True, check=True,
+    ).stdout
+    line = [line for line in output.splitlines() if line.startswith("RESULT")][-1]
+    return json.loads(line.split(" ", 1)[1])
+
+
+def git_commit(app_dir):
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=app_dir,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app-dir", default=os.path.dirname(HERE))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--renders", type=int, default=2000, help="renders per run after the first")
+    parser.add_argument("--label", default="")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "sqlite:///./render_bench.db")
+    cold, warm = [], []
+    for _ in range(args.runs):
+        with tempfile.TemporaryDirectory(prefix="template-cache-") as cache_dir:
+            env["TEMPLATE_CACHE_DIR"] = cache_dir
+            cold.append(measure(args.app_dir, env, args.renders))
+            # Same cache directory again: the templates are loaded from bytecode
+            warm.append(measure(args.app_dir, env, args.renders))
+
+    def median(runs, key, digits=1):
+        return round(statistics.median(run[key] for run in runs), digits)
+
+    result = {
+        "label": args.label,
+        "commit": git_commit(args.app_dir),
+        "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "runs": args.runs,
+        "page_bytes": cold[0]["bytes"],
+        "import_ms_median": median(cold + warm, "import_ms"),
+        "first_render_ms_empty_cache": median(cold, "first_render_ms", 2),
+        "first_render_ms_warm_cache": median(warm, "first_render_ms", 2),
+        "render_us_median": median(cold + warm, "render_us"),
+    }
+    print(json.dumps(result, indent=2))
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+        history = []
+        if os.path.exists(RESULTS_FILE):
+            with open(RESULTS_FILE) as f:
+                history = json.load(f)
+        history.append(result)
+        with open(RESULTS_FILE, "w") as f:
+            json.dump(history, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""Replica benchmark: survey submission latency under a heavy read load, with and without a read replica.
+
+Starts the app from --app-dir under uvicorn (one worker) twice: once with
+every query on the primary, once with DATABASE_REPLICA_URLS set. Each
+time submissions are timed on their own and then while --readers
+clients download /export slowly (as over a slow link, each holding a
+database connection throughout) and call /search and /health in a loop.
+The app runs on one worker, so this measures contention for database
+connections and locks, not for CPU. By default
+the primary and the replica are two SQLite files, the replica a copy of
+the seeded primary; --primary-url and --replica-url point it at
+PostgreSQL instead (rows are added to the primary, nothing is removed).
+Results are appended to benchmarks/results/replicas.json:
+
+    python benchmarks/replicas.py --rows 20000 --readers 24 --label "two sqlite files"
+    python benchmarks/replicas.py --primary-url postgresql://postgres@127.0.0.1:5433/postgres \\
+        --replica-url postgresql://postgres@127.0.0.1:5434/postgres --label "pg streaming replica"
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+from datetime import datetime, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS_FILE = os.path.join(HERE, "results", "replicas.json")
+READS = ("/export?format=ndjson", "/search?q=feedback", "/health")
+# Submissions the app couldn't store in time go to its local spool, still answered 303
+SPOOLED_PATTERN = re.compile(rb'^spool_records_total\{event="written"\} (\S+)$', re.MULTILINE)
+FORM = urllib.parse.urlencode({
+    "participated_fully": "true", "unit_content_quality": "4", "overall_experience": "5", "consent_given": "on",
+}).encode()
+WORDS = "lab tutor feedback lecture slides quiz marking helpful confusing examples workload session".split()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def seed(app_dir, url, rows):
+    # In a child interpreter, so the app's modules come from --app-dir
+    snippet = f"""
+import asyncio, random, sys
+sys.path.insert(0, {app_dir!r})
+import database
+from sqlalchemy import insert
+database.configure({url!r}, [])
+asyncio.run(database.init_schema())
+rng = random.Random(5122)
+words = {WORDS!r}
+with database.get_engine().begin() as conn:
+    for start in range(0, {rows}, 5000):
+        conn.execute(insert(database.FIT5122SurveyResponse), [
+            {{"participated_fully": True, "consent_given": True, "overall_experience": rng.randint(1, 5),
+              "positive_aspects": " ".join(rng.choices(words, k=rng.randint(5, 60)))}}
+            for _ in range(min(5000, {rows} - start))
+        ])
+"""
+    subprocess.run([sys.executable, "-c", snippet], cwd=app_dir, check=True, capture_output=True)
+
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection for the timed submissions."""
+
+    def __init__(self, port):
+        self.port = port
+        self.reader = self.writer = None
+
+    async def post(self, path, body, content_type):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection("127.0.0.1", self.port)
+        self.writer.write(
+            f"POST {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+        )
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        length = 0
+        for line in head.split(b"\r\n"):
+            if line.lower().startswith(b"content-length:"):
+                length = int(line.split(b":", 1)[1])
+        if length:
+            await self.reader.readexactly(length)
+        return int(head.split(b" ", 2)[1])
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+async def get(port, path, pause=0.0, body=False):
+    # HTTP/1.0, so the whole (possibly streamed) body is simply everything until EOF;
+    # with a pause the body is read 64 KB at a time, like a slow client
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(f"GET {path} HTTP/1.0\r\nHost: 127.0.0.1\r\n\r\n".encode())
+        data = b""
+        while True:
+            chunk = await reader.read(65536)
+            if not chunk:
+                break
+            data += chunk
+            if pause:
+                await asyncio.sleep(pause)
+    finally:
+        writer.close()
+    return int(data.split(b" ", 2)[1]), data if body else len(data)
+
+
+async def read_load(port, readers, stop, counts, pause):
+    async def reader(n):
+        i = n
+        while not stop.is_set():
+            path = READS[i % len(READS)]
+            status, _ = await get(port, path, pause if path.startswith("/export") else 0.0)
+            counts[status] = counts.get(status, 0) + 1
+            i += 1
+
+    await asyncio.gather(*(reader(n) for n in range(readers)))
+
+
+async def submissions(port, count):
+    connection = Connection(port)
+    samples, failed = [], 0
+    try:
+        for _ in range(count):
+            started = time.perf_counter()
+            status = await connection.post("/submit-survey", FORM, "application/x-www-form-urlencoded")
+            samples.append(time.perf_counter() - started)
+            failed += status != 303
+            await asyncio.sleep(0.02)
+    finally:
+        connection.close()
+    samples.sort()
+    return {"p50": round(samples[len(samples) // 2] * 1e3, 2), "p99": round(samples[int(len(samples) * 0.99)] * 1e3, 2),
+            "failed": failed}
+
+
+async def measure(port, readers, submits, pause):
+    alone = await submissions(port, submits)
+    stop, counts = asyncio.Event(), {}
+    started = time.perf_counter()
+    load = asyncio.create_task(read_load(port, readers, stop, counts, pause))
+    await asyncio.sleep(2)
+    loaded = await submissions(port, submits)
+    stop.set()
+    await load
+    _, metrics = await get(port, "/metrics", body=True)
+    match = SPOOLED_PATTERN.search(metrics)
+    return {
+        "submit_ms_alone": alone,
+        "submit_ms_under_reads": loaded,
+        "reads_per_second": round(sum(counts.values()) / (time.perf_counter() - started), 1),
+        "read_statuses": {str(status): count for status, count in sorted(counts.items())},
+        "submits_spooled": int(float(match.group(1))) if match else 0,
+    }
+
+
+def run_server(app_dir, env, readers, submits, pause):
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning",
+         "--no-access-log"],
+        cwd=app_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.perf_counter() + 30
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                if time.perf_counter() > deadline:
+                    raise RuntimeError("server did not start")
+                time.sleep(0.05)
+        time.sleep(1)
+        return asyncio.run(measure(port, readers, submits, pause))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def git_commit(app_dir):
+    try:
+        # "-dirty" when the measured tree has uncommitted changes, so it isn't credited to HEAD
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=app_dir,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app-dir", default=os.path.dirname(HERE))
+    parser.add_argument("--primary-url", help="PostgreSQL primary (default: a fresh SQLite file)")
+    parser.add_argument("--replica-url", help="its streaming replica")
+    parser.add_argument("--rows", type=int, default=20000, help="responses seeded before timing")
+    parser.add_argument("--readers", type=int, default=24, help="concurrent read clients")
+    parser.add_argument("--pause", type=float, default=0.5, help="seconds a reader waits between 64 KB of an export")
+    parser.add_argument("--submits", type=int, default=100, help="submissions timed per phase")
+    parser.add_argument("--label", default="")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+    if bool(args.primary_url) != bool(args.replica_url):
+        parser.error("--primary-url and --replica-url go together")
+
+    with tempfile.TemporaryDirectory(prefix="replica-bench-") as tmp:
+        primary, replica = args.primary_url, args.replica_url
+        if primary is None:
+            primary, replica = f"sqlite:///{tmp}/primary.db", f"sqlite:///{tmp}/replica.db"
+        seed(args.app_dir, primary, args.rows)
+        if args.primary_url is None:
+            shutil.copy(os.path.join(tmp, "primary.db"), os.path.join(tmp, "replica.db"))
+        else:
+            # Let the replica replay the seed
+            time.sleep(2)
+        # One client address sends everything
+        env = dict(os.environ, DATABASE_URL=primary, SPOOL_DIR=os.path.join(tmp, "spool"), RATE_LIMIT_ENABLED="false",
+                   RESPONSE_COUNT_MAX_STALENESS="0")
+        env.pop("DATABASE_REPLICA_URLS", None)
+        primary_only = run_server(args.app_dir, env, args.readers, args.submits, args.pause)
+        with_replica = run_server(args.app_dir, dict(env, DATABASE_REPLICA_URLS=replica), args.readers, args.submits,
+                                  args.pause)
+
+    result = {
+        "label": args.label,
+        "commit": git_commit(args.app_dir),
+        "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "backend": "postgresql" if args.primary_url else "sqlite",
+        "rows": args.rows,
+        "readers": args.readers,
+        "pause": args.pause,
+        "primary_only": primary_only,
+        "with_replica": with_replica,
+    }
+    print(json.dumps(result, indent=2))
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+        history = []
+        if os.path.exists(RESULTS_FILE):
+            with open(RESULTS_FILE) as f:
+                history = json.load(f)
+        history.append(result)
+        with open(RESULTS_FILE, "w") as f:
+            json.dump(history, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Reports benchmark: cost of a cross-tab report page as the responses table grows.
+
+For each --rows size, fills a fresh SQLite database with synthetic
+responses and times, per report read: computing the cross-tab with
+GROUP BYs over the responses (what each page view would cost without
+materialisation), loading the materialised cells (a cache miss), and a
+cached read; plus one materialisation run. Results are appended to
+benchmarks/results/reports.json:
+
+    python benchmarks/reports.py --rows 1000 10000 100000
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+RESULTS_FILE = os.path.join(HERE, "results", "reports.json")
+REPORT = "ratings-by-time-slot"
+
+
+def seed(engine, rows, lab_sessions):
+    from sqlalchemy import insert
+
+    from database import FIT5122SurveyResponse
+    from stats import RATING_QUESTIONS
+
+    rng = random.Random(5122)
+    batch = []
+    with engine.begin() as conn:
+        for i in range(rows):
+            row = {"participated_fully": rng.random() < 0.8, "lab_session": rng.choice(lab_sessions),
+                   "consent_given": True}
+            row.update((q, rng.randint(1, 5)) for q in RATING_QUESTIONS)
+            batch.append(row)
+            if len(batch) == 10000 or i == rows - 1:
+                conn.execute(insert(FIT5122SurveyResponse), batch)
+                batch = []
+
+
+async def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - started)
+    return round(statistics.median(samples) * 1e3, 3)
+
+
+async def measure(repeat):
+    import database
+    import reports
+    from database import new_session
+
+    async def group_by():
+        db = new_session()
+        try:
+            reports.REPORTS[REPORT].cells(await reports.load_cube(db))
+        finally:
+            await db.close()
+
+    async def cache_miss():
+        reports.reports.cache.invalidate(REPORT)
+        await reports.reports.data(REPORT)
+
+    async def cached():
+        await reports.reports.data(REPORT)
+
+    started = time.perf_counter()
+    await reports.refresh(list(reports.REPORTS))
+    result = {
+        "materialise_ms": round((time.perf_counter() - started) * 1e3, 1),
+        "group_by_ms": await timed(group_by, max(1, repeat // 20)),
+        "materialised_read_ms": await timed(cache_miss, repeat),
+        "cached_read_ms": await timed(cached, repeat),
+    }
+    await database.dispose_engines()
+    return result
+
+
+def run_size(rows, repeat):
+    # A fresh interpreter per size, so each gets its own database and engines
+    snippet = f"""
+import asyncio, importlib.util, json, sys
+sys.path.insert(0, {os.path.dirname(HERE)!r})
+import database
+database.configure()
+asyncio.run(database.init_schema())
+from main import LAB_SESSIONS
+# Loaded under another name: "reports" is the app module
+spec = importlib.util.spec_from_file_location("reports_benchmark", {os.path.abspath(__file__)!r})
+bench = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(bench)
+bench.seed(database.get_engine(), {rows}, LAB_SESSIONS + [None])
+print("RESULT", json.dumps(asyncio.run(bench.measure({repeat}))))
+"""
+    with tempfile.TemporaryDirectory(prefix="reports-bench-") as tmp:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp}/reports.db", SPOOL_DIR=os.path.join(tmp, "spool"))
+        output = subprocess.run([sys.executable, "-c", snippet], cwd=tmp, env=env,
+                                capture_output=True, text=True, check=True).stdout
+    line = [line for line in output.splitlines() if line.startswith("RESULT")][-1]
+    return json.loads(line.split(" ", 1)[1])
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(HERE),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--label", default="")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    result = {
+        "label": args.label,
+        "commit": git_commit(),
+        "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "report": REPORT,
+        "by_rows": {str(rows): run_size(rows, args.repeat) for rows in args.rows},
+    }
+    print(json.dumps(result, indent=2))
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+        history = []
+        if os.path.exists(RESULTS_FILE):
+            with open(RESULTS_FILE) as f:
+                history = json.load(f)
+        history.append(result)
+        with open(RESULTS_FILE, "w") as f:
+            json.dump(history, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Search benchmark: /search latency over a large table of randomized feedback.
+
+Fills a fresh SQLite file (or the PostgreSQL database given with
+--database-url, which should be empty) with --rows responses whose free
+text comes from the same generator as the endpoint benchmark (plus one
+rare word), then times
+search_responses() for common words, rare words, phrases, exclusions and a
+lab-session filter. Results are appended to benchmarks/results/search.json:
+
+    python benchmarks/search.py --rows 300000 --label "fts5 + tsvector/GIN"
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+RESULTS_FILE = os.path.join(HERE, "results", "search.json")
+sys.path.insert(0, APP_DIR)
+
+from endpoints import TEXT_FIELDS, free_text  # noqa: E402
+
+QUERIES = [
+    ("common word", "lab", None),
+    ("rare word", "plagiarism", None),
+    ("phrase", '"lab session"', None),
+    ("or", "wifi OR moodle", None),
+    ("exclusion", "slides -recording", None),
+    ("lab filter", "feedback", "Online/Recorded Session - Flexible timing"),
+]
+
+
+def fill(engine, rows, seed):
+    from sqlalchemy import insert
+
+    from database import FIT5122SurveyResponse
+    from main import LAB_SESSIONS
+
+    rng = random.Random(seed)
+    table = FIT5122SurveyResponse.__table__
+    batch = []
+    with engine.begin() as conn:
+        for i in range(rows):
+            row = {"participated_fully": True, "consent_given": rng.random() < 0.9,
+                   "lab_session": rng.choice(LAB_SESSIONS)}
+            for field in TEXT_FIELDS:
+                row[field] = free_text(rng) or None
+            # The generator's vocabulary is small, so every word in it is common
+            if rng.random() < 0.002:
+                row["technical_issues"] = f"{row['technical_issues'] or ''} plagiarism checker timed out"
+            batch.append(row)
+            if len(batch) == 5000 or i == rows - 1:
+                conn.execute(insert(table), batch)
+                batch = []
+
+
+async def time_queries(repeat):
+    import database
+    from search import search_responses
+
+    timings = {}
+    for name, query, lab_session in QUERIES:
+        samples, hits = [], 0
+        for _ in range(repeat):
+            db = database.new_session()
+            try:
+                started = time.perf_counter()
+                results, _ = await search_responses(db, database.DB_BACKEND, query, lab_session)
+                samples.append(time.perf_counter() - started)
+                hits = len(results)
+            finally:
+                await db.close()
+        timings[name] = {
+            "query": query,
+            "results": hits,
+            "median_ms": round(statistics.median(samples) * 1e3, 2),
+            "max_ms": round(max(samples) * 1e3, 2),
+        }
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", help="default: a fresh SQLite file")
+    parser.add_argument("--rows", type=int, default=300000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=5122)
+    parser.add_argument("--label", default="")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tempfile.mkdtemp(prefix='survey-search-')}/bench.db"
+    import database
+    from migrate import upgrade
+
+    database.configure()
+    with database.engine.begin() as conn:
+        upgrade(conn)
+    started = time.perf_counter()
+    fill(database.engine, args.rows, args.seed)
+    fill_seconds = time.perf_counter() - started
+    if database.DB_BACKEND == "postgresql":
+        with database.engine.begin() as conn:
+            conn.exec_driver_sql("ANALYZE fit5122_survey_responses")
+
+    result = {
+        "label": args.label,
+        "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "database": database.DB_BACKEND,
+        "rows": args.rows,
+        # Includes maintaining the index on every insert
+        "insert_rows_per_s": round(args.rows / fill_seconds),
+        "queries": asyncio.run(time_queries(args.repeat)),
+    }
+    print(json.dumps(result, indent=2))
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+        history = []
+        if os.path.exists(RESULTS_FILE):
+            with open(RESULTS_FILE) as f:
+                history = json.load(f)
+        history.append(result)
+        with open(RESULTS_FILE, "w") as f:
+            json.dump(history, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
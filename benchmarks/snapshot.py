@@ -0,0 +1,229 @@
+"""Snapshot benchmark: memory and query cost of the columnar snapshot as the responses table grows.
+
+For each --rows size, fills a fresh SQLite database with synthetic
+responses and measures: the memory and time of a full snapshot load,
+the memory of the same rows as ORM objects, an incremental refresh
+after new rows arrive, and one filtered /stats query (a lab session
+over the last week, consented rows) computed three ways: vectorized
+over the snapshot, with GROUP BYs in the database, and by looping over
+ORM objects. Results are appended to benchmarks/results/snapshot.json:
+
+    python benchmarks/snapshot.py --rows 10000 100000 500000
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+RESULTS_FILE = os.path.join(HERE, "results", "snapshot.json")
+NEW_ROWS = 1000
+
+
+def seed(engine, rows, lab_sessions, days=120):
+    from sqlalchemy import insert
+
+    from database import FIT5122SurveyResponse
+    from stats import RATING_QUESTIONS
+
+    rng = random.Random(5122)
+    start = datetime.now(timezone.utc) - timedelta(days=days)
+    batch = []
+    with engine.begin() as conn:
+        for i in range(rows):
+            # In id order, as the table fills
+            row = {"timestamp": start + timedelta(days=days) * (i / max(rows, 1)),
+                   "participated_fully": rng.random() < 0.8, "lab_session": rng.choice(lab_sessions),
+                   "consent_given": rng.random() < 0.9}
+            row.update((q, rng.choice((None, 1, 2, 3, 4, 5))) for q in RATING_QUESTIONS)
+            batch.append(row)
+            if len(batch) == 10000 or i == rows - 1:
+                conn.execute(insert(FIT5122SurveyResponse), batch)
+                batch = []
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return round(statistics.median(samples) * 1e3, 3)
+
+
+def sql_stats(engine, since, lab_session):
+    from sqlalchemy import func, select
+
+    from database import FIT5122SurveyResponse
+    from stats import RATING_QUESTIONS, summarise
+
+    table = FIT5122SurveyResponse.__table__
+    result = {}
+    with engine.connect() as conn:
+        for question in RATING_QUESTIONS:
+            column = table.c[question]
+            counts = dict(conn.execute(
+                select(column, func.count())
+                .where(table.c.timestamp >= since, table.c.lab_session == lab_session, table.c.consent_given,
+                       column.between(1, 5))
+                .group_by(column)
+            ).all())
+            result[question] = summarise([counts.get(value, 0) for value in range(1, 6)])
+    return result
+
+
+def orm_stats(engine, since, lab_session):
+    from sqlalchemy import select
+    from sqlalchemy.orm import Session
+
+    from database import FIT5122SurveyResponse
+    from stats import RATING_QUESTIONS, summarise
+
+    histograms = {question: [0] * 5 for question in RATING_QUESTIONS}
+    with Session(engine) as session:
+        for response in session.scalars(select(FIT5122SurveyResponse)):
+            timestamp = response.timestamp.replace(tzinfo=timezone.utc)
+            if timestamp < since or response.lab_session != lab_session or not response.consent_given:
+                continue
+            for question in RATING_QUESTIONS:
+                value = getattr(response, question)
+                if value is not None and 1 <= value <= 5:
+                    histograms[question][value - 1] += 1
+    return {question: summarise(histogram) for question, histogram in histograms.items()}
+
+
+def orm_bytes(engine):
+    from sqlalchemy import select
+    from sqlalchemy.orm import Session
+
+    from database import FIT5122SurveyResponse
+
+    gc.collect()
+    tracemalloc.start()
+    with Session(engine) as session:
+        responses = session.scalars(select(FIT5122SurveyResponse)).all()
+        held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del responses
+    return held
+
+
+def measure(repeat, lab_sessions):
+    import database
+    from snapshot import ColumnarSnapshot
+
+    engine = database.get_engine()
+    since = datetime.now(timezone.utc) - timedelta(days=7)
+    lab_session = lab_sessions[0]
+    snapshot = ColumnarSnapshot(lab_sessions)
+    started = time.perf_counter()
+    asyncio.run(snapshot.refresh())
+    load_ms = (time.perf_counter() - started) * 1e3
+
+    # A second load under tracemalloc, which would slow the timed one
+    gc.collect()
+    tracemalloc.start()
+    traced = ColumnarSnapshot(lab_sessions)
+    asyncio.run(traced.refresh())
+    snapshot_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del traced
+
+    columnar = snapshot.rating_stats(snapshot.where(since=since, lab_session=lab_session, consent=True))
+    assert columnar["overall"] == sql_stats(engine, since, lab_session), "snapshot disagrees with the database"
+
+    seed(engine, NEW_ROWS, lab_sessions, days=0)
+    started = time.perf_counter()
+    asyncio.run(snapshot.refresh())
+    refresh_ms = (time.perf_counter() - started) * 1e3
+    memory = snapshot.memory()
+    result = {
+        "snapshot_bytes_per_100k_rows": memory["bytes_per_100k_rows"],
+        "snapshot_traced_bytes": snapshot_bytes,
+        "orm_traced_bytes": orm_bytes(engine),
+        "snapshot_load_ms": round(load_ms, 1),
+        f"refresh_after_{NEW_ROWS}_new_rows_ms": round(refresh_ms, 1),
+        "stats_snapshot_ms": timed(
+            lambda: snapshot.rating_stats(snapshot.where(since=since, lab_session=lab_session, consent=True)),
+            repeat),
+        "stats_group_by_ms": timed(lambda: sql_stats(engine, since, lab_session), max(1, repeat // 10)),
+        "stats_orm_ms": timed(lambda: orm_stats(engine, since, lab_session), 1),
+    }
+    asyncio.run(database.dispose_engines())
+    return result
+
+
+def run_size(rows, repeat):
+    # A fresh interpreter per size, so each gets its own database and engines
+    snippet = f"""
+import asyncio, importlib.util, json, sys
+sys.path.insert(0, {os.path.dirname(HERE)!r})
+import database
+database.configure()
+asyncio.run(database.init_schema())
+from main import LAB_SESSIONS
+# Loaded under another name: "snapshot" is the app module
+spec = importlib.util.spec_from_file_location("snapshot_benchmark", {os.path.abspath(__file__)!r})
+bench = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(bench)
+bench.seed(database.get_engine(), {rows}, LAB_SESSIONS + [None])
+print("RESULT", json.dumps(bench.measure({repeat}, LAB_SESSIONS)))
+"""
+    with tempfile.TemporaryDirectory(prefix="snapshot-bench-") as tmp:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp}/snapshot.db", SPOOL_DIR=os.path.join(tmp, "spool"))
+        output = subprocess.run([sys.executable, "-c", snippet], cwd=tmp, env=env,
+                                capture_output=True, text=True, check=True).stdout
+    line = [line for line in output.splitlines() if line.startswith("RESULT")][-1]
+    return json.loads(line.split(" ", 1)[1])
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(HERE),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 500000])
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--label", default="")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    result = {
+        "label": args.label,
+        "commit": git_commit(),
+        "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "by_rows": {str(rows): run_size(rows, args.repeat) for rows in args.rows},
+    }
+    print(json.dumps(result, indent=2))
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+        history = []
+        if os.path.exists(RESULTS_FILE):
+            with open(RESULTS_FILE) as f:
+                history = json.load(f)
+        history.append(result)
+        with open(RESULTS_FILE, "w") as f:
+            json.dump(history, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Spool benchmark: how fast submissions are accepted while the database is down.
+
+Appends survey rows to a Spool in a temporary directory from N concurrent
+writers (as N requests would during an outage) and records accepted rows
+per second, the latency of each durable append, and the number of
+fsyncs, for each --fsync-ms window given. Then replays the segments into
+a fresh SQLite database and records the replay rate. Results are appended
+to benchmarks/results/spool.json:
+
+    python benchmarks/spool.py --fsync-ms 0 5 20 --label "group fsync"
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from unittest import mock
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+RESULTS_FILE = os.path.join(HERE, "results", "spool.json")
+
+ROW = {
+    "participated_fully": True,
+    "lab_session": "Wednesday 12:00 PM",
+    "unit_content_quality": 4,
+    "teaching_effectiveness": 5,
+    "assessment_fairness": 3,
+    "learning_resources": 4,
+    "overall_experience": 5,
+    "positive_aspects": "Industry connections and the team project",
+    "improvement_suggestions": None,
+    "technical_issues": None,
+    "additional_comments": None,
+    "consent_given": True,
+}
+
+
+async def append_load(spool, writers, rows):
+    latencies = []
+
+    async def writer(w):
+        for i in range(w, rows, writers):
+            started = time.perf_counter()
+            await spool.append([{**ROW, "submission_id": f"bench-{i}"}])
+            latencies.append(time.perf_counter() - started)
+
+    fsync = os.fsync
+    fsyncs = [0]
+
+    def counting_fsync(fd):
+        fsyncs[0] += 1
+        fsync(fd)
+
+    with mock.patch("os.fsync", counting_fsync):
+        started = time.perf_counter()
+        await asyncio.gather(*(writer(w) for w in range(writers)))
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "rows_per_second": round(rows / elapsed),
+        "append_ms_p50": round(statistics.median(latencies) * 1e3, 2),
+        "append_ms_p99": round(latencies[int(len(latencies) * 0.99)] * 1e3, 2),
+        "fsyncs": fsyncs[0],
+    }
+
+
+async def replay_rate(spool, batch_size):
+    import database
+    from ingest import SpoolReplayer
+
+    database.configure()
+    await database.init_schema()
+    replayer = SpoolReplayer(spool, batch_size=batch_size)
+    started = time.perf_counter()
+    stored = await replayer.replay()
+    elapsed = time.perf_counter() - started
+    await database.dispose_engines()
+    return {"rows_replayed": stored, "replay_rows_per_second": round(stored / elapsed)}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(HERE),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--writers", type=int, default=50, help="concurrent appenders")
+    parser.add_argument("--fsync-ms", type=int, nargs="+", default=[0, 5, 20])
+    parser.add_argument("--batch-size", type=int, default=500, help="rows per replay INSERT")
+    parser.add_argument("--label", default="")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="spool-bench-") as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/replay.db"
+        os.environ["METRICS_ENABLED"] = "false"
+        from spool import Spool
+
+        windows = {}
+        for fsync_ms in args.fsync_ms:
+            spool = Spool(os.path.join(tmp, f"spool-{fsync_ms}"), fsync_ms=fsync_ms)
+            windows[str(fsync_ms)] = asyncio.run(append_load(spool, args.writers, args.rows))
+        # Replays the last spool written
+        replay = asyncio.run(replay_rate(spool, args.batch_size))
+
+    result = {
+        "label": args.label,
+        "commit": git_commit(),
+        "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "rows": args.rows,
+        "writers": args.writers,
+        "append_by_fsync_ms": windows,
+        **replay,
+    }
+    print(json.dumps(result, indent=2))
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+        history = []
+        if os.path.exists(RESULTS_FILE):
+            with open(RESULTS_FILE) as f:
+                history = json.load(f)
+        history.append(result)
+        with open(RESULTS_FILE, "w") as f:
+            json.dump(history, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""SSE fan-out benchmark: updates and latency seen by many /dashboard viewers during a burst.
+
+Starts the app from --app-dir under uvicorn (one worker) with a fresh
+SQLite database, opens --viewers /events streams, then posts --burst
+survey submissions as fast as --concurrency allows. Records how many
+updates each viewer received for the burst, how long after the last
+submission the final totals reached the viewers, and how many SQL
+statements the worker ran while the viewers were connected (from
+/metrics), which should not grow with the number of viewers. Results
+are appended to benchmarks/results/sse_fanout.json:
+
+    python benchmarks/sse_fanout.py --viewers 50 --label "50 viewers"
+    python benchmarks/sse_fanout.py --viewers 500 --label "500 viewers"
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+from datetime import datetime, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS_FILE = os.path.join(HERE, "results", "sse_fanout.json")
+QUERY_COUNT_PATTERN = re.compile(r"^db_query_duration_seconds_count (\S+)$", re.MULTILINE)
+
+FORM = {
+    "participated_fully": "true",
+    "lab_session": "",
+    "unit_content_quality": "4",
+    "teaching_effectiveness": "5",
+    "assessment_fairness": "3",
+    "learning_resources": "4",
+    "overall_experience": "5",
+    "consent_given": "on",
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def request(port, method, path, body=b"", content_type=None):
+    """Minimal HTTP/1.1 request on a fresh connection; (status, body)."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    headers = f"{method} {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n"
+    if content_type:
+        headers += f"Content-Type: {content_type}\r\n"
+    writer.write(f"{headers}Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    return int(head.split(b" ", 2)[1]), payload
+
+
+async def query_count(port):
+    _, body = await request(port, "GET", "/metrics")
+    match = QUERY_COUNT_PATTERN.search(body.decode())
+    return float(match.group(1)) if match else None
+
+
+class Viewer:
+    """One /events stream; records the arrival time and payload of each update."""
+
+    def __init__(self):
+        self.updates = []
+        self.connected = asyncio.Event()
+
+    async def run(self, port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /events HTTP/1.1\r\nHost: 127.0.0.1\r\nAccept: text/event-stream\r\n\r\n")
+        await writer.drain()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                if line.startswith(b"data: {"):
+                    self.updates.append((time.perf_counter(), json.loads(line[6:])))
+                    self.connected.set()
+        finally:
+            writer.close()
+
+
+async def submit(port, semaphore):
+    body = urllib.parse.urlencode(FORM).encode()
+    async with semaphore:
+        status, _ = await request(port, "POST", "/submit-survey", body, "application/x-www-form-urlencoded")
+    return status
+
+
+async def measure(port, viewers, burst, concurrency, settle):
+    clients = [Viewer() for _ in range(viewers)]
+    tasks = [asyncio.create_task(client.run(port)) for client in clients]
+    await asyncio.wait_for(asyncio.gather(*(client.connected.wait() for client in clients)), 60)
+    initial = [client.updates[-1][1]["total_responses"] or 0 for client in clients]
+    queries_before = await query_count(port)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    started = time.perf_counter()
+    statuses = await asyncio.gather(*(submit(port, semaphore) for _ in range(burst)))
+    burst_done = time.perf_counter()
+    await asyncio.sleep(settle)
+    queries_after = await query_count(port)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    stored = sum(1 for status in statuses if status in (200, 303))
+    per_viewer, lag, complete = [], [], 0
+    for client, before in zip(clients, initial):
+        burst_updates = [(at, update) for at, update in client.updates if at >= started]
+        per_viewer.append(len(burst_updates))
+        final = [at for at, update in burst_updates if (update["total_responses"] or 0) >= before + stored]
+        if final:
+            complete += 1
+            lag.append(max(0.0, final[0] - burst_done))
+    return {
+        "submissions_stored": stored,
+        "burst_seconds": round(burst_done - started, 3),
+        "updates_per_viewer_median": statistics.median(per_viewer),
+        "updates_per_viewer_max": max(per_viewer),
+        "viewers_saw_final_total": complete,
+        "final_total_lag_ms_median": round(statistics.median(lag) * 1e3, 1) if lag else None,
+        "final_total_lag_ms_max": round(max(lag) * 1e3, 1) if lag else None,
+        "sql_statements_during_burst": (queries_after - queries_before
+                                        if None not in (queries_before, queries_after) else None),
+    }
+
+
+def git_commit(app_dir):
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=app_dir,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app-dir", default=os.path.dirname(HERE))
+    parser.add_argument("--viewers", type=int, default=500)
+    parser.add_argument("--burst", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--settle", type=float, default=3.0, help="seconds to keep listening after the burst")
+    parser.add_argument("--label", default="")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    port = free_port()
+    with tempfile.TemporaryDirectory(prefix="sse-bench-") as tmp:
+        env = dict(os.environ)
+        env["DATABASE_URL"] = f"sqlite:///{tmp}/sse_bench.db"
+        # Every submission comes from one address
+        env["RATE_LIMIT_ENABLED"] = "false"
+        env.setdefault("LIVE_MAX_VIEWERS", str(max(args.viewers, 1000)))
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning",
+             "--limit-concurrency", str(args.viewers + args.concurrency + 50)],
+            cwd=args.app_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            deadline = time.perf_counter() + 30
+            while True:
+                try:
+                    if asyncio.run(request(port, "GET", "/livez"))[0] == 200:
+                        break
+                except OSError:
+                    if time.perf_counter() > deadline:
+                        raise RuntimeError("server did not start")
+                    time.sleep(0.05)
+            measured = asyncio.run(measure(port, args.viewers, args.burst, args.concurrency, args.settle))
+        finally:
+            server.terminate()
+            server.wait()
+
+    result = {
+        "label": args.label,
+        "commit": git_commit(args.app_dir),
+        "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "viewers": args.viewers,
+        "burst": args.burst,
+        "concurrency": args.concurrency,
+        **measured,
+    }
+    print(json.dumps(result, indent=2))
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+        history = []
+        if os.path.exists(RESULTS_FILE):
+            with open(RESULTS_FILE) as f:
+                history = json.load(f)
+        history.append(result)
+        with open(RESULTS_FILE, "w") as f:
+            json.dump(history, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
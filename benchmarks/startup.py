@@ -0,0 +1,115 @@
+"""Startup benchmark: import time of main.py and time to first response.
+
+Each measurement runs in a fresh interpreter. Results are appended to
+benchmarks/results/startup.json so runs can be compared over time:
+
+    python benchmarks/startup.py --label "lazy engine"
+    python benchmarks/startup.py --app-dir /path/to/other/checkout --label baseline
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from datetime import datetime, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS_FILE = os.path.join(HERE, "results", "startup.json")
+
+IMPORT_SNIPPET = (
+    "import time; t = time.perf_counter(); import main; "
+    "print('IMPORT_MS', (time.perf_counter() - t) * 1000)"
+)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_import(app_dir, env):
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET], cwd=app_dir, env=env,
+        capture_output=True, text=True, check=True,
+    ).stdout
+    line = [line for line in output.splitlines() if line.startswith("IMPORT_MS")][-1]
+    return float(line.split()[1])
+
+
+def measure_first_response(app_dir, env, path, timeout=30):
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=app_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=1) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - started) * 1000
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError(f"server did not answer {path} within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def git_commit(app_dir):
+    try:
+        # "-dirty" when the measured tree has uncommitted changes, so it isn't credited to HEAD
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=app_dir,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app-dir", default=os.path.dirname(HERE))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/health", help="endpoint polled for the first response")
+    parser.add_argument("--label", default="")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "sqlite:///./startup_bench.db")
+
+    imports = [measure_import(args.app_dir, env) for _ in range(args.runs)]
+    first = [measure_first_response(args.app_dir, env, args.path) for _ in range(args.runs)]
+
+    result = {
+        "label": args.label,
+        "commit": git_commit(args.app_dir),
+        "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "runs": args.runs,
+        "path": args.path,
+        "import_ms_median": round(statistics.median(imports), 1),
+        "first_response_ms_median": round(statistics.median(first), 1),
+    }
+    print(json.dumps(result, indent=2))
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+        history = []
+        if os.path.exists(RESULTS_FILE):
+            with open(RESULTS_FILE) as f:
+                history = json.load(f)
+        history.append(result)
+        with open(RESULTS_FILE, "w") as f:
+            json.dump(history, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
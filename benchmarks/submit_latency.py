@@ -0,0 +1,168 @@
+"""Load benchmark for POST /submit-survey.
+
+Starts the app under uvicorn (one worker) against a fresh SQLite file, or
+the PostgreSQL database given with --database-url (rows are added to it,
+nothing is removed), fires concurrent form submissions at it and reports
+throughput and p50/p99 latency. --env sets server settings, so the old
+behaviour and the pooled engine are compared with e.g.
+
+    python benchmarks/submit_latency.py --env DB_POOL_MODE=null --env DB_ASYNC=false --label "NullPool + sync"
+    python benchmarks/submit_latency.py --label "pooled + aiosqlite"
+
+--url loads an already running server instead. Results are appended to
+benchmarks/results/submit_latency.json. Requires httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+RESULTS_FILE = os.path.join(HERE, "results", "submit_latency.json")
+
+FORM = {
+    "participated_fully": "true",
+    "lab_session": "Online/Recorded Session - Flexible timing",
+    "unit_content_quality": "4",
+    "teaching_effectiveness": "5",
+    "assessment_fairness": "3",
+    "learning_resources": "4",
+    "overall_experience": "4",
+    "positive_aspects": "benchmark",
+    "consent_given": "true",
+}
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(url, total, concurrency):
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(base_url=url, timeout=30) as client:
+        async def one():
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/submit-survey", data=FORM)
+                latencies.append((time.perf_counter() - start) * 1000)
+                if response.status_code != 303:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "errors": errors,
+        "requests_per_second": round(total / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "max_ms": round(max(latencies), 1),
+        "mean_ms": round(statistics.mean(latencies), 1),
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve_and_run(env, total, concurrency):
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning",
+         "--no-access-log"],
+        cwd=APP_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.perf_counter() + 60
+        while True:
+            try:
+                httpx.get(f"http://127.0.0.1:{port}/readyz", timeout=1).raise_for_status()
+                break
+            except httpx.HTTPError:
+                if time.perf_counter() > deadline:
+                    raise RuntimeError("server did not become ready")
+                time.sleep(0.1)
+        return asyncio.run(run(f"http://127.0.0.1:{port}", total, concurrency))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def git_commit():
+    try:
+        # "-dirty" when the measured tree has uncommitted changes, so it isn't credited to HEAD
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=APP_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="load this running server instead of starting one")
+    parser.add_argument("--database-url", help="default: a fresh SQLite file")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="server setting")
+    parser.add_argument("-n", "--requests", type=int, default=1000)
+    parser.add_argument("-c", "--concurrency", type=int, default=20)
+    parser.add_argument("--label", default="")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+    settings = dict(item.split("=", 1) for item in args.env)
+
+    if args.url:
+        measured = asyncio.run(run(args.url, args.requests, args.concurrency))
+    else:
+        with tempfile.TemporaryDirectory(prefix="submit-bench-") as tmp:
+            # One client address sends everything, so the per-client limit is off
+            env = dict(os.environ, DATABASE_URL=args.database_url or f"sqlite:///{tmp}/submit.db",
+                       SPOOL_DIR=os.path.join(tmp, "spool"), RATE_LIMIT_ENABLED="false", **settings)
+            measured = serve_and_run(env, args.requests, args.concurrency)
+
+    result = {
+        "label": args.label,
+        "commit": git_commit(),
+        "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "backend": "postgresql" if args.database_url else ("sqlite" if not args.url else None),
+        "settings": settings,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        **measured,
+    }
+    print(json.dumps(result, indent=2))
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+        history = []
+        if os.path.exists(RESULTS_FILE):
+            with open(RESULTS_FILE) as f:
+                history = json.load(f)
+        history.append(result)
+        with open(RESULTS_FILE, "w") as f:
+            json.dump(history, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Worker scaling benchmark: throughput and latency of the gunicorn profile per worker count.
+
+For each worker count gunicorn is started with gunicorn.conf.py on a spare
+port, and several client processes drive keep-alive HTTP/1.1 load against
+one path for a fixed duration. Each client process runs many connections
+on asyncio streams, so the clients are cheap next to the server. Results
+are appended to benchmarks/results/worker_scaling.json:
+
+    python benchmarks/worker_scaling.py --workers 1 2 4 --path /survey
+
+Scaling needs cores: on a machine with fewer cores than workers (or with the
+clients competing for the same cores) extra workers only add overhead.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+RESULTS_FILE = os.path.join(HERE, "results", "worker_scaling.json")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def connection(port, path, deadline, samples, errors):
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    except OSError:
+        errors.append(1)
+        return
+    request = f"GET {path} HTTP/1.1\r\nHost: bench\r\n\r\n".encode()
+    try:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            writer.write(request)
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            await reader.readexactly(length)
+            samples.append(time.perf_counter() - started)
+    except (OSError, asyncio.IncompleteReadError):
+        errors.append(1)
+    finally:
+        writer.close()
+
+
+def client(port, path, connections, duration, output):
+    samples, errors = [], []
+
+    async def run():
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(connection(port, path, deadline, samples, errors) for _ in range(connections)))
+
+    asyncio.run(run())
+    output.put((samples, len(errors)))
+
+
+def wait_ready(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/livez", timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("gunicorn did not become ready")
+
+
+def measure(workers, args):
+    port = free_port()
+    env = dict(
+        os.environ, PORT=str(port), WEB_CONCURRENCY=str(workers),
+        PROMETHEUS_MULTIPROC_DIR=tempfile.mkdtemp(prefix="survey-bench-metrics-"),
+        LOG_LEVEL="WARNING",
+        # Worker recycling would reset connections mid-run
+        GUNICORN_MAX_REQUESTS="0",
+    )
+    env.setdefault("DATABASE_URL", "sqlite:///./worker_bench.db")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--log-level", "warning", "main:app"],
+        cwd=APP_DIR, env=env,
+    )
+    try:
+        wait_ready(port)
+        # Warm every worker's page cache before measuring
+        for _ in range(workers * 20):
+            urllib.request.urlopen(f"http://127.0.0.1:{port}{args.path}").read()
+
+        output = multiprocessing.Queue()
+        clients = [
+            multiprocessing.Process(target=client, args=(port, args.path, args.connections, args.duration, output))
+            for _ in range(args.clients)
+        ]
+        for process in clients:
+            process.start()
+        samples, errors = [], 0
+        for _ in clients:
+            client_samples, client_errors = output.get()
+            samples += client_samples
+            errors += client_errors
+        for process in clients:
+            process.join()
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+
+    samples.sort()
+    return {
+        "workers": workers,
+        "requests": len(samples),
+        "errors": errors,
+        "rps": round(len(samples) / args.duration, 1),
+        "p50_ms": round(samples[len(samples) // 2] * 1e3, 2),
+        "p99_ms": round(samples[int(len(samples) * 0.99)] * 1e3, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--path", default="/survey")
+    parser.add_argument("--clients", type=int, default=2, help="client processes")
+    parser.add_argument("--connections", type=int, default=32, help="keep-alive connections per client")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per worker count")
+    parser.add_argument("--label", default="")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    result = {
+        "label": args.label,
+        "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "cpus": len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count(),
+        "path": args.path,
+        "connections": args.clients * args.connections,
+        "duration_s": args.duration,
+        "runs": [measure(workers, args) for workers in args.workers],
+    }
+    print(json.dumps(result, indent=2))
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+        history = []
+        if os.path.exists(RESULTS_FILE):
+            with open(RESULTS_FILE) as f:
+                history = json.load(f)
+        history.append(result)
+        with open(RESULTS_FILE, "w") as f:
+            json.dump(history, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Build the stylesheet and script into static/ with content-hashed names.
+
+    python build_assets.py
+
+assets/app.css goes through the Tailwind CLI, which keeps only the
+utilities used in templates/ and minifies the result;
+assets/app.js is minified with rjsmin. Each output is written as
+static/<name>.<hash>.<ext> with .gz and .br variants next to it, and
+static/manifest.json maps the source names to the built ones. Run it
+after changing a template's classes or an asset, and commit static/.
+
+Needs the build-only packages (the app itself does not):
+
+    pip install tailwindcss-bin==4.3.3 rjsmin==1.3.0
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+
+from assets import ASSETS_DIR, MANIFEST_FILE, STATIC_DIR
+
+try:
+    import brotli
+except ImportError:  # without it only the .gz variants are written
+    brotli = None
+
+# The Tailwind standalone CLI (installed by tailwindcss-bin)
+TAILWINDCSS = os.getenv("TAILWINDCSS", "tailwindcss")
+
+
+def build_css(source):
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "app.css")
+        subprocess.run([TAILWINDCSS, "--input", source, "--output", output, "--minify"],
+                       check=True, capture_output=True)
+        with open(output, "rb") as f:
+            return f.read()
+
+
+def build_js(source):
+    import rjsmin
+
+    with open(source, encoding="utf-8") as f:
+        return rjsmin.jsmin(f.read(), keep_bang_comments=False).encode("utf-8")
+
+
+BUILDERS = {"app.css": build_css, "app.js": build_js, "dashboard.js": build_js}
+
+
+def write(name, body):
+    """Writes name.<hash>.ext plus compressed variants; returns the hashed name."""
+    stem, ext = os.path.splitext(name)
+    hashed = f"{stem}.{hashlib.sha256(body).hexdigest()[:12]}{ext}"
+    path = os.path.join(STATIC_DIR, hashed)
+    with open(path, "wb") as f:
+        f.write(body)
+    with open(path + ".gz", "wb") as f:
+        f.write(gzip.compress(body, 9, mtime=0))
+    if brotli is not None:
+        with open(path + ".br", "wb") as f:
+            f.write(brotli.compress(body, quality=11))
+    return hashed
+
+
+def build():
+    # Start from an empty directory so files of earlier builds don't pile up
+    shutil.rmtree(STATIC_DIR, ignore_errors=True)
+    os.makedirs(STATIC_DIR)
+    manifest = {}
+    sizes = {}
+    for name, builder in BUILDERS.items():
+        body = builder(os.path.join(ASSETS_DIR, name))
+        manifest[name] = write(name, body)
+        sizes[manifest[name]] = len(body)
+    with open(MANIFEST_FILE, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.write("\n")
+    return sizes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.parse_args()
+    for name, size in build().items():
+        print(f"static/{name}: {size} bytes")
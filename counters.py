@@ -0,0 +1,54 @@
+import asyncio
+import time
+
+from sqlalchemy import func, select
+
+from database import FIT5122SurveyResponse, env_int, new_read_session
+
+# Upper bound (seconds) on how old the reported total may be before it is recounted
+RESPONSE_COUNT_MAX_STALENESS = env_int("RESPONSE_COUNT_MAX_STALENESS", 60)
+
+
+class ResponseCounter:
+    """Total number of stored survey responses without a COUNT(*) per probe.
+
+    Inserts made by this process bump the value immediately. Rows written by
+    other workers are picked up by a full recount at most once every
+    ``max_staleness`` seconds, and concurrent callers share that recount.
+    """
+
+    def __init__(self, max_staleness=RESPONSE_COUNT_MAX_STALENESS):
+        self.max_staleness = max_staleness
+        self.value = None
+        self.refreshed_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def increment(self, n=1):
+        if self.value is not None:
+            self.value += n
+
+    def age(self):
+        return time.monotonic() - self.refreshed_at
+
+    async def refresh(self):
+        # A replica's count lags by at most DB_REPLICA_MAX_LAG; local inserts are added on top
+        db = new_read_session()
+        try:
+            total = await db.scalar(select(func.count()).select_from(FIT5122SurveyResponse))
+        finally:
+            await db.close()
+        self.value = total
+        self.refreshed_at = time.monotonic()
+        return total
+
+    async def get(self):
+        if self.value is not None and self.age() < self.max_staleness:
+            return self.value
+        async with self._lock:
+            # Another caller may have refreshed while we waited for the lock
+            if self.value is None or self.age() >= self.max_staleness:
+                await self.refresh()
+        return self.value
+
+
+response_counter = ResponseCounter()
@@ -0,0 +1,725 @@
+from contextvars import ContextVar
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool, StaticPool
+from starlette.concurrency import run_in_threadpool
+import asyncio
+import importlib.util
+import itertools
+import logging
+import os
+import ssl
+import time
+
+logger = logging.getLogger(__name__)
+
+SSL_ROOT_CERT = '/etc/ssl/certs/ca-certificates.crt'
+# Neon needs "require"; set DB_SSLMODE=disable for a local PostgreSQL without TLS
+DB_SSLMODE = os.getenv("DB_SSLMODE", "require")
+
+
+def env_bool(name, default):
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def env_int(name, default):
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return int(value)
+
+
+# Pool settings (all overridable from the environment)
+DB_POOL_MODE = os.getenv("DB_POOL_MODE", "queue").lower()  # "queue" or "null"
+DB_POOL_SIZE = env_int("DB_POOL_SIZE", 5)
+DB_MAX_OVERFLOW = env_int("DB_MAX_OVERFLOW", 10)
+DB_POOL_TIMEOUT = env_int("DB_POOL_TIMEOUT", 30)
+# Neon terminates idle connections after ~5 minutes, so recycle before that
+DB_POOL_RECYCLE = env_int("DB_POOL_RECYCLE", 280)
+DB_POOL_PRE_PING = env_bool("DB_POOL_PRE_PING", True)
+# Connections all workers together may hold (Neon's smallest compute allows ~100);
+# each worker's pool is capped at its share, see pool_limits()
+DB_MAX_CONNECTIONS = env_int("DB_MAX_CONNECTIONS", 100)
+# Set by gunicorn.conf.py (and by most PaaS) to the number of worker processes
+WEB_CONCURRENCY = env_int("WEB_CONCURRENCY", 1)
+# "auto" uses asyncpg/aiosqlite when installed, "true" requires them, "false" forces sync
+DB_ASYNC = os.getenv("DB_ASYNC", "auto").lower()
+
+# Advisory lock key that serialises schema setup across workers (PostgreSQL)
+SCHEMA_LOCK_KEY = 512202501
+
+# Comma-separated read replica URLs (same backend as DATABASE_URL). Reads that
+# can be a few seconds stale use them; writes always go to DATABASE_URL
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# A replica further behind the primary than this is skipped until it catches up
+DB_REPLICA_MAX_LAG = env_int("DB_REPLICA_MAX_LAG", 5)
+# How often each worker measures replica lag (and how long it waits for an answer)
+DB_REPLICA_CHECK_SECONDS = env_int("DB_REPLICA_CHECK_SECONDS", 5)
+# A client that wrote this recently reads from the primary; 0 turns this off. The
+# default covers the largest lag a replica can have and still be used
+DB_READ_YOUR_WRITES_SECONDS = env_int("DB_READ_YOUR_WRITES_SECONDS", DB_REPLICA_MAX_LAG + DB_REPLICA_CHECK_SECONDS)
+READ_YOUR_WRITES_COOKIE = "db_last_write"
+
+
+def resolve_database_url():
+    url = os.getenv("DATABASE_URL")
+
+    if not url:
+        logger.warning("DATABASE_URL not set, using SQLite for local testing")
+        url = "sqlite:///./test.db"
+    else:
+        logger.info("DATABASE_URL found in environment")
+
+    # Railway/Heroku style URLs still use the old scheme name
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    return url
+
+# Models live in models.py; re-exported here for existing imports
+from models import (Base, FIT5122AnalyticsState, FIT5122BeaconHistogram, FIT5122CommentAnalysis,  # noqa: E402,F401
+                    FIT5122CommentTheme, FIT5122RatingSummary, FIT5122ReportCell, FIT5122ReportRun,
+                    FIT5122SurveyResponse, SurveyDefinition, SurveyResponse)
+
+
+def database_unavailable(exc):
+    """Whether exc means the database could not be reached, rather than that it refused the statement."""
+    if isinstance(exc, DBAPIError):
+        return exc.connection_invalidated or isinstance(exc, (OperationalError, InterfaceError))
+    return isinstance(exc, (OSError, asyncio.TimeoutError, PoolTimeoutError))
+
+
+def dialect_insert(backend):
+    # INSERT construct that supports on_conflict_do_update/do_nothing
+    if backend == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+def is_postgres(url):
+    return make_url(url).get_backend_name() == "postgresql"
+
+
+def is_memory_sqlite(url):
+    url = make_url(url)
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def pool_limits(workers=None, budget=None):
+    """(pool_size, max_overflow) for one worker, so that workers x (size + overflow) <= budget.
+
+    Every worker keeps at least one connection, even past the budget.
+    """
+    workers = max(1, workers or WEB_CONCURRENCY)
+    budget = budget or DB_MAX_CONNECTIONS
+    per_worker = max(1, budget // workers)
+    pool_size = min(DB_POOL_SIZE, per_worker)
+    return pool_size, max(0, min(DB_MAX_OVERFLOW, per_worker - pool_size))
+
+
+def pool_kwargs(url):
+    # SQLite in-memory databases only exist on a single connection
+    if is_memory_sqlite(url):
+        return {"poolclass": StaticPool}
+    if DB_POOL_MODE == "null":
+        return {"poolclass": NullPool, "pool_pre_ping": DB_POOL_PRE_PING}
+    pool_size, max_overflow = pool_limits()
+    if make_url(url).get_backend_name() == "sqlite":
+        # SQLite takes one writer at a time; extra connections only wait on its file
+        # lock, in busy-handler sleeps of up to 100ms each, rather than in the pool's queue
+        pool_size, max_overflow = 1, 0
+    return {
+        "poolclass": QueuePool,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+def pool_description():
+    pool_size, max_overflow = pool_limits()
+    return {"workers": WEB_CONCURRENCY, "pool_size": pool_size, "max_overflow": max_overflow,
+            "budget": DB_MAX_CONNECTIONS}
+
+
+def sync_connect_args(url):
+    if is_postgres(url):
+        if DB_SSLMODE == "disable":
+            return {'sslmode': 'disable'}
+        return {'sslmode': DB_SSLMODE, 'sslrootcert': SSL_ROOT_CERT}
+    if make_url(url).get_backend_name() == "sqlite":
+        # Sessions are handed to the threadpool, so allow cross-thread use
+        return {"check_same_thread": False}
+    return {}
+
+
+def async_driver_available(url):
+    backend = make_url(url).get_backend_name()
+    if backend == "postgresql":
+        return importlib.util.find_spec("asyncpg") is not None
+    if backend == "sqlite":
+        return importlib.util.find_spec("aiosqlite") is not None
+    return False
+
+
+def async_url_and_args(url):
+    url = make_url(url)
+    if url.get_backend_name() == "postgresql":
+        # asyncpg does not understand libpq query options such as sslmode
+        query = {k: v for k, v in url.query.items() if k not in ("sslmode", "channel_binding")}
+        url = url.set(drivername="postgresql+asyncpg", query=query)
+        if DB_SSLMODE == "disable":
+            return url, {"ssl": False}
+        ssl_context = ssl.create_default_context(
+            cafile=SSL_ROOT_CERT if os.path.exists(SSL_ROOT_CERT) else None
+        )
+        return url, {"ssl": ssl_context}
+    if url.get_backend_name() == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite"), {}
+    return url, {}
+
+
+def create_sync_engine(url, pooled=True):
+    # Unpooled beside an async engine: it then only runs migrations and CLI tools,
+    # so it holds no connections between uses and pool_limits need not count it
+    kwargs = pool_kwargs(url) if pooled else {"poolclass": NullPool}
+    return create_engine(url, connect_args=sync_connect_args(url), **instrumented(kwargs))
+
+
+def create_async_db_engine(url):
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    async_url, connect_args = async_url_and_args(url)
+    kwargs = pool_kwargs(url)
+    if kwargs.get("poolclass") is QueuePool:
+        kwargs["poolclass"] = AsyncAdaptedQueuePool
+    return create_async_engine(async_url, connect_args=connect_args, **instrumented(kwargs))
+
+
+def instrumented(kwargs):
+    from metrics import METRICS_ENABLED, instrumented_pool_class
+
+    if METRICS_ENABLED:
+        kwargs = dict(kwargs, poolclass=instrumented_pool_class(kwargs["poolclass"]))
+    return kwargs
+
+
+def instrument(engine):
+    from metrics import METRICS_ENABLED, instrument_engine, instrument_sessions
+
+    if METRICS_ENABLED:
+        instrument_engine(engine)
+        instrument_sessions()
+    return engine
+
+
+def use_async(url):
+    if DB_ASYNC in ("0", "false", "no", "off"):
+        return False
+    available = async_driver_available(url)
+    if DB_ASYNC in ("1", "true", "yes", "on") and not available:
+        raise RuntimeError("DB_ASYNC is enabled but no async driver is installed for this database")
+    return available
+
+
+class SyncSessionAdapter:
+    """Gives a sync Session the AsyncSession call style.
+
+    Blocking work is pushed onto the threadpool so handlers never stall the
+    event loop when no async driver is installed.
+    """
+
+    def __init__(self, session):
+        self.sync_session = session
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+
+    async def connection(self):
+        return await run_in_threadpool(self.sync_session.connection)
+
+    async def execute(self, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.execute, *args, **kwargs)
+
+    async def scalar(self, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalar, *args, **kwargs)
+
+    async def commit(self):
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def refresh(self, instance):
+        await run_in_threadpool(self.sync_session.refresh, instance)
+
+    async def close(self):
+        await run_in_threadpool(self.sync_session.close)
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return await run_in_threadpool(fn, self.sync_session, *args, **kwargs)
+
+
+# Nothing below is created at import time; configure() runs on first use
+DATABASE_URL = None
+engine = None
+SessionLocal = None
+async_engine = None
+AsyncSessionLocal = None
+DB_BACKEND = None
+replica_set = None
+
+
+def create_engines(url):
+    """(engine, SessionLocal, async_engine, AsyncSessionLocal) for ``url``; the async pair is None without a driver."""
+    sync_only = not use_async(url) or is_memory_sqlite(url)
+    sync_engine = instrument(create_sync_engine(url, pooled=sync_only))
+    sync_sessions = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=sync_engine)
+    if sync_only:
+        return sync_engine, sync_sessions, None, None
+
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    db_engine = create_async_db_engine(url)
+    instrument(db_engine.sync_engine)
+    return sync_engine, sync_sessions, db_engine, async_sessionmaker(db_engine, autoflush=False,
+                                                                      expire_on_commit=False)
+
+
+def configure(url=None, replica_urls=None):
+    """(Re)build the engines and session factories for ``url`` and the read replicas.
+
+    Creating an engine does not connect; the first connection happens when
+    a session or ping() needs one.
+    """
+    global DATABASE_URL, engine, SessionLocal, async_engine, AsyncSessionLocal, DB_BACKEND, replica_set
+
+    if url is None:
+        url = resolve_database_url()
+    DATABASE_URL = url
+    DB_BACKEND = make_url(url).get_backend_name()
+    # For Neon PostgreSQL with SSL
+    if is_postgres(url):
+        logger.info("Using PostgreSQL with SSL configuration")
+    else:
+        logger.info("Using SQLite database")
+
+    engine, SessionLocal, async_engine, AsyncSessionLocal = create_engines(url)
+    if async_engine is not None:
+        logger.info("Using async driver %s with %s pool", async_engine.dialect.driver, DB_POOL_MODE,
+                    extra={"pool": pool_description()})
+    else:
+        logger.info("Using sync driver in threadpool with %s pool", DB_POOL_MODE,
+                    extra={"pool": pool_description()})
+
+    replica_set = ReplicaSet(DATABASE_REPLICA_URLS if replica_urls is None else replica_urls)
+    if replica_set.replicas:
+        logger.info("Routing reads to %d replica(s)", len(replica_set.replicas),
+                    extra={"replicas": [replica.name for replica in replica_set.replicas]})
+
+
+def ensure_configured():
+    if engine is None:
+        configure()
+
+
+def get_engine():
+    ensure_configured()
+    return engine
+
+
+def get_replicas():
+    ensure_configured()
+    return replica_set
+
+
+def _sync_init_schema():
+    from migrate import current_revision, head_revision
+
+    head = head_revision()
+    with engine.connect() as conn:
+        # Already at head (the usual restart): skip loading alembic altogether
+        up_to_date = head is not None and current_revision(conn) == head
+    if not up_to_date:
+        _sync_upgrade()
+    # Migrations ran on the sync engine; the async engine has its own pool
+    if async_engine is not None:
+        engine.dispose()
+
+
+def _sync_upgrade():
+    from migrate import upgrade
+
+    with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            # Only one worker runs migrations; the others wait, then find nothing to do
+            conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+        upgrade(conn)
+
+
+async def init_schema():
+    """Bring the schema up to date with the alembic migrations in migrations/.
+
+    Returns False if that failed. There is deliberately no fallback database:
+    submissions go to the local spool until the real one is reachable.
+    """
+    ensure_configured()
+    try:
+        await run_in_threadpool(_sync_init_schema)
+    except Exception:
+        logger.exception("Database setup failed")
+        return False
+    logger.info("Database setup complete")
+    return True
+
+
+def new_session():
+    # Caller is responsible for closing; background tasks use this directly
+    ensure_configured()
+    if AsyncSessionLocal is not None:
+        return AsyncSessionLocal()
+    return SyncSessionAdapter(SessionLocal())
+
+
+async def get_db():
+    db = new_session()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+def new_read_session():
+    """Session for reads that may be up to DB_REPLICA_MAX_LAG seconds stale.
+
+    On a replica when one is usable and the client hasn't just written,
+    otherwise on the primary. Never use it for anything that writes.
+    """
+    replica = get_replicas().choose()
+    if replica is None:
+        return new_session()
+    return ReplicaSession(replica)
+
+
+async def get_read_db():
+    db = new_read_session()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+def _sync_ping():
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+
+async def ping():
+    # Checks out a pooled connection (pre-ping included) and round-trips SELECT 1
+    ensure_configured()
+    if async_engine is not None:
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    else:
+        await run_in_threadpool(_sync_ping)
+
+
+async def stream_partitions(query, chunk_size=1000, read=False):
+    """Yield result rows in lists of up to ``chunk_size`` using a server-side cursor.
+
+    Only one chunk is held in memory at a time, whichever driver is in use.
+    With ``read`` the rows may come from a replica (see new_read_session).
+    """
+    ensure_configured()
+    query = query.execution_options(yield_per=chunk_size)
+    replica = replica_set.choose() if read else None
+    if replica is not None:
+        started = False
+        try:
+            async for partition in _stream_partitions(replica.engine, replica.async_engine, query, chunk_size):
+                started = True
+                yield partition
+            return
+        except Exception as e:
+            # Rows already sent can't be taken back, so only an unstarted read moves
+            if started or not database_unavailable(e):
+                raise
+            replica.failed(e)
+    async for partition in _stream_partitions(engine, async_engine, query, chunk_size):
+        yield partition
+
+
+async def _stream_partitions(sync_engine, db_engine, query, chunk_size):
+    if db_engine is not None:
+        async with db_engine.connect() as conn:
+            result = await conn.stream(query)
+            async for partition in result.partitions(chunk_size):
+                yield partition
+        return
+
+    conn = await run_in_threadpool(sync_engine.connect)
+    try:
+        result = await run_in_threadpool(conn.execute, query)
+        while True:
+            partition = await run_in_threadpool(result.fetchmany, chunk_size)
+            if not partition:
+                break
+            yield partition
+    finally:
+        await run_in_threadpool(conn.close)
+
+
+async def dispose_engines():
+    if replica_set is not None:
+        await replica_set.dispose()
+    if async_engine is not None:
+        await async_engine.dispose()
+    if engine is not None:
+        engine.dispose()
+
+
+# --- Read replicas
+
+# True while serving a client that wrote within DB_READ_YOUR_WRITES_SECONDS
+_read_primary = ContextVar("read_primary", default=False)
+
+# Seconds the replica's last replayed transaction is behind; 0 when it has replayed
+# everything it received, as an idle primary sends nothing newer to compare with
+REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+def routed(target):
+    from metrics import DB_READ_ROUTES
+
+    DB_READ_ROUTES.labels(target).inc()
+
+
+class ReadReplica:
+    """One replica's engines, and whether reads may go to it.
+
+    ``available`` is set by check() from the replica's lag, and cleared at
+    once when a read finds the replica unreachable.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.name = make_url(url).render_as_string(hide_password=True)
+        self.engine, self.SessionLocal, self.async_engine, self.AsyncSessionLocal = create_engines(url)
+        self.lag = None
+        self.error = None
+        # Tried until the first check says otherwise
+        self.available = True
+        self.checked_at = None
+
+    def new_session(self):
+        if self.AsyncSessionLocal is not None:
+            return self.AsyncSessionLocal()
+        return SyncSessionAdapter(self.SessionLocal())
+
+    def failed(self, error):
+        if self.available:
+            logger.warning("Read replica unreachable, reading from the primary: %s", error,
+                           extra={"replica": self.name})
+        self.available = False
+        self.lag = None
+        self.error = str(error)
+        routed("fallback")
+
+    def _sync_lag(self):
+        with self.engine.connect() as conn:
+            return conn.scalar(REPLICA_LAG_SQL if conn.dialect.name == "postgresql" else text("SELECT 0"))
+
+    async def measure_lag(self):
+        if self.async_engine is None:
+            return await run_in_threadpool(self._sync_lag)
+        async with self.async_engine.connect() as conn:
+            return await conn.scalar(REPLICA_LAG_SQL if conn.dialect.name == "postgresql" else text("SELECT 0"))
+
+    async def check(self, timeout=DB_REPLICA_CHECK_SECONDS, max_lag=DB_REPLICA_MAX_LAG):
+        try:
+            lag = await asyncio.wait_for(self.measure_lag(), timeout)
+        except Exception as e:
+            lag, self.error = None, str(e)
+        else:
+            # NULL: in recovery but nothing replayed yet, so no way to tell
+            self.error = None if lag is not None else "replica has not replayed any transaction"
+        self.lag = float(lag) if lag is not None else None
+        available = self.lag is not None and self.lag <= max_lag
+        if available != self.available:
+            logger.warning("Read replica %s", "back in use" if available else "skipped",
+                           extra={"replica": self.name, "lag_seconds": self.lag, "error": self.error})
+        self.available = available
+        self.checked_at = time.monotonic()
+        return available
+
+    def status(self):
+        return {"replica": self.name, "available": self.available,
+                "lag_seconds": round(self.lag, 3) if self.lag is not None else None, "error": self.error}
+
+    async def dispose(self):
+        if self.async_engine is not None:
+            await self.async_engine.dispose()
+        self.engine.dispose()
+
+
+class ReplicaSet:
+    """The read replicas, taken in turn, with a background task that checks their lag."""
+
+    def __init__(self, urls, check_interval=DB_REPLICA_CHECK_SECONDS):
+        self.replicas = [ReadReplica(url) for url in urls]
+        self.check_interval = check_interval
+        self.turns = itertools.count()
+        self.task = None
+
+    def choose(self):
+        """A replica to read from, or None for the primary."""
+        if not self.replicas:
+            return None
+        if _read_primary.get():
+            routed("read_your_writes")
+            return None
+        available = [replica for replica in self.replicas if replica.available]
+        if not available:
+            routed("primary")
+            return None
+        routed("replica")
+        return available[next(self.turns) % len(available)]
+
+    async def check(self):
+        return await asyncio.gather(*(replica.check() for replica in self.replicas))
+
+    async def start(self):
+        if self.replicas:
+            await self.check()
+            self.task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            await self.check()
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+
+    def status(self):
+        return [replica.status() for replica in self.replicas]
+
+    async def dispose(self):
+        for replica in self.replicas:
+            await replica.dispose()
+
+
+class ReplicaSession:
+    """A replica session that moves to the primary if the replica can't be reached.
+
+    Only a session's first statement is retried this way; once rows have
+    come from the replica, later statements must see the same database.
+    """
+
+    def __init__(self, replica):
+        self.replica = replica
+        self.session = replica.new_session()
+        self.started = False
+
+    async def _run(self, method, *args, **kwargs):
+        if self.started:
+            return await getattr(self.session, method)(*args, **kwargs)
+        try:
+            result = await getattr(self.session, method)(*args, **kwargs)
+        except Exception as e:
+            if not database_unavailable(e):
+                raise
+            self.replica.failed(e)
+            await self.close()
+            self.session = new_session()
+            result = await getattr(self.session, method)(*args, **kwargs)
+        self.started = True
+        return result
+
+    async def execute(self, *args, **kwargs):
+        return await self._run("execute", *args, **kwargs)
+
+    async def scalar(self, *args, **kwargs):
+        return await self._run("scalar", *args, **kwargs)
+
+    async def commit(self):
+        await self.session.commit()
+
+    async def rollback(self):
+        await self.session.rollback()
+
+    async def close(self):
+        try:
+            await self.session.close()
+        except Exception as e:
+            if not database_unavailable(e):
+                raise
+
+
+class ReadYourWritesMiddleware:
+    """Sends a client's reads to the primary for ``window`` seconds after it wrote.
+
+    Any successful request other than GET/HEAD/OPTIONS counts as a write
+    and sets a cookie holding its time; requests carrying a recent one
+    read from the primary instead of a replica that may not have it yet.
+    """
+
+    def __init__(self, app, window=DB_READ_YOUR_WRITES_SECONDS, exempt_paths=()):
+        self.app = app
+        self.window = window
+        self.exempt_paths = frozenset(exempt_paths)
+
+    def wrote_recently(self, scope):
+        for name, value in scope["headers"]:
+            if name != b"cookie":
+                continue
+            for part in value.decode("latin-1").split(";"):
+                key, _, written = part.strip().partition("=")
+                if key == READ_YOUR_WRITES_COOKIE:
+                    try:
+                        return 0 <= time.time() - float(written) < self.window
+                    except ValueError:
+                        return False
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        writes = scope["method"] not in ("GET", "HEAD", "OPTIONS") and scope["path"] not in self.exempt_paths
+        cookie = (f"{READ_YOUR_WRITES_COOKIE}={time.time():.3f}; Max-Age={self.window}; Path=/; "
+                  "HttpOnly; SameSite=Lax").encode("latin-1")
+
+        async def send_marked(message):
+            if writes and message["type"] == "http.response.start" and message["status"] < 400:
+                message["headers"] = list(message.get("headers", [])) + [(b"set-cookie", cookie)]
+            await send(message)
+
+        token = _read_primary.set(self.wrote_recently(scope))
+        try:
+            await self.app(scope, receive, send_marked)
+        finally:
+            _read_primary.reset(token)
@@ -0,0 +1,295 @@
+import argparse
+import asyncio
+import csv
+import importlib.util
+import io
+import json
+import zlib
+from datetime import datetime
+
+from sqlalchemy import select
+from starlette.responses import StreamingResponse
+
+from database import FIT5122SurveyResponse, env_int, stream_partitions
+
+EXPORT_CHUNK_SIZE = env_int("EXPORT_CHUNK_SIZE", 5000)
+# Concurrent /export streams per worker; more are refused with a 503. Each
+# holds a database connection for as long as its client takes to download,
+# so without a cap slow downloads could take the whole pool from submissions
+EXPORT_MAX_CONCURRENT = env_int("EXPORT_MAX_CONCURRENT", 2)
+EXPORT_COLUMNS = [column.name for column in FIT5122SurveyResponse.__table__.columns]
+# Columnar formats need the optional pyarrow dependency
+EXPORT_FORMATS = ("csv", "ndjson") + (("parquet", "arrow") if importlib.util.find_spec("pyarrow") else ())
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+def build_query(since=None, until=None, lab_session=None, consent=None):
+    table = FIT5122SurveyResponse.__table__
+    query = select(table).order_by(table.c.id)
+    if since is not None:
+        query = query.where(table.c.timestamp >= since)
+    if until is not None:
+        query = query.where(table.c.timestamp < until)
+    if lab_session is not None:
+        query = query.where(table.c.lab_session == lab_session)
+    if consent is not None:
+        # Bare boolean predicate so the partial index on consented rows matches
+        query = query.where(table.c.consent_given if consent else ~table.c.consent_given)
+    return query
+
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class CsvEncoder:
+    def header(self):
+        return self._encode([EXPORT_COLUMNS])
+
+    def encode(self, rows):
+        return self._encode(rows)
+
+    def finish(self):
+        return b""
+
+    def _encode(self, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([_plain(value) for value in row])
+        return buffer.getvalue().encode("utf-8")
+
+
+class NdjsonEncoder:
+    def header(self):
+        return b""
+
+    def encode(self, rows):
+        lines = [json.dumps(dict(zip(EXPORT_COLUMNS, row)), default=_plain, ensure_ascii=False) for row in rows]
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+    def finish(self):
+        return b""
+
+
+class _DrainSink(io.RawIOBase):
+    """Write-only file that hands back whatever was written since the last drain.
+
+    ``tell`` reports the running total, so Parquet footers keep correct
+    offsets while the bytes themselves are streamed out and forgotten.
+    """
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def arrow_schema():
+    import pyarrow as pa
+
+    types = {
+        "id": pa.int64(),
+        "timestamp": pa.timestamp("us", tz="UTC"),
+        "participated_fully": pa.bool_(),
+        "consent_given": pa.bool_(),
+    }
+    for name in ("unit_content_quality", "teaching_effectiveness", "assessment_fairness",
+                 "learning_resources", "overall_experience"):
+        types[name] = pa.int8()
+    return pa.schema([(name, types.get(name, pa.string())) for name in EXPORT_COLUMNS])
+
+
+class ArrowEncoder:
+    """Columnar output: one Parquet row group or Arrow IPC batch per chunk."""
+
+    def __init__(self, fmt):
+        import pyarrow as pa
+
+        self.pa = pa
+        self.schema = arrow_schema()
+        self.sink = _DrainSink()
+        if fmt == "parquet":
+            import pyarrow.parquet as pq
+
+            self.writer = pq.ParquetWriter(self.sink, self.schema, compression="zstd")
+        else:
+            self.writer = pa.ipc.new_stream(self.sink, self.schema)
+
+    def header(self):
+        return self.sink.drain()
+
+    def encode(self, rows):
+        columns = list(zip(*rows))
+        batch = self.pa.RecordBatch.from_arrays(
+            [self.pa.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+            schema=self.schema,
+        )
+        self.writer.write_batch(batch)
+        return self.sink.drain()
+
+    def finish(self):
+        self.writer.close()
+        return self.sink.drain()
+
+
+def make_encoder(fmt):
+    if fmt == "csv":
+        return CsvEncoder()
+    if fmt == "ndjson":
+        return NdjsonEncoder()
+    if fmt in ("parquet", "arrow"):
+        return ArrowEncoder(fmt)
+    raise ValueError(f"Unknown export format: {fmt}")
+
+
+class GzipStream:
+    def __init__(self):
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def encode(self, data):
+        return self.compressor.compress(data)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+class ExportSlots:
+    """The EXPORT_MAX_CONCURRENT cap, taken without waiting: a request either gets a slot or a 503."""
+
+    def __init__(self, limit=EXPORT_MAX_CONCURRENT):
+        self.limit = limit
+        self.in_use = 0
+
+    def take(self):
+        if self.in_use >= self.limit:
+            return False
+        self.in_use += 1
+        return True
+
+    def release(self):
+        self.in_use -= 1
+
+
+export_slots = ExportSlots()
+
+
+class ExportResponse(StreamingResponse):
+    """Streams an export and gives back the slot the route took, however the response ends.
+
+    On a disconnect Starlette cancels the stream over and over until it
+    stops. Cancelled mid-query, SQLAlchemy would drop the connection without
+    returning it to the pool, so each chunk is fetched in its own task, out
+    of the cancellation's reach. The generator is then closed and the slot
+    released here, which also covers a client that left before the body
+    started.
+    """
+
+    def __init__(self, content, **kwargs):
+        super().__init__(self._chunks(), **kwargs)
+        self.rows = content
+        self.fetching = None
+
+    async def _chunks(self):
+        while True:
+            self.fetching = asyncio.ensure_future(anext(self.rows))
+            try:
+                yield await asyncio.shield(self.fetching)
+            except StopAsyncIteration:
+                return
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            try:
+                if self.fetching is not None:
+                    await asyncio.gather(self.fetching, return_exceptions=True)
+                await self.rows.aclose()
+            finally:
+                export_slots.release()
+
+
+async def stream_export(query, fmt, gzip=False, chunk_size=EXPORT_CHUNK_SIZE):
+    encoder = make_encoder(fmt)
+    compressor = GzipStream() if gzip else None
+
+    def out(data):
+        return compressor.encode(data) if compressor is not None else data
+
+    yield out(encoder.header())
+    async for rows in stream_partitions(query, chunk_size, read=True):
+        chunk = out(encoder.encode(rows))
+        if chunk:
+            yield chunk
+    tail = out(encoder.finish())
+    if compressor is not None:
+        tail += compressor.finish()
+    yield tail
+
+
+def export_filename(fmt, gzip=False):
+    return f"fit5122_survey_responses.{fmt}" + (".gz" if gzip else "")
+
+
+def export_to_file(engine, query, fmt, fileobj, gzip=False, chunk_size=EXPORT_CHUNK_SIZE):
+    encoder = make_encoder(fmt)
+    compressor = GzipStream() if gzip else None
+
+    def write(data):
+        fileobj.write(compressor.encode(data) if compressor is not None else data)
+
+    rows_written = 0
+    write(encoder.header())
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=chunk_size).execute(query)
+        for rows in result.partitions():
+            write(encoder.encode(rows))
+            rows_written += len(rows)
+    write(encoder.finish())
+    if compressor is not None:
+        fileobj.write(compressor.finish())
+    return rows_written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export survey responses")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("--since", type=datetime.fromisoformat)
+    parser.add_argument("--until", type=datetime.fromisoformat)
+    parser.add_argument("--lab-session")
+    parser.add_argument("--consent", choices=("true", "false"))
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+    parser.add_argument("-o", "--output", help="output file (default: fit5122_survey_responses.<format>)")
+    args = parser.parse_args()
+
+    from database import get_engine
+
+    consent = None if args.consent is None else args.consent == "true"
+    query = build_query(args.since, args.until, args.lab_session, consent)
+    output = args.output or export_filename(args.format, args.gzip)
+    with open(output, "wb") as fileobj:
+        count = export_to_file(get_engine(), query, args.format, fileobj, args.gzip, args.chunk_size)
+    print(f"Exported {count} responses to {output}")
@@ -0,0 +1,76 @@
+# Production server profile: gunicorn managing uvicorn workers.
+#
+#     gunicorn -c gunicorn.conf.py main:app
+#
+# Every setting can be overridden from the environment (see below). The
+# worker count is exported as WEB_CONCURRENCY so database.py can split the
+# DB_MAX_CONNECTIONS budget between workers.
+import os
+import shutil
+import tempfile
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _cpu_count():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS
+        return os.cpu_count() or 1
+
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+# One worker per usable core: the app is async, so more workers per core only add memory
+workers = _env_int("WEB_CONCURRENCY", _cpu_count())
+# UvicornWorker picks uvloop and httptools automatically when they are installed
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Addresses whose X-Forwarded-For is believed, so each student is rate limited on
+# their own address rather than the proxy's. Railway's proxy has no fixed address
+# and is the only way in, so every peer is trusted unless this is narrowed
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "*")
+
+# Pending connections the kernel holds while every worker is busy
+backlog = _env_int("GUNICORN_BACKLOG", 2048)
+# Passed to uvicorn as timeout_keep_alive; longer than the proxy's idle
+# timeout so the proxy, not us, closes idle upstream connections
+keepalive = _env_int("GUNICORN_KEEPALIVE", 75)
+# A worker that misses heartbeats this long is restarted
+timeout = _env_int("GUNICORN_TIMEOUT", 60)
+# In-flight requests (and the ingest queue drain in lifespan) get this long on shutdown
+graceful_timeout = _env_int("GUNICORN_GRACEFUL_TIMEOUT", 30)
+# Recycle workers now and then to cap slow memory growth; jitter avoids all restarting at once
+max_requests = _env_int("GUNICORN_MAX_REQUESTS", 20000)
+max_requests_jitter = _env_int("GUNICORN_MAX_REQUESTS_JITTER", 2000)
+# Heartbeat files on tmpfs, so a slow disk can't make healthy workers look dead
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+# Each worker imports the app itself: engines, pools and the lifespan are per process
+preload_app = False
+accesslog = None
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+os.environ["WEB_CONCURRENCY"] = str(workers)
+# Workers write metric samples here and /metrics merges them (see metrics.py)
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "survey-prometheus"))
+
+
+def on_starting(server):
+    # Samples from a previous run would be merged into the new one
+    directory = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+    # Compile the templates once here; the workers then load them from the bytecode cache
+    from templating import precompile
+
+    precompile()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,374 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+
+from counters import response_counter
+from database import (DB_POOL_TIMEOUT, FIT5122SurveyResponse, PoolTimeoutError, database_unavailable, env_int,
+                      init_schema, new_session, ping)
+from live import live_updates
+from metrics import INGEST_QUEUE_DEPTH, SPOOL_PENDING_BYTES, SPOOL_RECORDS, SPOOL_REPLAY_LAG
+from ratelimit import submission_guard
+from reports import reports
+from spool import spool
+from stats import rating_stats
+
+logger = logging.getLogger(__name__)
+
+# "direct" commits each submission in the request, "batched" uses the write-behind queue
+INGEST_MODE = os.getenv("INGEST_MODE", "direct").lower()
+# "durable" answers once the row is committed, "queued" answers as soon as it is enqueued
+INGEST_ACK = os.getenv("INGEST_ACK", "durable").lower()
+INGEST_QUEUE_SIZE = env_int("INGEST_QUEUE_SIZE", 2000)
+INGEST_BATCH_SIZE = env_int("INGEST_BATCH_SIZE", 200)
+INGEST_FLUSH_MS = env_int("INGEST_FLUSH_MS", 50)
+# How long a request may wait for queue space before it is rejected
+INGEST_ENQUEUE_TIMEOUT_MS = env_int("INGEST_ENQUEUE_TIMEOUT_MS", 2000)
+# Connecting to the database (or a replay's ping) taking longer than this is
+# treated as an outage and the submission spooled. Waiting for a pooled
+# connection has DB_POOL_TIMEOUT on top, and a write under way is never cut off
+SPOOL_DB_TIMEOUT = env_int("SPOOL_DB_TIMEOUT", 5)
+SPOOL_REPLAY_INTERVAL_SECONDS = env_int("SPOOL_REPLAY_INTERVAL_SECONDS", 5)
+SPOOL_REPLAY_BATCH = env_int("SPOOL_REPLAY_BATCH", 500)
+
+
+class IngestQueueFull(Exception):
+    pass
+
+
+async def insert_responses(db, rows):
+    """Insert FIT5122 rows in the caller's transaction, skipping known submission ids.
+
+    Returns ``(results, deltas)``: one ``(status, id)`` per row, status being
+    "created" or "duplicate" (id of the row already stored), and the rating
+    histogram deltas of the created rows for ``rating_stats.apply`` after
+    commit. A row repeating an id earlier in the same batch is a duplicate.
+    """
+    table = FIT5122SurveyResponse.__table__
+    results = [None] * len(rows)
+    first_index = {}
+    for i, row in enumerate(rows):
+        key = row.get("submission_id")
+        if key is not None:
+            first_index.setdefault(key, i)
+
+    stored = {}
+    if first_index:
+        result = await db.execute(
+            select(table.c.submission_id, table.c.id).where(table.c.submission_id.in_(list(first_index)))
+        )
+        stored = dict(result.all())
+
+    new = [i for i, row in enumerate(rows)
+           if row.get("submission_id") is None
+           or (row["submission_id"] not in stored and first_index[row["submission_id"]] == i)]
+    if new:
+        # executemany with RETURNING: multi-row VALUES batches, ids in parameter order
+        result = await db.execute(
+            insert(table).returning(table.c.id, sort_by_parameter_order=True), [rows[i] for i in new]
+        )
+        for i, new_id in zip(new, result.scalars().all()):
+            results[i] = ("created", new_id)
+            if rows[i].get("submission_id") is not None:
+                stored[rows[i]["submission_id"]] = new_id
+
+    for i, row in enumerate(rows):
+        if results[i] is None:
+            results[i] = ("duplicate", stored[row["submission_id"]])
+    deltas = await rating_stats.record(db, [rows[i] for i in new])
+    return results, deltas
+
+
+async def store_responses(db, rows):
+    """insert_responses() and commit, then update the counter and histograms.
+
+    A concurrent request storing the same submission id makes the unique
+    index (on a partitioned table, migrate.guard_submission_ids) reject
+    the batch; it is retried once, when the lookup finds it.
+    """
+    for attempt in range(2):
+        try:
+            results, deltas = await insert_responses(db, rows)
+            await db.commit()
+            break
+        except IntegrityError:
+            await db.rollback()
+            if attempt:
+                raise
+    created = sum(1 for status, _ in results if status == "created")
+    response_counter.increment(created)
+    rating_stats.apply(deltas)
+    live_updates.publish()
+    reports.notify(created)
+    return results
+
+
+async def store_or_spool(db, rows):
+    """store_responses(), or the local spool while the database can't be reached.
+
+    Only getting a connection is timed. A pool that stays exhausted for
+    DB_POOL_TIMEOUT is load, not an outage: that submission is spooled but
+    later ones still try the database. Rows are given a submission id
+    first, so one whose connection was lost after it had committed is a
+    duplicate, not a second row, when its spooled copy is replayed.
+    Spooled rows are reported as ("spooled", None).
+    """
+    if spool is None:
+        return await store_responses(db, rows)
+    rows = [row if row.get("submission_id") else {**row, "submission_id": uuid.uuid4().hex} for row in rows]
+    if not spool_replayer.database_down:
+        try:
+            await asyncio.wait_for(db.connection(), DB_POOL_TIMEOUT + SPOOL_DB_TIMEOUT)
+            return await store_responses(db, rows)
+        except PoolTimeoutError:
+            logger.warning("No database connection free within %ss; spooling the submission", DB_POOL_TIMEOUT)
+        except Exception as e:
+            if not database_unavailable(e):
+                raise
+            spool_replayer.mark_down(e)
+    await spool.append(rows)
+    SPOOL_RECORDS.labels("written").inc(len(rows))
+    return [("spooled", None)] * len(rows)
+
+
+class SpoolReplayer:
+    """Drains the spool into fit5122_survey_responses in the background.
+
+    Every ``interval`` seconds, if anything is spooled, it checks the
+    database is reachable, closes this process's segment and replays each
+    segment it can lock in batches of ``batch_size`` rows, deleting the
+    segment once all of it is stored. Every spooled row has a submission
+    id, so replaying a segment twice (after a crash, say) stores nothing
+    twice. While ``database_down`` is set, submissions go straight to the
+    spool instead of waiting on a database that isn't there.
+    """
+
+    def __init__(self, spool, interval=SPOOL_REPLAY_INTERVAL_SECONDS, batch_size=SPOOL_REPLAY_BATCH):
+        self.spool = spool
+        self.interval = interval
+        self.batch_size = batch_size
+        self.database_down = False
+        self.migrate = False
+        self.task = None
+        self.rows_replayed = 0
+
+    def mark_down(self, reason):
+        if not self.database_down:
+            logger.warning("Database unreachable, spooling submissions locally: %s", reason)
+        self.database_down = True
+
+    async def start(self, migrate=False):
+        # migrate: the schema could not be set up at startup, so do it before replaying
+        self.migrate = migrate
+        if self.spool.ephemeral():
+            logger.warning("SPOOL_DIR (%s) is inside the app directory, so a redeploy loses whatever is spooled; "
+                           "point it at a persistent volume", self.spool.directory)
+        if migrate:
+            self.mark_down("schema setup failed at startup")
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+        await self.spool.seal()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.replay()
+            except Exception:
+                logger.exception("Spool replay failed; retrying in %ss", self.interval)
+            await asyncio.sleep(self.interval)
+
+    def update_metrics(self):
+        status = self.spool.status()
+        SPOOL_PENDING_BYTES.set(status["pending_bytes"])
+        SPOOL_REPLAY_LAG.set(status["oldest_seconds"] or 0)
+        return status
+
+    async def replay(self):
+        """One pass over the spool; returns the number of rows stored."""
+        if not self.update_metrics()["segments"] and not self.database_down:
+            return 0
+        stored = 0
+        try:
+            await asyncio.wait_for(ping(), SPOOL_DB_TIMEOUT)
+            if self.migrate:
+                if not await init_schema():
+                    return 0
+                self.migrate = False
+            await self.spool.seal()
+            for path in self.spool.segments():
+                segment = self.spool.claim(path)
+                if segment is None:
+                    continue
+                try:
+                    stored += await self._replay_segment(segment)
+                    segment.remove()
+                finally:
+                    segment.close()
+        except Exception as e:
+            if not database_unavailable(e):
+                raise
+            self.mark_down(e)
+            return stored
+        finally:
+            self.rows_replayed += stored
+            self.update_metrics()
+        if self.database_down:
+            logger.info("Database reachable again, writing submissions directly", extra={"replayed": stored})
+            self.database_down = False
+        elif stored:
+            logger.info("Replayed spooled submissions", extra={"rows": stored})
+        return stored
+
+    async def _replay_segment(self, segment):
+        rows = segment.records()
+        stored = 0
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            try:
+                stored += await self._store(batch)
+                continue
+            except Exception as e:
+                if database_unavailable(e):
+                    raise
+                logger.exception("Spooled batch refused; storing its rows one at a time")
+            for row in batch:
+                try:
+                    stored += await self._store([row])
+                except Exception as e:
+                    if database_unavailable(e):
+                        raise
+                    logger.exception("Spooled row refused; set aside in %s.rejected", segment.path)
+                    segment.reject([row])
+        return stored
+
+    async def _store(self, rows):
+        db = new_session()
+        try:
+            results = await store_responses(db, rows)
+        finally:
+            await db.close()
+        SPOOL_RECORDS.labels("replayed").inc(len(rows))
+        return sum(1 for status, _ in results if status == "created")
+
+
+class IngestQueue:
+    """Bounded in-process queue flushed to the database with multi-row INSERTs.
+
+    A batch is written when it reaches ``batch_size`` rows or when
+    ``flush_ms`` has passed since its first row, whichever comes first.
+    """
+
+    def __init__(self, batch_size=INGEST_BATCH_SIZE, flush_ms=INGEST_FLUSH_MS,
+                 maxsize=INGEST_QUEUE_SIZE, ack=INGEST_ACK,
+                 enqueue_timeout_ms=INGEST_ENQUEUE_TIMEOUT_MS):
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000
+        self.maxsize = maxsize
+        self.ack = ack
+        self.enqueue_timeout = enqueue_timeout_ms / 1000
+        self.queue = None
+        self.task = None
+        self.accepting = False
+        self.rows_written = 0
+        self.batches_written = 0
+
+    async def start(self):
+        self.queue = asyncio.Queue(maxsize=self.maxsize)
+        self.accepting = True
+        self.task = asyncio.create_task(self._run())
+
+    def depth(self):
+        return self.queue.qsize() if self.queue is not None else 0
+
+    async def submit(self, values):
+        if not self.accepting:
+            raise IngestQueueFull("ingestion queue is shutting down")
+
+        future = asyncio.get_running_loop().create_future() if self.ack == "durable" else None
+        try:
+            await asyncio.wait_for(self.queue.put((values, future)), self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            raise IngestQueueFull("ingestion queue is full")
+        INGEST_QUEUE_DEPTH.set(self.queue.qsize())
+
+        if future is not None:
+            await future
+
+    async def _run(self):
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            INGEST_QUEUE_DEPTH.set(self.queue.qsize())
+            await self._flush(batch)
+            if stop:
+                return
+
+    async def _flush(self, batch):
+        rows = [values for values, _ in batch]
+        db = new_session()
+        try:
+            results = await store_or_spool(db, rows)
+        except Exception as e:
+            await db.rollback()
+            logger.exception("Failed to write batch of survey responses", extra={"rows": len(rows)})
+            for values, future in batch:
+                if future is None:
+                    # Already acknowledged, so no caller is left to release the nonce
+                    if values.get("submission_id"):
+                        await submission_guard.release(values["submission_id"])
+                elif not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            await db.close()
+
+        created = sum(1 for status, _ in results if status == "created")
+        self.rows_written += created
+        self.batches_written += 1
+        for _, future in batch:
+            if future is not None and not future.done():
+                future.set_result(None)
+
+    async def stop(self):
+        # Stop taking new work, then let the writer drain everything already queued
+        if self.task is None:
+            return
+        self.accepting = False
+        await self.queue.put(None)
+        await self.task
+        self.task = None
+        logger.info("Ingestion queue drained",
+                    extra={"rows": self.rows_written, "batches": self.batches_written})
+
+
+ingest_queue = IngestQueue() if INGEST_MODE == "batched" else None
+spool_replayer = SpoolReplayer(spool) if spool is not None else None
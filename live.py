@@ -0,0 +1,160 @@
+import asyncio
+import json
+import logging
+import time
+
+from counters import response_counter
+from database import env_int
+from stats import rating_stats
+
+logger = logging.getLogger(__name__)
+
+# Submissions within this window are sent to viewers as one update
+LIVE_COALESCE_MS = env_int("LIVE_COALESCE_MS", 500)
+# Idle streams get a comment this often (proxies drop silent connections), and
+# the totals are re-read so other workers' submissions show up
+LIVE_HEARTBEAT_SECONDS = env_int("LIVE_HEARTBEAT_SECONDS", 15)
+# Concurrent /events streams per worker; more are refused with a 503
+LIVE_MAX_VIEWERS = env_int("LIVE_MAX_VIEWERS", 1000)
+# A stream ends after this long and the browser reconnects, which spreads
+# viewers over the workers again and keeps shutdowns from waiting on them
+LIVE_STREAM_SECONDS = env_int("LIVE_STREAM_SECONDS", 300)
+LIVE_RETRY_MS = env_int("LIVE_RETRY_MS", 3000)
+
+HEARTBEAT = b": keep-alive\n\n"
+
+
+class LiveUpdates:
+    """In-process pub/sub that pushes response counts and rating averages to dashboards.
+
+    publish() only flags that something changed. A single broadcaster task
+    folds every publish within LIVE_COALESCE_MS into one update, encodes
+    its SSE frame once and hands the same bytes to every viewer. A viewer
+    holds at most one pending frame, replaced by newer ones, so a slow
+    client never holds anything up. No viewer causes a query: updates are
+    built from response_counter and rating_stats, which refresh themselves
+    from the database at most once per staleness window per worker.
+    """
+
+    def __init__(self, coalesce_ms=LIVE_COALESCE_MS, heartbeat=LIVE_HEARTBEAT_SECONDS,
+                 max_viewers=LIVE_MAX_VIEWERS, stream_seconds=LIVE_STREAM_SECONDS):
+        self.coalesce = coalesce_ms / 1000
+        self.heartbeat = heartbeat
+        self.max_viewers = max_viewers
+        self.stream_seconds = stream_seconds
+        self.viewers = set()
+        self.changed = None
+        self.task = None
+        self.frame = None
+        self.state = None
+        self.sequence = 0
+        self.updates_sent = 0
+        self._lock = asyncio.Lock()
+
+    def publish(self):
+        if self.changed is not None:
+            self.changed.set()
+
+    def full(self):
+        return len(self.viewers) >= self.max_viewers
+
+    async def start(self):
+        self.changed = asyncio.Event()
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+        self.changed = None
+        # Ends every open stream
+        for queue in self.viewers:
+            self._offer(queue, None)
+
+    async def snapshot(self):
+        ratings = (await rating_stats.snapshot())["overall"]
+        total = await response_counter.get()
+        return {
+            "total_responses": total,
+            "ratings": {question: {"count": summary["count"], "mean": summary["mean"]}
+                        for question, summary in ratings.items()},
+        }
+
+    async def update(self):
+        """Rebuild the current frame; returns it, or None if nothing changed."""
+        async with self._lock:
+            state = await self.snapshot()
+            if state == self.state:
+                return None
+            previous = self.state["total_responses"] if self.state else state["total_responses"]
+            self.state = state
+            self.sequence += 1
+            payload = {**state, "new_responses": (state["total_responses"] or 0) - (previous or 0),
+                       "sequence": self.sequence}
+            self.frame = f"id: {self.sequence}\nevent: update\ndata: {json.dumps(payload)}\n\n".encode()
+            return self.frame
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.changed.wait(), self.heartbeat)
+            except asyncio.TimeoutError:
+                pass
+            if not self.viewers:
+                # Nobody is watching; the next viewer builds a fresh frame
+                self.changed.clear()
+                self.state = self.frame = None
+                continue
+            if self.changed.is_set():
+                # Let the rest of a burst arrive before building the update
+                await asyncio.sleep(self.coalesce)
+            self.changed.clear()
+            try:
+                frame = await self.update()
+            except Exception:
+                logger.warning("Live update failed; retrying at the next change", exc_info=True)
+                continue
+            if frame is not None:
+                self.updates_sent += 1
+            for queue in self.viewers:
+                self._offer(queue, frame or HEARTBEAT)
+
+    @staticmethod
+    def _offer(queue, frame):
+        if queue.full():
+            if frame is HEARTBEAT:
+                return
+            # The pending frame is out of date; the new one replaces it
+            queue.get_nowait()
+        queue.put_nowait(frame)
+
+    async def stream(self):
+        """SSE byte stream for one viewer: the current state, then every update."""
+        queue = asyncio.Queue(maxsize=1)
+        self.viewers.add(queue)
+        try:
+            if self.frame is None:
+                await self.update()
+            yield f"retry: {LIVE_RETRY_MS}\n\n".encode() + self.frame
+            deadline = time.monotonic() + self.stream_seconds
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                try:
+                    frame = await asyncio.wait_for(queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    return
+                if frame is None:
+                    return
+                yield frame
+        finally:
+            self.viewers.discard(queue)
+
+
+live_updates = LiveUpdates()
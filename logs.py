@@ -0,0 +1,193 @@
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from database import env_int
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Per-module overrides, e.g. "database=WARNING,ingest=DEBUG"
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+# Keep a fraction of the records below WARNING from a logger, e.g. "main.submissions=0.1"
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "")
+# "json" (one object per line) or "text" for reading locally
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# Records arriving while this many are waiting to be written are dropped
+LOG_QUEUE_SIZE = env_int("LOG_QUEUE_SIZE", 10000)
+
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+
+request_id = ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed via extra=
+_STANDARD_ATTRS = set(logging.LogRecord("", 0, "", 0, "", None, None).__dict__) | {"message", "request_id"}
+
+
+def parse_settings(value, convert):
+    settings = {}
+    for part in value.split(","):
+        name, _, setting = part.partition("=")
+        if name.strip() and setting.strip():
+            settings[name.strip()] = convert(setting.strip())
+    return settings
+
+
+class RequestIdFilter(logging.Filter):
+    # Runs in the thread that logged, where the request's context is current
+    def filter(self, record):
+        record.request_id = request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Drops a share of the sub-WARNING records of chosen loggers (and their children)."""
+
+    def __init__(self, rates):
+        super().__init__()
+        # Longest prefix first, so "main.submissions" wins over "main"
+        self.rates = sorted(rates.items(), key=lambda item: -len(item[0]))
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        for prefix, rate in self.rates:
+            if record.name == prefix or record.name.startswith(prefix + "."):
+                return random.random() < rate
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record):
+        if not hasattr(record, "request_id"):
+            record.request_id = None
+        return super().format(record)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never waits: when the queue is full the record is dropped and counted."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        # Resolve the message and traceback here, but leave the extra fields
+        # on the record for the formatter in the listener thread
+        record = logging.makeLogRecord(record.__dict__)
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+
+_listener = None
+_handler = None
+
+
+def setup_logging():
+    """Route all logging through a bounded queue to a stdout writer thread.
+
+    Idempotent; call stop_logging() on shutdown to flush what is queued.
+    """
+    global _listener, _handler
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    _handler = NonBlockingQueueHandler(log_queue)
+    _handler.addFilter(RequestIdFilter())
+    sampling = parse_settings(LOG_SAMPLING, float)
+    if sampling:
+        _handler.addFilter(SamplingFilter(sampling))
+
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(LOG_LEVEL)
+    for name, level in parse_settings(LOG_LEVELS, str.upper).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, output)
+    _listener.start()
+
+
+def stop_logging():
+    global _listener, _handler
+    if _listener is None:
+        return
+    _listener.stop()
+    logging.getLogger().removeHandler(_handler)
+    if _handler.dropped:
+        print(f"{_handler.dropped} log records were dropped because the log queue was full", file=sys.stderr)
+    _listener = _handler = None
+
+
+class RequestIdMiddleware:
+    """Gives every request an id (the client's X-Request-ID when it is sane) for its log lines.
+
+    The id is echoed back in the X-Request-ID response header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                incoming = value.decode("latin-1")
+                break
+        current = incoming if incoming and REQUEST_ID_PATTERN.match(incoming) else uuid.uuid4().hex
+        header = (b"x-request-id", current.encode("latin-1"))
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [header]
+            await send(message)
+
+        token = request_id.set(current)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id.reset(token)
@@ -1,86 +1,49 @@
-from fastapi import FastAPI, Request, Form, Depends
-from fastapi.responses import HTMLResponse, RedirectResponse
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.sql import func
+from fastapi import APIRouter, FastAPI, Request, Form, Depends, HTTPException
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, Response, StreamingResponse
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Optional
+import asyncio
+import json
+import logging
 import os
-import ssl
 
-# Create FastAPI app FIRST
-app = FastAPI(title="FIT5122 Unit Effectiveness Survey", version="1.0.0")
-
-print("🚀 Starting FIT5122 Survey Application...")
-
-# Database setup with SSL fix for Neon
-DATABASE_URL = os.getenv("DATABASE_URL")
-
-if not DATABASE_URL:
-    print("DATABASE_URL not set in environment variables")
-    print("Using SQLite for local testing")
-    DATABASE_URL = "sqlite:///./test.db"
-else:
-    print("DATABASE_URL found in environment")
-
-try:
-    # For Neon PostgreSQL with SSL
-    if "postgresql" in DATABASE_URL:
-        # Add SSL context for stable connections
-        import psycopg2
-        from sqlalchemy.pool import NullPool
-        
-        engine = create_engine(
-            DATABASE_URL,
-            poolclass=NullPool,  # Use NullPool to avoid connection issues
-            pool_pre_ping=True,  # Check connection before using
-            connect_args={
-                'sslmode': 'require',
-                'sslrootcert': '/etc/ssl/certs/ca-certificates.crt'
-            }
-        )
-        print("Using PostgreSQL with SSL configuration")
-    else:
-        # For SQLite
-        engine = create_engine(DATABASE_URL)
-        print("Using SQLite database")
-    
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    Base = declarative_base()
-    
-    class FIT5122SurveyResponse(Base):
-        __tablename__ = "fit5122_survey_responses"
-        id = Column(Integer, primary_key=True, index=True)
-        timestamp = Column(DateTime(timezone=True), server_default=func.now())
-        participated_fully = Column(Boolean, nullable=False)
-        lab_session = Column(String(100), nullable=True)
-        unit_content_quality = Column(Integer, nullable=True)
-        teaching_effectiveness = Column(Integer, nullable=True)
-        assessment_fairness = Column(Integer, nullable=True)
-        learning_resources = Column(Integer, nullable=True)
-        overall_experience = Column(Integer, nullable=True)
-        positive_aspects = Column(Text, nullable=True)
-        improvement_suggestions = Column(Text, nullable=True)
-        technical_issues = Column(Text, nullable=True)
-        additional_comments = Column(Text, nullable=True)
-        consent_given = Column(Boolean, nullable=False, default=False)
-    
-    Base.metadata.create_all(bind=engine)
-    print("Database setup complete")
-    
-except Exception as e:
-    print(f" Database setup failed: {e}")
-    print("🔄 Falling back to in-memory SQLite")
-    DATABASE_URL = "sqlite:///:memory:"
-    engine = create_engine(DATABASE_URL)
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    Base = declarative_base()
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+from pydantic import ValidationError
+
+# Database setup (pooled engine, async driver when available) lives in database.py
+from assets import STATIC_URL, StaticAssets
+from beacons import BEACON_MAX_BYTES, beacon_stats, beacon_summary, record_beacon
+from counters import response_counter
+import database
+from database import (DB_READ_YOUR_WRITES_SECONDS, ReadYourWritesMiddleware, SurveyResponse, dispose_engines, env_bool,
+                      env_int, get_db, get_read_db, get_replicas, init_schema, is_postgres, ping)
+from export import (EXPORT_FORMATS, MEDIA_TYPES, ExportResponse, build_query, export_filename, export_slots,
+                    stream_export)
+from ingest import IngestQueueFull, ingest_queue, spool_replayer, store_or_spool, store_responses
+from live import live_updates
+from logs import RequestIdMiddleware, setup_logging, stop_logging
+from metrics import METRICS_ENABLED, SUBMISSIONS_REJECTED, MetricsMiddleware, render_metrics
+from pages import RenderedPageCache
+from ratelimit import RATE_LIMIT_ENABLED, RateLimitMiddleware, submission_guard
+from reports import REPORTS, reports
+from schemas import SurveySubmission, error_details
+from search import SearchQueryError, search_responses
+from snapshot import ColumnarSnapshot
+from spool import SpoolFull
+from stats import rating_stats
+from surveys import (SurveyValidationError, load_definition_files, publish_definitions,
+                     render_errors, survey_registry)
+from templating import TemplatePage, precompile, render, render_static
+
+# Importing this module has no side effects: no DB connection, no DDL.
+# Everything stateful starts in lifespan() below.
+router = APIRouter()
+logger = logging.getLogger("main")
+# Per-submission lines; the busiest logger, so the usual target of LOG_SAMPLING
+submission_log = logging.getLogger("main.submissions")
+
+# Set to false when migrations run as a separate deploy step (python migrate.py upgrade)
+DB_MIGRATE_ON_STARTUP = env_bool("DB_MIGRATE_ON_STARTUP", True)
 
 # Lab sessions
 LAB_SESSIONS = [
@@ -105,382 +68,35 @@ LAB_SESSIONS = [
     "Did not attend any lab sessions"
 ]
 
-HTML_TEMPLATE = """
-<!DOCTYPE html>
-<html lang="en">
-<head>
-  <meta charset="UTF-8">
-  <title>FIT5122 Unit Effectiveness Survey - Monash University</title>
-  <meta name="viewport" content="width=device-width,initial-scale=1">
-  <script src="https://cdn.tailwindcss.com"></script>
-  <link href="https://fonts.googleapis.com/css2?family=Noto+Sans+JP:wght@400;700&display=swap" rel="stylesheet">
-  <style>
-    :root {
-      --clr-primary: #006DAE; /* Monash Blue */
-      --clr-secondary: #CC0000; /* Monash Red */
-    }
-    body { 
-      font-family: 'Noto Sans JP', sans-serif;
-      background: #aae6be;
-      min-height: 100vh;
-    }
-  </style>
-</head>
-<body>
-  <!-- Navigation Bar -->
-  <header class="bg-white shadow-lg">
-    <div class="container mx-auto px-6 py-4">
-      <div class="flex items-center justify-between">
-        <a href="https://zachng01.github.io/Showcase/" class="text-2xl font-bold text-fuchsia-600 hover:text-fuchsia-700">Zach Ng</a>
-        <nav class="hidden md:flex space-x-8">
-          <a href="https://zachng01.github.io/Showcase/" class="text-gray-700 hover:text-fuchsia-600 transition duration-300">Home</a>
-          <a href="https://zachng01.github.io/Showcase/zach.html" class="text-gray-700 hover:text-fuchsia-600 transition duration-300">About Me</a>
-          <a href="https://zachng01.github.io/Showcase/about.html" class="text-gray-700 hover:text-fuchsia-600 transition duration-300">My Skillset</a>
-          <a href="https://zachng01.github.io/Showcase/skills.html" class="text-fuchsia-600 font-semibold border-b-2 border-fuchsia-600">My Projects</a>
-          <a href="https://zachng01.github.io/Showcase/blog_main.html" class="text-gray-700 hover:text-fuchsia-600 transition duration-300">My Updates</a>
-        </nav>
-      </div>
-    </div>
-  </header>
-
-  <div class="min-h-screen flex items-center justify-center py-12 px-4">
-    <div class="max-w-4xl w-full bg-white/95 backdrop-blur-sm rounded-3xl shadow-2xl p-8">
-      <div class="text-center mb-8">
-        <div class="w-20 h-20 bg-blue-100 rounded-full flex items-center justify-center mx-auto mb-6">
-          <span class="text-3xl text-blue-600">🎓</span>
-        </div>
-        <h1 class="text-5xl font-bold text-gray-800 mb-4">FIT5122 Unit Effectiveness Survey</h1>
-        <p class="text-xl text-gray-600 mb-6">Monash Research Project</p>
-        <p class="text-lg text-gray-700">Monash University Faculty of Information Technology</p>
-      </div>
-
-      <!-- Survey Description -->
-        <div class="bg-blue-50 border-l-4 border-blue-500 p-6 rounded-lg mb-8">
-        <h2 class="text-2xl font-semibold text-blue-800 mb-3">About This Survey</h2>
-        <p class="text-gray-700 mb-4">
-            The Monash Faculty of Information Technology is undertaking a comprehensive study to assess the effectiveness of FIT5122 - Professional Practice. This research aims to evaluate student perceptions, content delivery, and overall learning experience. Your feedback will help us identify strengths and areas for improvement, ultimately enhancing the unit for future students.
-        </p>
-        <p class="text-gray-700">
-            The survey covers various aspects, including teaching quality, curriculum relevance, assessment methodology, and the overall student experience. Your honest responses are invaluable for continuous improvement.
-        </p>
-        </div>
-
-      <!-- Ethics Statement -->
-      <div class="bg-amber-50 border-l-4 border-amber-500 p-6 rounded-lg mb-8">
-        <h2 class="text-2xl font-semibold text-amber-800 mb-3">Ethics Approval & Confidentiality</h2>
-        <p class="text-amber-700 mb-3">
-          <strong>Monash University Human Research Ethics Committee (MUHREC) Approved</strong><br>
-          Project ID: 2025-12345-FIT5122 | Approval Date: October 7th, 2025
-        </p>
-
-        <ul class="text-amber-700 list-disc list-inside space-y-2">
-          <li>All responses collected are completely anonymous and confidential</li>
-          <li>Data will be used solely for educational research and unit improvement</li>
-          <li>Participation is voluntary, and you can withdraw or request deletion of your responses at any time.</li>
-          <li>Aggregated results may be used in academic publications</li>
-        </ul>
-        <p class="text-amber-600 text-sm mt-3">
-          * This implementation demonstrates understanding of ethical research practices with human subjects at Monash University.
-        </p>
-      </div>
-
-      <!-- Features Grid -->
-      <div class="grid md:grid-cols-3 gap-6 mb-8">
-        <div class="bg-white border border-blue-200 rounded-xl p-6 text-center shadow-sm hover:shadow-md transition-shadow">
-          <div class="w-12 h-12 bg-blue-100 rounded-full flex items-center justify-center mx-auto mb-4">
-            <span class="text-blue-600 text-xl">🔒</span>
-          </div>
-          <h3 class="font-semibold text-gray-800 mb-2">Confidential</h3>
-          <p class="text-gray-600 text-sm">Anonymous responses protected by Monash data policies</p>
-        </div>
-        
-        <div class="bg-white border border-green-200 rounded-xl p-6 text-center shadow-sm hover:shadow-md transition-shadow">
-          <div class="w-12 h-12 bg-green-100 rounded-full flex items-center justify-center mx-auto mb-4">
-            <span class="text-green-600 text-xl">⏱️</span>
-          </div>
-          <h3 class="font-semibold text-gray-800 mb-2">8-10 Minutes</h3>
-          <p class="text-gray-600 text-sm">Comprehensive yet time-efficient assessment</p>
-        </div>
-        
-        <div class="bg-white border border-purple-200 rounded-xl p-6 text-center shadow-sm hover:shadow-md transition-shadow">
-          <div class="w-12 h-12 bg-purple-100 rounded-full flex items-center justify-center mx-auto mb-4">
-            <span class="text-purple-600 text-xl">🌟</span>
-          </div>
-          <h3 class="font-semibold text-gray-800 mb-2">Impact Education</h3>
-          <p class="text-gray-600 text-sm">Directly influence future FIT5122 improvements</p>
-        </div>
-      </div>
-
-      <div class="text-center">
-        <a href="/survey" class="bg-blue-600 hover:bg-blue-700 text-white font-bold py-4 px-12 rounded-lg text-lg transition duration-300 transform hover:scale-105 inline-block shadow-lg">
-          Start Survey Now
-        </a>
-        <p class="text-gray-500 text-sm mt-4">
-          Data stored securely in Monash University approved systems
-        </p>
-      </div>
-    </div>
-  </div>
-
-  <footer class="bg-white/80 backdrop-blur-sm mt-12">
-    <div class="container mx-auto px-6 py-4 text-center">
-      <p class="text-gray-600">&copy; 2025 Monash University - FIT5122 Educational Research</p>
-      <p class="text-gray-500 text-sm">Ethics Approved: MUHREC Project 2025-12345-FIT5122</p>
-    </div>
-  </footer>
-</body>
-</html>
-"""
-
-
-@app.get("/", response_class=HTMLResponse)
-async def home():
-    return HTMLResponse(HTML_TEMPLATE)
-
-@app.get("/survey", response_class=HTMLResponse)
-async def survey_form():
-    lab_options = "".join([f'<option value="{session}">{session}</option>' for session in LAB_SESSIONS])
-    
-    # Generate unique rating options for each question
-    def generate_rating_options(field_name):
-        rating_html = ""
-        for i in range(1, 6):
-            rating_html += f"""
-            <label class="flex flex-col items-center cursor-pointer">
-                <input type="radio" name="{field_name}" value="{i}" class="sr-only" onchange="handleRatingChange(this)">
-                <div class="w-12 h-12 rounded-full border-2 border-blue-300 flex items-center justify-center transition-all duration-300 hover:bg-blue-100 rating-option" data-value="{i}">{i}</div>
-            </label>
-            """
-        return rating_html
-    
-    survey_html = f"""
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <title>FIT5122 Survey - Monash University</title>
-        <script src="https://cdn.tailwindcss.com"></script>
-        <link href="https://fonts.googleapis.com/css2?family=Noto+Sans+JP:wght@400;700&display=swap" rel="stylesheet">
-        <style>
-            body {{ font-family: 'Noto Sans JP', sans-serif; background: #f8fafc; }}
-            .rating-selected {{
-                background: #006DAE !important;
-                color: white !important;
-                border-color: #006DAE !important;
-                transform: scale(1.1);
-            }}
-        </style>
-    </head>
-    <body>
-        <!-- Navigation Bar -->
-        <header class="bg-white shadow-lg">
-            <div class="container mx-auto px-6 py-4">
-                <div class="flex items-center justify-between">
-                    <a href="https://zachng01.github.io/Showcase/" class="text-2xl font-bold text-fuchsia-600 hover:text-fuchsia-700">Zach Ng</a>
-                    <nav class="hidden md:flex space-x-8">
-                        <a href="https://zachng01.github.io/Showcase/" class="text-gray-700 hover:text-fuchsia-600 transition duration-300">Home</a>
-                        <a href="https://zachng01.github.io/Showcase/zach.html" class="text-gray-700 hover:text-fuchsia-600 transition duration-300">About Me</a>
-                        <a href="https://zachng01.github.io/Showcase/about.html" class="text-gray-700 hover:text-fuchsia-600 transition duration-300">My Skillset</a>
-                        <a href="https://zachng01.github.io/Showcase/skills.html" class="text-fuchsia-600 font-semibold border-b-2 border-fuchsia-600">My Projects</a>
-                        <a href="https://zachng01.github.io/Showcase/blog_main.html" class="text-gray-700 hover:text-fuchsia-600 transition duration-300">My Updates</a>
-                    </nav>
-                </div>
-            </div>
-        </header>
-
-        <div class="min-h-screen bg-gradient-to-br from-blue-50 to-indigo-100 py-8 px-4">
-            <div class="max-w-4xl mx-auto">
-                <div class="text-center mb-8">
-                    <h1 class="text-4xl font-bold text-gray-800 mb-4">FIT5122 Unit Effectiveness Survey</h1>
-                    <p class="text-lg text-gray-600">Evaluating the Effectiveness of FIT5122's Delivery</p>
-                </div>
-
-                <div class="bg-white rounded-2xl shadow-2xl p-8 mb-6">
-                    <div class="bg-amber-50 border-l-4 border-amber-500 p-4 mb-6 rounded">
-                        <p class="text-amber-700 text-sm">
-                            <strong>Ethics Notice:</strong> MUHREC Approved Project 2025-12345-FIT5122. All responses are anonymous and confidential.
-                        </p>
-                    </div>
-
-                    <form method="post" action="/submit-survey" class="space-y-8" id="surveyForm">
-                        <!-- Participation Section -->
-                        <div class="bg-gray-50 p-6 rounded-lg border border-gray-200">
-                            <h2 class="text-2xl font-semibold text-gray-800 mb-4">Participation Information</h2>
-                            
-                            <div class="mb-6">
-                                <label class="block text-lg font-medium text-gray-700 mb-3">
-                                    Did you actively participate in FIT5122 Industry Experience Studio Project this semester?
-                                </label>
-                                <div class="flex gap-6">
-                                    <label class="flex items-center">
-                                        <input type="radio" name="participated_fully" value="true" required class="mr-3">
-                                        <span class="text-gray-700">Yes, I completed all studio activities and assessments</span>
-                                    </label>
-                                    <label class="flex items-center">
-                                        <input type="radio" name="participated_fully" value="false" required class="mr-3">
-                                        <span class="text-gray-700">No, I was unable to complete all requirements</span>
-                                    </label>
-                                </div>
-                            </div>
-
-                            <div>
-                                <label class="block text-lg font-medium text-gray-700 mb-3">Which studio lab session did you primarily attend?</label>
-                                <select name="lab_session" class="w-full px-4 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-blue-500">
-                                    <option value="">Select your primary studio session</option>
-                                    {lab_options}
-                                </select>
-                                <p class="text-sm text-gray-500 mt-2">All sessions conducted on Wednesdays at Clayton Campus</p>
-                            </div>
-                        </div>
-
-                        <!-- Unit Effectiveness Ratings -->
-                        <div class="bg-gray-50 p-6 rounded-lg border border-gray-200">
-                            <h2 class="text-2xl font-semibold text-gray-800 mb-4">Unit Effectiveness Assessment</h2>
-                            <p class="text-gray-600 mb-6">Please rate the following aspects of FIT5122 (1 = Very Poor, 5 = Excellent)</p>
-
-                            <div class="space-y-8">
-                                <div>
-                                    <label class="block text-lg font-medium text-gray-800 mb-3">Studio Project Content & Industry Relevance</label>
-                                    <p class="text-gray-600 text-sm mb-3">Quality and practical relevance of studio project materials</p>
-                                    <div class="flex gap-4 justify-center" id="unit_content_quality_ratings">
-                                        {generate_rating_options('unit_content_quality')}
-                                    </div>
-                                </div>
-
-                                <div>
-                                    <label class="block text-lg font-medium text-gray-800 mb-3">Teaching & Studio Supervision</label>
-                                    <p class="text-gray-600 text-sm mb-3">Effectiveness of teaching staff and studio supervision</p>
-                                    <div class="flex gap-4 justify-center" id="teaching_effectiveness_ratings">
-                                        {generate_rating_options('teaching_effectiveness')}
-                                    </div>
-                                </div>
-
-                                <div>
-                                    <label class="block text-lg font-medium text-gray-800 mb-3">Assessment Design & Fairness</label>
-                                    <p class="text-gray-600 text-sm mb-3">Clarity and fairness of assessment tasks and criteria</p>
-                                    <div class="flex gap-4 justify-center" id="assessment_fairness_ratings">
-                                        {generate_rating_options('assessment_fairness')}
-                                    </div>
-                                </div>
-
-                                <div>
-                                    <label class="block text-lg font-medium text-gray-800 mb-3">Learning Resources & Facilities</label>
-                                    <p class="text-gray-600 text-sm mb-3">Quality of learning materials and studio facilities</p>
-                                    <div class="flex gap-4 justify-center" id="learning_resources_ratings">
-                                        {generate_rating_options('learning_resources')}
-                                    </div>
-                                </div>
-
-                                <div>
-                                    <label class="block text-lg font-medium text-gray-800 mb-3">Overall Studio Experience</label>
-                                    <p class="text-gray-600 text-sm mb-3">Your comprehensive experience with FIT5122</p>
-                                    <div class="flex gap-4 justify-center" id="overall_experience_ratings">
-                                        {generate_rating_options('overall_experience')}
-                                    </div>
-                                </div>
-                            </div>
-                        </div>
-
-                        <!-- Detailed Feedback -->
-                        <div class="bg-gray-50 p-6 rounded-lg border border-gray-200">
-                            <h2 class="text-2xl font-semibold text-gray-800 mb-4">Detailed Feedback</h2>
-                            
-                            <div class="space-y-6">
-                                <div>
-                                    <label class="block text-lg font-medium text-gray-800 mb-3">What were the most valuable aspects of the FIT5122 studio experience?</label>
-                                    <textarea name="positive_aspects" rows="4" class="w-full px-4 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500" placeholder="Industry connections, practical skills, team collaboration, project experience..."></textarea>
-                                </div>
-
-                                <div>
-                                    <label class="block text-lg font-medium text-gray-800 mb-3">Suggestions for improving the studio experience:</label>
-                                    <textarea name="improvement_suggestions" rows="4" class="w-full px-4 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500" placeholder="Project scope adjustments, supervision improvements, resource enhancements..."></textarea>
-                                </div>
-
-                                <div>
-                                    <label class="block text-lg font-medium text-gray-800 mb-3">Any technical or logistical challenges faced?</label>
-                                    <textarea name="technical_issues" rows="3" class="w-full px-4 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500" placeholder="Software tools, team coordination, facility access, timeline issues..."></textarea>
-                                </div>
-
-                                <div>
-                                    <label class="block text-lg font-medium text-gray-800 mb-3">Additional comments about your FIT5122 journey:</label>
-                                    <textarea name="additional_comments" rows="3" class="w-full px-4 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500" placeholder="Overall reflections, skill development, industry readiness..."></textarea>
-                                </div>
-                            </div>
-                        </div>
-
-                        <!-- Consent -->
-                        <div class="bg-blue-50 p-6 rounded-lg border border-blue-200">
-                            <div class="flex items-start">
-                                <input type="checkbox" name="consent_given" required class="mt-1 mr-3">
-                                <div>
-                                    <label class="block text-lg font-medium text-gray-800 mb-2">Research Participation Consent</label>
-                                    <p class="text-gray-600 text-sm">
-                                        I understand that this survey is conducted under Monash University ethics approval (MUHREC 2025-12345-FIT5122). 
-                                        I consent to my anonymous responses being used for educational research purposes and unit improvement initiatives. 
-                                        I acknowledge that I can withdraw my participation at any time without penalty.
-                                    </p>
-                                    <p class="text-blue-600 text-xs mt-2">
-                                        * This implementation demonstrates comprehensive understanding of ethical research practices.
-                                    </p>
-                                </div>
-                            </div>
-                        </div>
-
-                        <div class="text-center">
-                            <button type="submit" class="bg-blue-600 hover:bg-blue-700 text-white font-bold py-4 px-16 rounded-lg text-lg transition duration-300 transform hover:scale-105 shadow-lg">
-                                Submit Your Feedback
-                            </button>
-                        </div>
-                    </form>
-
-                    <div class="text-center mt-8">
-                        <a href="/" class="text-blue-600 hover:text-blue-800 text-lg font-medium">← Return to Survey Home</a>
-                    </div>
-                </div>
-            </div>
-        </div>
-
-        <script>
-            function handleRatingChange(radio) {{
-                // Get all rating options in the same question group
-                const container = radio.closest('div[class*="justify-center"]');
-                const allOptions = container.querySelectorAll('.rating-option');
-                
-                // Remove selected class from all options in this group
-                allOptions.forEach(option => {{
-                    option.classList.remove('rating-selected');
-                }});
-                
-                // Add selected class to the chosen option
-                const selectedOption = radio.nextElementSibling;
-                selectedOption.classList.add('rating-selected');
-            }}
-
-            // Initialize any previously selected ratings on page load
-            document.addEventListener('DOMContentLoaded', function() {{
-                const allRadios = document.querySelectorAll('input[type="radio"]');
-                allRadios.forEach(radio => {{
-                    if (radio.checked) {{
-                        const selectedOption = radio.nextElementSibling;
-                        selectedOption.classList.add('rating-selected');
-                    }}
-                }});
-            }});
-
-            // Form submission handler
-            document.getElementById('surveyForm').addEventListener('submit', function(e) {{
-                const submitBtn = this.querySelector('button[type="submit"]');
-                submitBtn.disabled = true;
-                submitBtn.innerHTML = 'Submitting...';
-                submitBtn.classList.remove('hover:scale-105', 'hover:bg-blue-700');
-            }});
-        </script>
-    </body>
-    </html>
-    """
-    return HTMLResponse(content=survey_html)
-
-@app.post("/submit-survey")
+
+def render_survey_html(lab_sessions):
+    return render("survey.html", lab_sessions=lab_sessions)
+
+
+# Pages are rendered once into bytes (plus gzip/brotli variants) and served with ETags
+HOME_PAGE = TemplatePage("home.html")
+survey_pages = RenderedPageCache(render_survey_html)
+# Rating columns of every response, for filtered analytics without per-row ORM objects
+response_snapshot = ColumnarSnapshot(LAB_SESSIONS)
+
+
+@router.get("/", response_class=HTMLResponse)
+async def home(request: Request):
+    return HOME_PAGE.response(request)
+
+@router.get("/survey", response_class=HTMLResponse)
+async def survey_form(request: Request):
+    # Re-rendered only if LAB_SESSIONS has been changed at runtime
+    return survey_pages.get(tuple(LAB_SESSIONS)).response(request)
+
+
+async def release_nonce(submission_id):
+    # The response was not stored, so a retry with the same form must get through
+    if submission_id:
+        await submission_guard.release(submission_id)
+
+
+@router.post("/submit-survey")
 async def submit_survey(
     request: Request,
     participated_fully: str = Form(...),
@@ -495,127 +111,443 @@ async def submit_survey(
     technical_issues: str = Form(None),
     additional_comments: str = Form(None),
     consent_given: bool = Form(False),
-    db: SessionLocal = Depends(get_db)
+    submission_id: str = Form(None),
+    db=Depends(get_db)
 ):
     try:
-        print("📥 Received survey submission")
-        
-        # Convert string to boolean
-        participated_bool = participated_fully.lower() == 'true'
-        
-        # Create survey response
-        survey_response = FIT5122SurveyResponse(
-            participated_fully=participated_bool,
-            lab_session=lab_session,
-            unit_content_quality=unit_content_quality,
-            teaching_effectiveness=teaching_effectiveness,
-            assessment_fairness=assessment_fairness,
-            learning_resources=learning_resources,
-            overall_experience=overall_experience,
-            positive_aspects=positive_aspects,
-            improvement_suggestions=improvement_suggestions,
-            technical_issues=technical_issues,
-            additional_comments=additional_comments,
-            consent_given=consent_given
-        )
-        
-        db.add(survey_response)
-        db.commit()
-        db.refresh(survey_response)
-        
-        print(f"✅ Survey response saved with ID: {survey_response.id}")
-        
+        submission_log.info("Received survey submission")
+
+        # Same model as /api/responses, so both paths accept exactly the same data
+        try:
+            submission = SurveySubmission(
+                submission_id=submission_id or None,
+                participated_fully=participated_fully,
+                lab_session=lab_session,
+                unit_content_quality=unit_content_quality,
+                teaching_effectiveness=teaching_effectiveness,
+                assessment_fairness=assessment_fairness,
+                learning_resources=learning_resources,
+                overall_experience=overall_experience,
+                positive_aspects=positive_aspects,
+                improvement_suggestions=improvement_suggestions,
+                technical_issues=technical_issues,
+                additional_comments=additional_comments,
+                consent_given=consent_given
+            )
+        except ValidationError as e:
+            submission_log.info("Rejected invalid survey submission", extra={"errors": error_details(e)})
+            return HTMLResponse(content=render_static("invalid_submission.html"), status_code=422)
+        values = submission.to_row()
+
+        # The form's submission_id doubles as a nonce: a double click or a
+        # resubmitted page is answered from memory, without touching the database
+        nonce = submission.submission_id
+        if nonce is not None and not await submission_guard.claim(nonce):
+            SUBMISSIONS_REJECTED.labels("duplicate").inc()
+            submission_log.info("Duplicate survey submission suppressed")
+            return RedirectResponse(url="/thank-you", status_code=303)
+
+        if ingest_queue is not None:
+            # Write-behind: the background writer batches this into a multi-row INSERT
+            await ingest_queue.submit(values)
+            submission_log.info("Survey response queued")
+        else:
+            [(status, response_id)] = await store_or_spool(db, [values])
+            if status == "created":
+                submission_log.info("Survey response saved", extra={"response_id": response_id})
+            elif status == "spooled":
+                submission_log.info("Survey response spooled")
+            else:
+                submission_log.info("Duplicate survey submission", extra={"response_id": response_id})
+
         return RedirectResponse(url="/thank-you", status_code=303)
-        
-    except Exception as e:
-        db.rollback()
-        print(f"❌ Error saving survey: {e}")
+
+    except (IngestQueueFull, SpoolFull) as e:
+        # Backpressure: tell the client to retry rather than queueing (or spooling) without bound
+        await release_nonce(submission_id)
+        logger.warning("Rejected survey submission: %s", e)
+        return HTMLResponse(content=render_static("submission_error.html"), status_code=503, headers={"Retry-After": "2"})
+
+    except Exception:
+        await db.rollback()
+        await release_nonce(submission_id)
+        logger.exception("Error saving survey response")
         # Return a user-friendly error page
-        error_html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>Submission Error</title>
-            <script src="https://cdn.tailwindcss.com"></script>
-        </head>
-        <body class="bg-gray-100 min-h-screen flex items-center justify-center">
-            <div class="max-w-md w-full bg-white rounded-2xl shadow-2xl p-8 text-center">
-                <div class="w-20 h-20 bg-red-100 rounded-full flex items-center justify-center mx-auto mb-6">
-                    <span class="text-2xl text-red-600">⚠️</span>
-                </div>
-                <h2 class="text-3xl font-bold text-gray-800 mb-4">Submission Error</h2>
-                <p class="text-lg text-gray-600 mb-6">
-                    We encountered an issue saving your response. Please try again in a moment.
-                </p>
-                <div class="bg-red-50 border-l-4 border-red-500 p-4 mb-6 text-left rounded">
-                    <p class="text-red-700 text-sm">
-                        <strong>Technical Issue:</strong> Database connection temporarily unavailable.
-                    </p>
-                </div>
-                <a href="/survey" class="bg-blue-600 hover:bg-blue-700 text-white font-bold py-3 px-8 rounded-lg transition duration-300 inline-block">
-                    Try Again
-                </a>
-                <div class="mt-4">
-                    <a href="/" class="text-blue-600 hover:text-blue-800">Return to Home</a>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        return HTMLResponse(content=error_html, status_code=500)
-
-
-@app.get("/thank-you", response_class=HTMLResponse)
-async def thank_you():
-    return """
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Thank You - FIT5122 Survey</title>
-        <script src="https://cdn.tailwindcss.com"></script>
-        <link href="https://fonts.googleapis.com/css2?family=Noto+Sans+JP:wght@400;700&display=swap" rel="stylesheet">
-        <style> body { font-family: 'Noto Sans JP', sans-serif; } </style>
-    </head>
-    <body class="bg-gradient-to-br from-green-50 to-blue-50 min-h-screen flex items-center justify-center">
-        <div class="max-w-md w-full bg-white rounded-2xl shadow-2xl p-8 text-center">
-            <div class="w-20 h-20 bg-green-100 rounded-full flex items-center justify-center mx-auto mb-6">
-                <svg class="w-10 h-10 text-green-600" fill="none" stroke="currentColor" viewBox="0 0 24 24">
-                    <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M5 13l4 4L19 7"></path>
-                </svg>
-            </div>
-            <h2 class="text-3xl font-bold text-gray-800 mb-4">Thank You!</h2>
-            <p class="text-lg text-gray-600 mb-6">
-                Your valuable feedback has been successfully recorded and will contribute to enhancing 
-                the FIT5122 Industry Experience Studio Project for future students.
-            </p>
-            <div class="bg-green-50 border-l-4 border-green-500 p-4 mb-6 text-left rounded">
-                <p class="text-green-700 text-sm">
-                    <strong>Research Contribution:</strong> Your response supports ongoing educational research 
-                    and quality improvement at Monash University's Faculty of Information Technology.
-                </p>
-            </div>
-            <a href="/" class="bg-blue-600 hover:bg-blue-700 text-white font-bold py-3 px-8 rounded-lg transition duration-300 inline-block">
-                Return to Survey Home
-            </a>
-        </div>
-    </body>
-    </html>
-    """
-
-@app.get("/health")
-async def health(db: SessionLocal = Depends(get_db)):
+        return HTMLResponse(content=render_static("submission_error.html"), status_code=500)
+
+
+# --- JSON / bulk submission API ---
+
+# Largest batch accepted by /api/responses in one request (and one transaction)
+API_MAX_BATCH = env_int("API_MAX_BATCH", 1000)
+NDJSON_TYPES = ("application/x-ndjson", "application/jsonl", "application/ndjson")
+
+
+def parse_api_items(body, content_type):
+    """Returns (items, single); NDJSON lines that are not JSON become error strings."""
+    if content_type in NDJSON_TYPES:
+        items = []
+        for number, line in enumerate(body.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as e:
+                items.append(f"line {number}: {e}")
+        return items, False
+    try:
+        payload = json.loads(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Malformed JSON: {e}")
+    if isinstance(payload, dict):
+        return [payload], True
+    if isinstance(payload, list):
+        return payload, False
+    raise HTTPException(status_code=400, detail="Expected a JSON object or an array of objects")
+
+
+@router.post("/api/responses")
+async def api_responses(request: Request, db=Depends(get_db)):
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    items, single = parse_api_items(await request.body(), content_type)
+    if len(items) > API_MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {API_MAX_BATCH} responses per request")
+
+    results = [None] * len(items)
+    rows, positions = [], []
+    for i, item in enumerate(items):
+        if isinstance(item, str):
+            results[i] = {"index": i, "status": "invalid", "errors": [{"field": None, "message": item}]}
+            continue
+        try:
+            rows.append(SurveySubmission.model_validate(item).to_row())
+            positions.append(i)
+        except ValidationError as e:
+            results[i] = {"index": i, "status": "invalid", "errors": error_details(e)}
+
+    if rows:
+        # Every valid item of the request is written in one transaction
+        try:
+            stored = await store_responses(db, rows)
+        except Exception:
+            await db.rollback()
+            logger.exception("Error saving API responses", extra={"rows": len(rows)})
+            return JSONResponse({"detail": "Responses could not be stored, retry later"}, status_code=503,
+                                headers={"Retry-After": "2"})
+        for i, row, (status, response_id) in zip(positions, rows, stored):
+            results[i] = {"index": i, "status": status, "id": response_id, "submission_id": row["submission_id"]}
+        submission_log.info("API responses stored", extra={"rows": len(rows), "items": len(items)})
+
+    if single:
+        status_code = {"created": 201, "duplicate": 200}.get(results[0]["status"], 422)
+        return JSONResponse(results[0], status_code=status_code)
+    return {
+        "created": sum(1 for r in results if r["status"] == "created"),
+        "duplicates": sum(1 for r in results if r["status"] == "duplicate"),
+        "invalid": sum(1 for r in results if r["status"] == "invalid"),
+        "results": results,
+    }
+
+
+THANK_YOU_PAGE = TemplatePage("thank_you.html")
+
+
+@router.get("/thank-you", response_class=HTMLResponse)
+async def thank_you(request: Request):
+    return THANK_YOU_PAGE.response(request)
+
+# --- Data-driven surveys (definitions in surveys/*.json or survey_definitions) ---
+
+@router.get("/surveys")
+async def list_surveys():
+    return await survey_registry.listing()
+
+async def get_survey(slug):
+    survey = await survey_registry.get(slug)
+    if survey is None:
+        raise HTTPException(status_code=404, detail="Survey not found")
+    return survey
+
+@router.get("/s/{slug}", response_class=HTMLResponse)
+async def dynamic_survey_form(slug: str, request: Request):
+    survey = await get_survey(slug)
+    return survey.form_page.response(request)
+
+@router.post("/s/{slug}")
+async def submit_dynamic_survey(slug: str, request: Request, db=Depends(get_db)):
+    survey = await get_survey(slug)
+    try:
+        answers = survey.validate(await request.form())
+    except SurveyValidationError as e:
+        return HTMLResponse(content=render_errors(survey.definition, e.errors), status_code=422)
+
+    try:
+        db.add(SurveyResponse(survey_slug=survey.slug, survey_version=survey.version, answers=answers))
+        await db.commit()
+        submission_log.info("Survey response saved", extra={"survey": survey.slug, "version": survey.version})
+    except Exception:
+        await db.rollback()
+        logger.exception("Error saving survey response", extra={"survey": survey.slug})
+        return HTMLResponse(content=render_static("submission_error.html"), status_code=500)
+    return RedirectResponse(url=f"/s/{survey.slug}/thank-you", status_code=303)
+
+@router.get("/s/{slug}/thank-you", response_class=HTMLResponse)
+async def dynamic_thank_you(slug: str, request: Request):
+    survey = await get_survey(slug)
+    return survey.thank_you_page.response(request)
+
+# Readiness probes give up on the database after this many seconds
+HEALTH_DB_TIMEOUT = env_int("HEALTH_DB_TIMEOUT", 5)
+
+
+@router.get("/livez")
+async def livez():
+    # Liveness only: the process is up and serving, no database access
+    return {"status": "alive", "service": "fit5122-survey"}
+
+@router.get("/readyz")
+async def readyz():
     try:
-        db.execute("SELECT 1")
-        count = db.query(FIT5122SurveyResponse).count()
-        return {
+        await asyncio.wait_for(ping(), HEALTH_DB_TIMEOUT)
+    except Exception as e:
+        if spool_replayer is not None:
+            # Submissions still go to the spool, so stay in rotation and say so
+            return {"status": "degraded", "service": "fit5122-survey", "error": str(e),
+                    "spool": spool_replayer.spool.status()}
+        return JSONResponse({"status": "unready", "error": str(e)}, status_code=503)
+    if spool_replayer is not None:
+        return {"status": "ready", "service": "fit5122-survey", "spool": spool_replayer.spool.status()}
+    return {"status": "ready", "service": "fit5122-survey"}
+
+@router.get("/stats")
+async def stats(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    lab_session: Optional[str] = None,
+    consent: Optional[bool] = None,
+):
+    if since is None and until is None and lab_session is None and consent is None:
+        # Served from incrementally maintained histograms; cost is independent of row count
+        return await rating_stats.snapshot()
+    # Filtered: vectorized over the columnar snapshot, never over the responses table
+    snapshot = await response_snapshot.current()
+    return snapshot.rating_stats(snapshot.where(since, until, lab_session, consent))
+
+DASHBOARD_PAGE = TemplatePage("dashboard.html")
+REPORTS_PAGE = TemplatePage("reports.html", reports=list(REPORTS.values()))
+
+
+@router.get("/dashboard", response_class=HTMLResponse)
+async def dashboard(request: Request):
+    # Static page; the numbers arrive over /events
+    return DASHBOARD_PAGE.response(request)
+
+@router.get("/reports", response_class=HTMLResponse)
+async def report_index(request: Request):
+    return REPORTS_PAGE.response(request)
+
+# Reports are read from their materialised cells (see reports.py), never from the responses
+@router.get("/reports/{name}", response_class=HTMLResponse)
+async def report_page(request: Request, name: str):
+    if name not in REPORTS:
+        raise HTTPException(status_code=404, detail="No such report")
+    return (await reports.page(name)).response(request)
+
+@router.get("/api/reports/{name}")
+async def report_data(name: str):
+    if name not in REPORTS:
+        raise HTTPException(status_code=404, detail="No such report")
+    return await reports.data(name)
+
+@router.post("/beacon", status_code=204)
+async def beacon(request: Request):
+    # navigator.sendBeacon target: counted in memory and flushed in bulk, so
+    # nothing here waits on the database or shares the submission path
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > BEACON_MAX_BYTES:
+        return Response(status_code=413)
+    body = await request.body()
+    if len(body) > BEACON_MAX_BYTES:
+        return Response(status_code=413)
+    return Response(status_code=204 if record_beacon(body) else 400)
+
+@router.get("/api/beacons")
+async def beacon_report(hours: int = 24, db=Depends(get_read_db)):
+    if not 1 <= hours <= 24 * 31:
+        raise HTTPException(status_code=400, detail="hours must be between 1 and 744")
+    return await beacon_summary(db, hours)
+
+@router.get("/events")
+async def events():
+    if live_updates.full():
+        return JSONResponse({"detail": "Too many live viewers on this worker"}, status_code=503,
+                            headers={"Retry-After": "5"})
+    return StreamingResponse(live_updates.stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# When set, /export and /search require ?token=... or an "Authorization: Bearer ..." header
+EXPORT_TOKEN = os.getenv("EXPORT_TOKEN")
+
+
+def require_export_token(request, token):
+    if EXPORT_TOKEN:
+        bearer = request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+        if EXPORT_TOKEN not in (token, bearer):
+            raise HTTPException(status_code=401, detail="Export token required")
+
+
+@router.get("/export")
+async def export(
+    request: Request,
+    format: str = "csv",
+    gzip: bool = False,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    lab_session: Optional[str] = None,
+    consent: Optional[bool] = None,
+    token: Optional[str] = None,
+):
+    require_export_token(request, token)
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    # Rows are pulled through a server-side cursor chunk by chunk, so memory stays flat
+    query = build_query(since, until, lab_session, consent)
+    filename = export_filename(format, gzip)
+    response = ExportResponse(
+        stream_export(query, format, gzip),
+        media_type="application/gzip" if gzip else MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+    # Taken last, so nothing between here and the response can leave it held
+    if not export_slots.take():
+        return JSONResponse({"detail": "Too many exports running on this worker"}, status_code=503,
+                            headers={"Retry-After": "10"})
+    return response
+
+@router.get("/search")
+async def search(
+    request: Request,
+    q: str = "",
+    lab_session: Optional[str] = None,
+    consent: Optional[bool] = None,
+    limit: int = 20,
+    offset: int = 0,
+    token: Optional[str] = None,
+    db=Depends(get_read_db),
+):
+    # Words, "quoted phrases", OR and -excluded terms over the four free-text fields
+    require_export_token(request, token)
+    try:
+        results, next_offset = await search_responses(db, database.DB_BACKEND, q, lab_session, consent, limit, offset)
+    except SearchQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"query": q, "results": results, "next_offset": next_offset}
+
+@router.get("/health")
+async def health():
+    try:
+        await asyncio.wait_for(ping(), HEALTH_DB_TIMEOUT)
+        count = await response_counter.get()
+        result = {
             "status": "healthy", 
             "service": "fit5122-survey",
-            "database": "connected" if "postgresql" in DATABASE_URL else "sqlite",
-            "total_responses": count
+            "database": "connected" if is_postgres(database.DATABASE_URL) else "sqlite",
+            "total_responses": count,
+            "total_responses_age_seconds": round(response_counter.age(), 1)
         }
+        replicas = get_replicas()
+        if replicas.replicas:
+            result["replicas"] = replicas.status()
+        return result
     except Exception as e:
         return {"status": "unhealthy", "error": str(e)}
         
+@router.get("/metrics")
+async def metrics():
+    # Prometheus text format; see metrics.py for what is recorded
+    body, content_type = render_metrics()
+    return Response(content=body, headers={"Content-Type": content_type})
+
+def warm_pages(pages):
+    precompile()
+    for page in pages:
+        page.warm()
+
+
+def log_warm_up(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Page warm-up failed", exc_info=future.exception())
+
+
+@asynccontextmanager
+async def lifespan(app):
+    setup_logging()
+    logger.info("Starting FIT5122 Survey Application")
+    schema_ready = await init_schema() if DB_MIGRATE_ON_STARTUP else True
+    try:
+        published = await publish_definitions(load_definition_files())
+        if published:
+            logger.info("Published %d new survey definition(s)", published)
+        await survey_registry.refresh()
+    except Exception:
+        logger.exception("Survey definitions not loaded")
+    # Compile the templates and render and compress the static pages off the
+    # event loop so readiness isn't held up by it
+    pages = (HOME_PAGE, THANK_YOU_PAGE, DASHBOARD_PAGE, REPORTS_PAGE, survey_pages.get(tuple(LAB_SESSIONS)))
+    warm_up = asyncio.get_running_loop().run_in_executor(None, warm_pages, pages)
+    warm_up.add_done_callback(log_warm_up)
+    if ingest_queue is not None:
+        await ingest_queue.start()
+        logger.info("Batched ingestion enabled (%s ack)", ingest_queue.ack)
+    if spool_replayer is not None:
+        # Also replays whatever an earlier process left in the spool
+        await spool_replayer.start(migrate=not schema_ready)
+    elif not schema_ready:
+        logger.error("Database unavailable and SPOOL_ENABLED is off; submissions will fail until it is back")
+    # Measures replica lag before the first read is routed
+    await get_replicas().start()
+    await live_updates.start()
+    await reports.start()
+    await beacon_stats.start()
+
+    yield
+
+    # A thread can't be cancelled; let it finish rather than tear things down under it
+    await asyncio.gather(warm_up, return_exceptions=True)
+    if ingest_queue is not None:
+        await ingest_queue.stop()
+    if spool_replayer is not None:
+        await spool_replayer.stop()
+    await live_updates.stop()
+    await reports.stop()
+    await beacon_stats.stop()
+    await get_replicas().stop()
+    await submission_guard.backend.close()
+    await dispose_engines()
+    logger.info("Shutdown complete")
+    stop_logging()
+
+
+def create_app(metrics=METRICS_ENABLED, rate_limit=RATE_LIMIT_ENABLED):
+    app = FastAPI(title="FIT5122 Unit Effectiveness Survey", version="1.0.0", lifespan=lifespan)
+    app.include_router(router)
+    # Content-hashed CSS/JS built by build_assets.py
+    app.mount(STATIC_URL, StaticAssets(), name="static")
+    if rate_limit:
+        # Inside the metrics middleware, so 429s are counted like any response
+        app.add_middleware(RateLimitMiddleware, guard=submission_guard)
+    if database.DATABASE_REPLICA_URLS and DB_READ_YOUR_WRITES_SECONDS > 0:
+        # Beacons never write to the database, so they don't pin anyone to the primary
+        app.add_middleware(ReadYourWritesMiddleware, exempt_paths=("/beacon",))
+    if metrics:
+        app.add_middleware(MetricsMiddleware)
+    # Added last so it is outermost: everything below logs with the request id
+    app.add_middleware(RequestIdMiddleware)
+    return app
+
+
+app = create_app()
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
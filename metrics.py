@@ -0,0 +1,223 @@
+import os
+import time
+from contextvars import ContextVar
+
+from database import env_bool
+
+METRICS_ENABLED = env_bool("METRICS_ENABLED", True)
+# Spans around every SQL statement when OpenTelemetry is installed
+OTEL_SQL_SPANS = env_bool("OTEL_SQL_SPANS", True)
+# Set by multi-worker deployments so /metrics aggregates every worker
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+_metrics = []
+
+
+class LazyMetric:
+    """A prometheus_client metric that is created on first use.
+
+    Importing this module (and so main) then doesn't load prometheus_client;
+    the first request or scrape does. Everything else is passed through.
+    """
+
+    def __init__(self, kind, *args, **kwargs):
+        self.kind = kind
+        self.args = args
+        self.kwargs = kwargs
+        self.metric = None
+        _metrics.append(self)
+
+    def create(self):
+        if self.metric is None:
+            import prometheus_client
+
+            self.metric = getattr(prometheus_client, self.kind)(*self.args, **self.kwargs)
+        return self.metric
+
+    def __getattr__(self, name):
+        return getattr(self.create(), name)
+
+
+REQUESTS = LazyMetric("Counter", "http_requests_total", "HTTP requests", ["method", "route", "status"])
+REQUEST_LATENCY = LazyMetric("Histogram", "http_request_duration_seconds", "HTTP request latency",
+                             ["method", "route"])
+REQUESTS_IN_FLIGHT = LazyMetric("Gauge", "http_requests_in_flight", "HTTP requests being served",
+                                multiprocess_mode="livesum")
+REQUEST_DB_TIME = LazyMetric("Histogram", "http_request_db_seconds", "Time spent in SQL statements per request",
+                             ["route"], buckets=DB_BUCKETS)
+DB_QUERY_LATENCY = LazyMetric("Histogram", "db_query_duration_seconds", "SQL statement latency", buckets=DB_BUCKETS)
+DB_POOL_WAIT = LazyMetric("Histogram", "db_pool_checkout_wait_seconds", "Time to get a connection from the pool",
+                          buckets=DB_BUCKETS)
+DB_POOL_CHECKED_OUT = LazyMetric("Gauge", "db_pool_connections_checked_out", "Connections currently checked out",
+                                 multiprocess_mode="livesum")
+DB_COMMIT_LATENCY = LazyMetric("Histogram", "db_commit_duration_seconds", "Session commit latency (flush + COMMIT)",
+                               buckets=DB_BUCKETS)
+INGEST_QUEUE_DEPTH = LazyMetric("Gauge", "ingest_queue_depth", "Submissions waiting in the write-behind queue",
+                                multiprocess_mode="livesum")
+SPOOL_PENDING_BYTES = LazyMetric("Gauge", "spool_pending_bytes",
+                                 "Spooled submissions not yet replayed into the database", multiprocess_mode="max")
+SPOOL_REPLAY_LAG = LazyMetric("Gauge", "spool_replay_lag_seconds",
+                              "Age of the oldest spooled submission not yet replayed", multiprocess_mode="max")
+SPOOL_RECORDS = LazyMetric("Counter", "spool_records_total",
+                           "Submissions written to or replayed from the local spool", ["event"])
+SNAPSHOT_ROWS = LazyMetric("Gauge", "response_snapshot_rows", "Responses held in the columnar analytics snapshot",
+                           multiprocess_mode="max")
+SNAPSHOT_BYTES = LazyMetric("Gauge", "response_snapshot_bytes",
+                            "Memory allocated for the columnar analytics snapshot", multiprocess_mode="livesum")
+DB_READ_ROUTES = LazyMetric("Counter", "db_read_routes_total",
+                            "Read sessions by where they went: replica, or the primary and why", ["target"])
+BEACONS = LazyMetric("Counter", "beacons_total", "Client timing beacons received", ["result"])
+SUBMISSIONS_REJECTED = LazyMetric("Counter", "submissions_rejected_total",
+                                  "Submissions refused before reaching the database", ["reason"])
+
+# Accumulates SQL time for the request being served (a one-element list)
+_request_db_time = ContextVar("request_db_time", default=None)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and DB time per route.
+
+    Routes are labelled by their path template ("/s/{slug}"), and anything
+    that matched no route as "unmatched", so label cardinality stays fixed.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        # Labelled children cached per route, skipping labels() on the hot path
+        self.children = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        db_time = [0.0]
+        token = _request_db_time.set(db_time)
+        REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            REQUESTS_IN_FLIGHT.dec()
+            _request_db_time.reset(token)
+            # The router stores the matched route in the (shared) scope
+            key = (scope["method"], getattr(scope.get("route"), "path", "unmatched"), status[0])
+            children = self.children.get(key)
+            if children is None:
+                method, path, code = key
+                children = self.children[key] = (
+                    REQUESTS.labels(method, path, str(code)),
+                    REQUEST_LATENCY.labels(method, path),
+                    REQUEST_DB_TIME.labels(path),
+                )
+            children[0].inc()
+            children[1].observe(elapsed)
+            children[2].observe(db_time[0])
+
+
+def instrumented_pool_class(pool_class):
+    """Subclass of ``pool_class`` that times how long checkouts wait for a connection."""
+
+    def _do_get(self):
+        # _do_get blocks until a pooled connection is free (or a new one is opened)
+        started = time.perf_counter()
+        try:
+            return pool_class._do_get(self)
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - started)
+
+    # Same module as the original, so its log records stay under the "sqlalchemy" logger
+    return type(f"Instrumented{pool_class.__name__}", (pool_class,),
+                {"_do_get": _do_get, "__module__": pool_class.__module__})
+
+
+def instrument_engine(engine):
+    """Statement timing, checked-out connections and optional spans on a (sync) engine."""
+    from sqlalchemy import event
+
+    try:
+        from opentelemetry import trace
+    except ImportError:  # OpenTelemetry is optional; without it no spans are emitted
+        trace = None
+    tracer = trace.get_tracer(__name__) if trace is not None and OTEL_SQL_SPANS else None
+    dialect = engine.dialect.name
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+        if tracer is not None:
+            context._otel_span = tracer.start_span(
+                "db.query", kind=trace.SpanKind.CLIENT,
+                attributes={"db.system": dialect, "db.statement": statement[:2000]},
+            )
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._metrics_started
+        DB_QUERY_LATENCY.observe(elapsed)
+        request_db_time = _request_db_time.get()
+        if request_db_time is not None:
+            request_db_time[0] += elapsed
+        if tracer is not None:
+            context._otel_span.end()
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        span = getattr(exception_context.execution_context, "_otel_span", None)
+        if span is not None:
+            span.record_exception(exception_context.original_exception)
+            span.set_status(trace.Status(trace.StatusCode.ERROR))
+            span.end()
+
+    @event.listens_for(engine.pool, "checkout")
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CHECKED_OUT.inc()
+
+    @event.listens_for(engine.pool, "checkin")
+    def checkin(dbapi_connection, connection_record):
+        DB_POOL_CHECKED_OUT.dec()
+
+
+def instrument_sessions():
+    """Commit latency for every ORM session (sync sessions back the async ones too)."""
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+
+    if event.contains(Session, "before_commit", _before_commit):
+        return
+    event.listen(Session, "before_commit", _before_commit)
+    event.listen(Session, "after_commit", _after_commit)
+
+
+def _before_commit(session):
+    session.info["commit_started"] = time.perf_counter()
+
+
+def _after_commit(session):
+    started = session.info.pop("commit_started", None)
+    if started is not None:
+        DB_COMMIT_LATENCY.observe(time.perf_counter() - started)
+
+
+def render_metrics():
+    from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest, multiprocess
+
+    # Registered now if still unused, so every metric is in the scrape from the start
+    for metric in _metrics:
+        metric.create()
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
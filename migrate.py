@@ -0,0 +1,255 @@
+import argparse
+import os
+import re
+from datetime import date
+
+from sqlalchemy import text
+
+from models import FIT5122SurveyResponse
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+TABLE = FIT5122SurveyResponse.__tablename__
+SEARCH_INDEX = f"ix_{TABLE}_search"
+# Holds the submission ids of a partitioned responses table, one row each (see guard_submission_ids)
+SUBMISSION_IDS = f"{TABLE}_submission_ids"
+
+
+def alembic_config(connection=None):
+    from alembic.config import Config
+
+    config = Config()
+    config.set_main_option("script_location", MIGRATIONS_DIR)
+    if connection is not None:
+        config.attributes["connection"] = connection
+    return config
+
+
+def upgrade(connection, revision="head"):
+    from alembic import command
+
+    command.upgrade(alembic_config(connection), revision)
+
+
+_REVISION_LINE = re.compile(r'^(revision|down_revision) = (?:"([^"]*)"|None)$', re.MULTILINE)
+
+
+def head_revision():
+    """Newest revision in migrations/versions, read without importing alembic."""
+    revisions, parents = set(), set()
+    versions_dir = os.path.join(MIGRATIONS_DIR, "versions")
+    for name in os.listdir(versions_dir):
+        if not name.endswith(".py"):
+            continue
+        with open(os.path.join(versions_dir, name)) as f:
+            for key, value in _REVISION_LINE.findall(f.read()):
+                (revisions if key == "revision" else parents).add(value)
+    heads = revisions - parents
+    return heads.pop() if len(heads) == 1 else None
+
+
+def current_revision(conn):
+    if not conn.dialect.has_table(conn, "alembic_version"):
+        return None
+    return conn.execute(text("SELECT version_num FROM alembic_version")).scalar()
+
+
+# --- Optional monthly range partitioning (PostgreSQL only) ---
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def is_partitioned(conn):
+    relkind = conn.execute(
+        text("SELECT c.relkind FROM pg_class c WHERE c.oid = to_regclass(:name)"), {"name": TABLE}
+    ).scalar()
+    return relkind == "p"
+
+
+def has_search_vector(conn):
+    # Added by migration 0005 on PostgreSQL; not part of the ORM model
+    return conn.execute(text(
+        "SELECT 1 FROM information_schema.columns WHERE table_name = :table AND column_name = 'search_vector'"
+    ), {"table": TABLE}).first() is not None
+
+
+def ensure_partitions(conn, months_ahead=3, start=None):
+    """Create the monthly partitions from ``start`` up to ``months_ahead`` months from now."""
+    month = month_start(start or date.today())
+    last = add_months(month_start(date.today()), months_ahead)
+    created = []
+    while month <= last:
+        upper = add_months(month, 1)
+        name = f"{TABLE}_y{month.year}m{month.month:02d}"
+        conn.execute(text(
+            f'CREATE TABLE IF NOT EXISTS {name} PARTITION OF {TABLE} '
+            f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{upper.isoformat()} 00:00:00+00')"
+        ))
+        created.append(name)
+        month = upper
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {TABLE}_default PARTITION OF {TABLE} DEFAULT"))
+    return created
+
+
+def guard_submission_ids(conn):
+    """Keep submission ids unique on the partitioned responses table.
+
+    PostgreSQL requires the partition key in every unique index, and a
+    submission id says nothing about the timestamp its row will get, so the
+    ids are kept in SUBMISSION_IDS by a row trigger instead. A duplicate
+    fails the insert with a unique violation, exactly as the unique index
+    does on an unpartitioned table.
+    """
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {SUBMISSION_IDS} (submission_id varchar(64) PRIMARY KEY)"))
+    conn.execute(text(f"""
+        CREATE OR REPLACE FUNCTION {SUBMISSION_IDS}_sync() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.submission_id IS NOT NULL THEN
+                DELETE FROM {SUBMISSION_IDS} WHERE submission_id = OLD.submission_id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.submission_id IS NOT NULL THEN
+                INSERT INTO {SUBMISSION_IDS} (submission_id) VALUES (NEW.submission_id);
+            END IF;
+            RETURN NULL;
+        END $$
+    """))
+    conn.execute(text(f"DROP TRIGGER IF EXISTS {SUBMISSION_IDS}_sync ON {TABLE}"))
+    conn.execute(text(
+        f"CREATE TRIGGER {SUBMISSION_IDS}_sync AFTER INSERT OR DELETE OR UPDATE OF submission_id ON {TABLE} "
+        f"FOR EACH ROW EXECUTE FUNCTION {SUBMISSION_IDS}_sync()"
+    ))
+
+
+def convert_to_partitioned(conn, months_ahead=3):
+    """Rebuild the responses table as a table range-partitioned by month on timestamp.
+
+    Runs in the caller's transaction under an exclusive lock. The primary key
+    becomes (id, timestamp) because PostgreSQL requires the partition key
+    in every unique constraint; ids still come from the same sequence.
+    Submission ids stay unique through guard_submission_ids().
+    """
+    old = f"{TABLE}_unpartitioned"
+    conn.execute(text(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE"))
+    conn.execute(text(f'UPDATE {TABLE} SET "timestamp" = now() WHERE "timestamp" IS NULL'))
+    conn.execute(text(f"ALTER TABLE {TABLE} RENAME TO {old}"))
+    conn.execute(text(f"ALTER TABLE {old} RENAME CONSTRAINT {TABLE}_pkey TO {old}_pkey"))
+    for index in FIT5122SurveyResponse.__table__.indexes:
+        conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+    conn.execute(text(f"DROP INDEX IF EXISTS {SEARCH_INDEX}"))
+
+    # INCLUDING GENERATED keeps the full-text search_vector a generated column
+    conn.execute(text(
+        f'CREATE TABLE {TABLE} (LIKE {old} INCLUDING DEFAULTS INCLUDING GENERATED) PARTITION BY RANGE ("timestamp")'
+    ))
+    conn.execute(text(f'ALTER TABLE {TABLE} ALTER COLUMN "timestamp" SET NOT NULL'))
+    conn.execute(text(f'ALTER TABLE {TABLE} ADD PRIMARY KEY (id, "timestamp")'))
+    sequence = conn.execute(text(f"SELECT pg_get_serial_sequence('{old}', 'id')")).scalar()
+    if sequence:
+        conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {TABLE}.id"))
+
+    oldest = conn.execute(text(f'SELECT min("timestamp") FROM {old}')).scalar()
+    ensure_partitions(conn, months_ahead, start=oldest.date() if oldest else None)
+    # Before the copy, so the trigger records the ids already stored
+    guard_submission_ids(conn)
+    # Generated columns are computed again on insert and may not be copied
+    columns = ", ".join(f'"{column.name}"' for column in FIT5122SurveyResponse.__table__.columns)
+    conn.execute(text(f"INSERT INTO {TABLE} ({columns}) SELECT {columns} FROM {old}"))
+    for index in FIT5122SurveyResponse.__table__.indexes:
+        if index.unique:
+            # A unique index must contain the partition key; keep a plain one for
+            # ingest.insert_responses' lookups, guard_submission_ids() keeps the ids unique
+            columns = ", ".join(column.name for column in index.columns)
+            conn.execute(text(f"CREATE INDEX {index.name} ON {TABLE} ({columns})"))
+        else:
+            index.create(conn)
+    if has_search_vector(conn):
+        conn.execute(text(f"CREATE INDEX {SEARCH_INDEX} ON {TABLE} USING gin (search_vector)"))
+    conn.execute(text(f"DROP TABLE {old}"))
+
+
+# --- EXPLAIN checks for the declared indexes ---
+
+# Each query is selective enough that its index beats a scan on a realistic table.
+# Run against a populated, ANALYZEd table: plans for an empty table mean little.
+INDEX_CHECKS = [
+    ("lab session time window",
+     "SELECT id FROM fit5122_survey_responses "
+     "WHERE lab_session = 'Online/Recorded Session - Flexible timing' "
+     "AND \"timestamp\" >= '2025-10-01' AND \"timestamp\" < '2025-11-01'",
+     "ix_fit5122_survey_responses_lab_session_timestamp"),
+    ("consented day",
+     "SELECT id FROM fit5122_survey_responses "
+     "WHERE consent_given AND \"timestamp\" >= '2025-10-08' AND \"timestamp\" < '2025-10-09'",
+     "ix_fit5122_survey_responses_consented_timestamp"),
+    ("month window",
+     "SELECT count(*) FROM fit5122_survey_responses "
+     "WHERE \"timestamp\" >= '2025-10-01' AND \"timestamp\" < '2025-11-01'",
+     "ix_fit5122_survey_responses_timestamp_brin"),
+]
+
+
+def explain(conn, sql):
+    if conn.dialect.name == "postgresql":
+        # Tiny tables are cheaper to scan; this asks whether the index is usable at all
+        conn.execute(text("SET LOCAL enable_seqscan = off"))
+        return "\n".join(row[0] for row in conn.execute(text("EXPLAIN " + sql)))
+    return "\n".join(str(row[-1]) for row in conn.execute(text("EXPLAIN QUERY PLAN " + sql)))
+
+
+def check_indexes(conn):
+    """Return (name, expected index, used?, plan) for every query in INDEX_CHECKS."""
+    partitioned = conn.dialect.name == "postgresql" and is_partitioned(conn)
+    results = []
+    for name, sql, index in INDEX_CHECKS:
+        plan = explain(conn, sql)
+        if partitioned:
+            # Partition indexes get generated names; any index scan on them counts
+            used = "Index Scan" in plan or "Index Only Scan" in plan
+        else:
+            used = index in plan
+        results.append((name, index, used, plan))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Schema migrations and partition maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("upgrade", help="apply all pending migrations")
+    partition = sub.add_parser("partition", help="convert to / extend monthly partitions (PostgreSQL)")
+    partition.add_argument("--months-ahead", type=int, default=3)
+    sub.add_parser("check-indexes", help="EXPLAIN the standard filters and verify index use")
+    args = parser.parse_args()
+
+    from database import get_engine
+
+    engine = get_engine()
+    if args.command == "upgrade":
+        with engine.begin() as conn:
+            upgrade(conn)
+        print("Schema is up to date")
+
+    elif args.command == "partition":
+        if engine.dialect.name != "postgresql":
+            parser.error("partitioning is only supported on PostgreSQL")
+        with engine.begin() as conn:
+            if is_partitioned(conn):
+                created = ensure_partitions(conn, args.months_ahead)
+                print(f"Partitions present through {created[-1]}")
+            else:
+                convert_to_partitioned(conn, args.months_ahead)
+                print(f"{TABLE} is now partitioned by month")
+
+    elif args.command == "check-indexes":
+        failed = False
+        with engine.begin() as conn:
+            for name, index, used, plan in check_indexes(conn):
+                print(f"{'ok  ' if used else 'FAIL'} {name}: expects {index}")
+                if not used:
+                    failed = True
+                    print("     " + plan.replace("\n", "\n     "))
+        raise SystemExit(1 if failed else 0)
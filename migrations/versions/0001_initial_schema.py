@@ -0,0 +1,57 @@
+"""Initial schema
+
+Tables that predate migrations were created with Base.metadata.create_all,
+so each one is only created when it does not exist yet.
+
+Revision ID: 0001
+Revises:
+Create Date: 2025-10-20
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table("fit5122_survey_responses"):
+        op.create_table(
+            "fit5122_survey_responses",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("timestamp", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("participated_fully", sa.Boolean(), nullable=False),
+            sa.Column("lab_session", sa.String(100), nullable=True),
+            sa.Column("unit_content_quality", sa.Integer(), nullable=True),
+            sa.Column("teaching_effectiveness", sa.Integer(), nullable=True),
+            sa.Column("assessment_fairness", sa.Integer(), nullable=True),
+            sa.Column("learning_resources", sa.Integer(), nullable=True),
+            sa.Column("overall_experience", sa.Integer(), nullable=True),
+            sa.Column("positive_aspects", sa.Text(), nullable=True),
+            sa.Column("improvement_suggestions", sa.Text(), nullable=True),
+            sa.Column("technical_issues", sa.Text(), nullable=True),
+            sa.Column("additional_comments", sa.Text(), nullable=True),
+            sa.Column("consent_given", sa.Boolean(), nullable=False),
+        )
+        op.create_index("ix_fit5122_survey_responses_id", "fit5122_survey_responses", ["id"])
+
+    if not inspector.has_table("fit5122_rating_summary"):
+        op.create_table(
+            "fit5122_rating_summary",
+            sa.Column("group_key", sa.String(160), primary_key=True),
+            sa.Column("question", sa.String(50), primary_key=True),
+            sa.Column("h1", sa.Integer(), nullable=False),
+            sa.Column("h2", sa.Integer(), nullable=False),
+            sa.Column("h3", sa.Integer(), nullable=False),
+            sa.Column("h4", sa.Integer(), nullable=False),
+            sa.Column("h5", sa.Integer(), nullable=False),
+        )
+
+
+def downgrade():
+    op.drop_table("fit5122_rating_summary")
+    op.drop_table("fit5122_survey_responses")
@@ -0,0 +1,30 @@
+"""Analytic indexes on fit5122_survey_responses
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2025-10-20
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+TABLE = "fit5122_survey_responses"
+
+
+def upgrade():
+    op.create_index("ix_fit5122_survey_responses_lab_session_timestamp", TABLE, ["lab_session", "timestamp"])
+    op.create_index(
+        "ix_fit5122_survey_responses_consented_timestamp", TABLE, ["timestamp"],
+        postgresql_where=sa.text("consent_given"), sqlite_where=sa.text("consent_given"),
+    )
+    op.create_index("ix_fit5122_survey_responses_timestamp_brin", TABLE, ["timestamp"], postgresql_using="brin")
+
+
+def downgrade():
+    op.drop_index("ix_fit5122_survey_responses_timestamp_brin", table_name=TABLE)
+    op.drop_index("ix_fit5122_survey_responses_consented_timestamp", table_name=TABLE)
+    op.drop_index("ix_fit5122_survey_responses_lab_session_timestamp", table_name=TABLE)
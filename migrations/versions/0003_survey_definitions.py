@@ -0,0 +1,41 @@
+"""Data-driven surveys: definitions and compact responses
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2025-10-21
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+ANSWERS_TYPE = sa.JSON().with_variant(postgresql.JSONB(), "postgresql")
+
+
+def upgrade():
+    op.create_table(
+        "survey_definitions",
+        sa.Column("slug", sa.String(100), primary_key=True),
+        sa.Column("version", sa.Integer(), primary_key=True),
+        sa.Column("definition", ANSWERS_TYPE, nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_table(
+        "survey_responses",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("survey_slug", sa.String(100), nullable=False),
+        sa.Column("survey_version", sa.Integer(), nullable=False),
+        sa.Column("timestamp", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("answers", ANSWERS_TYPE, nullable=False),
+    )
+    op.create_index("ix_survey_responses_slug_timestamp", "survey_responses", ["survey_slug", "timestamp"])
+
+
+def downgrade():
+    op.drop_index("ix_survey_responses_slug_timestamp", table_name="survey_responses")
+    op.drop_table("survey_responses")
+    op.drop_table("survey_definitions")
@@ -0,0 +1,38 @@
+"""Client submission ids for idempotent API submissions
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2025-10-21
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+TABLE = "fit5122_survey_responses"
+
+
+def is_partitioned():
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        return False
+    relkind = bind.execute(
+        sa.text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"), {"name": TABLE}
+    ).scalar()
+    return relkind == "p"
+
+
+def upgrade():
+    op.add_column(TABLE, sa.Column("submission_id", sa.String(64), nullable=True))
+    # Unique indexes on a partitioned table must include the partition key,
+    # so there the index only speeds up the duplicate lookup
+    op.create_index("ix_fit5122_survey_responses_submission_id", TABLE, ["submission_id"],
+                    unique=not is_partitioned())
+
+
+def downgrade():
+    op.drop_index("ix_fit5122_survey_responses_submission_id", table_name=TABLE)
+    op.drop_column(TABLE, "submission_id")
@@ -0,0 +1,66 @@
+"""Full-text index over the free-text feedback fields
+
+PostgreSQL gets a stored tsvector column, generated from the four text
+fields, with a GIN index; SQLite gets an external-content FTS5 table kept
+in step by triggers. Either way new rows are indexed as they are inserted.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2025-10-22
+"""
+from alembic import op
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+TABLE = "fit5122_survey_responses"
+FTS_TABLE = "fit5122_survey_responses_fts"
+TEXT_FIELDS = ("positive_aspects", "improvement_suggestions", "technical_issues", "additional_comments")
+
+SEARCH_VECTOR = " || ' ' || ".join(f"coalesce({field}, '')" for field in TEXT_FIELDS)
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        op.execute(
+            f"ALTER TABLE {TABLE} ADD COLUMN search_vector tsvector "
+            f"GENERATED ALWAYS AS (to_tsvector('english'::regconfig, {SEARCH_VECTOR})) STORED"
+        )
+        op.execute(f"CREATE INDEX ix_{TABLE}_search ON {TABLE} USING gin (search_vector)")
+    elif dialect == "sqlite":
+        columns = ", ".join(TEXT_FIELDS)
+        new = ", ".join(f"new.{field}" for field in TEXT_FIELDS)
+        old = ", ".join(f"old.{field}" for field in TEXT_FIELDS)
+        op.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5({columns}, "
+            f"content='{TABLE}', content_rowid='id', tokenize='porter unicode61')"
+        )
+        op.execute(
+            f"CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON {TABLE} BEGIN "
+            f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new}); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON {TABLE} BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old}); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE ON {TABLE} BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old}); "
+            f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new}); END"
+        )
+        # Index the rows that are already there
+        op.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        op.execute(f"DROP INDEX IF EXISTS ix_{TABLE}_search")
+        op.execute(f"ALTER TABLE {TABLE} DROP COLUMN IF EXISTS search_vector")
+    elif dialect == "sqlite":
+        for suffix in ("ai", "ad", "au"):
+            op.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+        op.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
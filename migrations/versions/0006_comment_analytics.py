@@ -0,0 +1,50 @@
+"""Comment themes and sentiment from the offline analytics pipeline
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2025-10-23
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+JSON_TYPE = sa.JSON().with_variant(postgresql.JSONB(), "postgresql")
+
+
+def upgrade():
+    op.create_table(
+        "fit5122_comment_analysis",
+        sa.Column("response_id", sa.Integer(), primary_key=True),
+        sa.Column("theme", sa.Integer(), nullable=True),
+        sa.Column("sentiment", sa.Float(), nullable=True),
+        sa.Column("tokens", sa.Integer(), nullable=False),
+        sa.Column("analysed_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_fit5122_comment_analysis_theme", "fit5122_comment_analysis", ["theme"])
+    op.create_table(
+        "fit5122_comment_themes",
+        sa.Column("theme", sa.Integer(), primary_key=True),
+        sa.Column("size", sa.Integer(), nullable=False),
+        sa.Column("mean_sentiment", sa.Float(), nullable=True),
+        sa.Column("top_terms", JSON_TYPE, nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_table(
+        "fit5122_analytics_state",
+        sa.Column("name", sa.String(50), primary_key=True),
+        sa.Column("watermark", sa.Integer(), nullable=False),
+        sa.Column("model", sa.LargeBinary(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+
+
+def downgrade():
+    op.drop_table("fit5122_analytics_state")
+    op.drop_table("fit5122_comment_themes")
+    op.drop_index("ix_fit5122_comment_analysis_theme", table_name="fit5122_comment_analysis")
+    op.drop_table("fit5122_comment_analysis")
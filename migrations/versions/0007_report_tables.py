@@ -0,0 +1,41 @@
+"""Materialised cross-tab reports
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2025-10-24
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "fit5122_report_cells",
+        sa.Column("report", sa.String(100), primary_key=True),
+        sa.Column("row_key", sa.String(160), primary_key=True),
+        sa.Column("column_key", sa.String(160), primary_key=True),
+        sa.Column("question", sa.String(50), primary_key=True),
+        sa.Column("h1", sa.Integer(), nullable=False),
+        sa.Column("h2", sa.Integer(), nullable=False),
+        sa.Column("h3", sa.Integer(), nullable=False),
+        sa.Column("h4", sa.Integer(), nullable=False),
+        sa.Column("h5", sa.Integer(), nullable=False),
+    )
+    op.create_table(
+        "fit5122_report_runs",
+        sa.Column("report", sa.String(100), primary_key=True),
+        sa.Column("materialised_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("watermark", sa.Integer(), nullable=False),
+        sa.Column("source_rows", sa.Integer(), nullable=False),
+        sa.Column("duration_ms", sa.Float(), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table("fit5122_report_runs")
+    op.drop_table("fit5122_report_cells")
@@ -0,0 +1,27 @@
+"""Hourly histograms of client timing beacons
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2025-10-25
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "fit5122_beacon_histograms",
+        sa.Column("period_start", sa.DateTime(timezone=True), primary_key=True),
+        sa.Column("metric", sa.String(60), primary_key=True),
+        sa.Column("bucket", sa.SmallInteger(), primary_key=True),
+        sa.Column("count", sa.Integer(), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table("fit5122_beacon_histograms")
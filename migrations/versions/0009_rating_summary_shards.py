@@ -0,0 +1,51 @@
+"""Shard the rating summary so concurrent inserts don't queue on one row
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2025-10-26
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+COUNTS = "h1, h2, h3, h4, h5"
+
+
+def summary_table(name, sharded):
+    keys = ["group_key", "question"] + (["shard"] if sharded else [])
+    return op.create_table(
+        name,
+        sa.Column("group_key", sa.String(160), nullable=False),
+        sa.Column("question", sa.String(50), nullable=False),
+        *([sa.Column("shard", sa.SmallInteger(), nullable=False, server_default="0")] if sharded else []),
+        sa.Column("h1", sa.Integer(), nullable=False),
+        sa.Column("h2", sa.Integer(), nullable=False),
+        sa.Column("h3", sa.Integer(), nullable=False),
+        sa.Column("h4", sa.Integer(), nullable=False),
+        sa.Column("h5", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint(*keys),
+    )
+
+
+def upgrade():
+    # The primary key changes, which SQLite can only do by rebuilding the
+    # table; it holds a few hundred rows, so both backends simply copy it.
+    # Existing counts become shard 0.
+    summary_table("fit5122_rating_summary_sharded", sharded=True)
+    op.execute(f"INSERT INTO fit5122_rating_summary_sharded (group_key, question, shard, {COUNTS}) "
+               f"SELECT group_key, question, 0, {COUNTS} FROM fit5122_rating_summary")
+    op.drop_table("fit5122_rating_summary")
+    op.rename_table("fit5122_rating_summary_sharded", "fit5122_rating_summary")
+
+
+def downgrade():
+    summary_table("fit5122_rating_summary_merged", sharded=False)
+    op.execute(f"INSERT INTO fit5122_rating_summary_merged (group_key, question, {COUNTS}) "
+               "SELECT group_key, question, SUM(h1), SUM(h2), SUM(h3), SUM(h4), SUM(h5) "
+               "FROM fit5122_rating_summary GROUP BY group_key, question")
+    op.drop_table("fit5122_rating_summary")
+    op.rename_table("fit5122_rating_summary_merged", "fit5122_rating_summary")
@@ -0,0 +1,68 @@
+"""Unique submission ids on a partitioned responses table
+
+A table partitioned (migrate.py partition) before 0004 ran got only a
+plain submission_id index there, because a unique index must contain the
+partition key. This adds the guard migrate.py now sets up when it
+partitions: a table of submission ids, kept in step by a row trigger, whose
+primary key rejects duplicates. Unpartitioned tables are left alone.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2025-10-27
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+TABLE = "fit5122_survey_responses"
+SUBMISSION_IDS = f"{TABLE}_submission_ids"
+
+
+def is_partitioned():
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        return False
+    relkind = bind.execute(
+        sa.text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"), {"name": TABLE}
+    ).scalar()
+    return relkind == "p"
+
+
+def upgrade():
+    if not is_partitioned():
+        return
+    op.execute(f"CREATE TABLE IF NOT EXISTS {SUBMISSION_IDS} (submission_id varchar(64) PRIMARY KEY)")
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION {SUBMISSION_IDS}_sync() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.submission_id IS NOT NULL THEN
+                DELETE FROM {SUBMISSION_IDS} WHERE submission_id = OLD.submission_id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.submission_id IS NOT NULL THEN
+                INSERT INTO {SUBMISSION_IDS} (submission_id) VALUES (NEW.submission_id);
+            END IF;
+            RETURN NULL;
+        END $$
+    """)
+    # Duplicates stored while nothing prevented them stay; their id is recorded once
+    op.execute(
+        f"INSERT INTO {SUBMISSION_IDS} (submission_id) SELECT submission_id FROM {TABLE} "
+        f"WHERE submission_id IS NOT NULL ON CONFLICT DO NOTHING"
+    )
+    op.execute(f"DROP TRIGGER IF EXISTS {SUBMISSION_IDS}_sync ON {TABLE}")
+    op.execute(
+        f"CREATE TRIGGER {SUBMISSION_IDS}_sync AFTER INSERT OR DELETE OR UPDATE OF submission_id ON {TABLE} "
+        f"FOR EACH ROW EXECUTE FUNCTION {SUBMISSION_IDS}_sync()"
+    )
+
+
+def downgrade():
+    if not is_partitioned():
+        return
+    op.execute(f"DROP TRIGGER IF EXISTS {SUBMISSION_IDS}_sync ON {TABLE}")
+    op.execute(f"DROP FUNCTION IF EXISTS {SUBMISSION_IDS}_sync()")
+    op.execute(f"DROP TABLE IF EXISTS {SUBMISSION_IDS}")
@@ -0,0 +1,144 @@
+from sqlalchemy import JSON, Column, Float, Integer, LargeBinary, SmallInteger, String, Text, DateTime, Boolean, Index, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.sql import func
+
+Base = declarative_base()
+
+
+class FIT5122SurveyResponse(Base):
+    __tablename__ = "fit5122_survey_responses"
+    # Schema changes go through migrations/ (alembic), not create_all
+    __table_args__ = (
+        # Per-session reports and exports filter on lab_session and a time window
+        Index("ix_fit5122_survey_responses_lab_session_timestamp", "lab_session", "timestamp"),
+        # Research queries only ever read consented rows
+        Index("ix_fit5122_survey_responses_consented_timestamp", "timestamp",
+              postgresql_where=text("consent_given"), sqlite_where=text("consent_given")),
+        # Rows arrive in timestamp order, so a BRIN index stays tiny on PostgreSQL
+        # (other backends get a plain b-tree)
+        Index("ix_fit5122_survey_responses_timestamp_brin", "timestamp", postgresql_using="brin"),
+        # Client-chosen idempotency key; NULLs (legacy rows, plain form posts) never collide
+        Index("ix_fit5122_survey_responses_submission_id", "submission_id", unique=True),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    participated_fully = Column(Boolean, nullable=False)
+    lab_session = Column(String(100), nullable=True)
+    unit_content_quality = Column(Integer, nullable=True)
+    teaching_effectiveness = Column(Integer, nullable=True)
+    assessment_fairness = Column(Integer, nullable=True)
+    learning_resources = Column(Integer, nullable=True)
+    overall_experience = Column(Integer, nullable=True)
+    positive_aspects = Column(Text, nullable=True)
+    improvement_suggestions = Column(Text, nullable=True)
+    technical_issues = Column(Text, nullable=True)
+    additional_comments = Column(Text, nullable=True)
+    consent_given = Column(Boolean, nullable=False, default=False)
+    submission_id = Column(String(64), nullable=True)
+
+
+class FIT5122RatingSummary(Base):
+    # 1-5 histograms per (group, question), split over shards that reads sum;
+    # maintained incrementally by stats.py
+    __tablename__ = "fit5122_rating_summary"
+    group_key = Column(String(160), primary_key=True)
+    question = Column(String(50), primary_key=True)
+    shard = Column(SmallInteger, primary_key=True, default=0, server_default="0")
+    h1 = Column(Integer, nullable=False, default=0)
+    h2 = Column(Integer, nullable=False, default=0)
+    h3 = Column(Integer, nullable=False, default=0)
+    h4 = Column(Integer, nullable=False, default=0)
+    h5 = Column(Integer, nullable=False, default=0)
+
+
+# JSONB on PostgreSQL (binary, compact), JSON text elsewhere
+AnswersType = JSON().with_variant(JSONB(), "postgresql")
+
+
+class SurveyDefinition(Base):
+    # Every version is kept so stored answers can always be decoded (see surveys.py)
+    __tablename__ = "survey_definitions"
+    slug = Column(String(100), primary_key=True)
+    version = Column(Integer, primary_key=True)
+    definition = Column(AnswersType, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class SurveyResponse(Base):
+    # Responses to data-driven surveys: answers is a positional array in the
+    # question order of (survey_slug, survey_version)
+    __tablename__ = "survey_responses"
+    __table_args__ = (
+        Index("ix_survey_responses_slug_timestamp", "survey_slug", "timestamp"),
+    )
+    id = Column(Integer, primary_key=True)
+    survey_slug = Column(String(100), nullable=False)
+    survey_version = Column(Integer, nullable=False)
+    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    answers = Column(AnswersType, nullable=False)
+
+
+class FIT5122CommentAnalysis(Base):
+    # Theme and sentiment of one response's free text, written by analytics.py
+    __tablename__ = "fit5122_comment_analysis"
+    __table_args__ = (
+        Index("ix_fit5122_comment_analysis_theme", "theme"),
+    )
+    response_id = Column(Integer, primary_key=True)
+    theme = Column(Integer, nullable=True)
+    sentiment = Column(Float, nullable=True)
+    tokens = Column(Integer, nullable=False)
+    analysed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class FIT5122CommentTheme(Base):
+    # One row per theme cluster, replaced at the end of every analytics run
+    __tablename__ = "fit5122_comment_themes"
+    theme = Column(Integer, primary_key=True)
+    size = Column(Integer, nullable=False)
+    mean_sentiment = Column(Float, nullable=True)
+    top_terms = Column(AnswersType, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class FIT5122AnalyticsState(Base):
+    # Watermark (last analysed response id) and the serialised model it was built with
+    __tablename__ = "fit5122_analytics_state"
+    name = Column(String(50), primary_key=True)
+    watermark = Column(Integer, nullable=False)
+    model = Column(LargeBinary, nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class FIT5122ReportCell(Base):
+    # One 1-5 histogram per cross-tab cell of a report, replaced when reports.py materialises it
+    __tablename__ = "fit5122_report_cells"
+    report = Column(String(100), primary_key=True)
+    row_key = Column(String(160), primary_key=True)
+    column_key = Column(String(160), primary_key=True)
+    question = Column(String(50), primary_key=True)
+    h1 = Column(Integer, nullable=False, default=0)
+    h2 = Column(Integer, nullable=False, default=0)
+    h3 = Column(Integer, nullable=False, default=0)
+    h4 = Column(Integer, nullable=False, default=0)
+    h5 = Column(Integer, nullable=False, default=0)
+
+
+class FIT5122ReportRun(Base):
+    # When each report was last materialised, and the last response id it covers
+    __tablename__ = "fit5122_report_runs"
+    report = Column(String(100), primary_key=True)
+    materialised_at = Column(DateTime(timezone=True), nullable=False)
+    watermark = Column(Integer, nullable=False)
+    source_rows = Column(Integer, nullable=False)
+    duration_ms = Column(Float, nullable=False)
+
+
+class FIT5122BeaconHistogram(Base):
+    # Client timing beacon counts per hour, metric and bucket; added to by beacons.py
+    __tablename__ = "fit5122_beacon_histograms"
+    period_start = Column(DateTime(timezone=True), primary_key=True)
+    metric = Column(String(60), primary_key=True)
+    bucket = Column(SmallInteger, primary_key=True)
+    count = Column(Integer, nullable=False)
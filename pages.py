@@ -0,0 +1,104 @@
+import gzip
+import hashlib
+
+from fastapi import Response
+
+from database import env_int
+
+PAGE_MAX_AGE = env_int("PAGE_MAX_AGE", 60)
+
+
+def parse_accept_encoding(header):
+    accepted = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+class StaticPage:
+    """A page rendered once into immutable bytes.
+
+    Holds identity, gzip and (when available) brotli variants, each with
+    its own strong ETag, so conditional GETs are answered with a 304 and
+    no work beyond a header comparison. Compression happens on first use
+    (or warm()), not at import.
+    """
+
+    def __init__(self, html, media_type="text/html", max_age=PAGE_MAX_AGE):
+        self.html = html
+        self.media_type = media_type
+        self.cache_control = f"public, max-age={max_age}"
+        self.variants = None
+        self.etags = None
+
+    def warm(self):
+        if self.variants is not None:
+            return self
+        body = self.html.encode("utf-8")
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        variants = {None: (body, f'"{digest}"')}
+        variants["gzip"] = (gzip.compress(body, 9, mtime=0), f'"{digest}-gzip"')
+        try:
+            import brotli
+        except ImportError:  # brotli is optional; gzip is always available
+            pass
+        else:
+            variants["br"] = (brotli.compress(body, quality=11), f'"{digest}-br"')
+        self.etags = {etag for _, etag in variants.values()}
+        self.variants = variants
+        return self
+
+    def choose_encoding(self, accept_encoding):
+        if not accept_encoding:
+            return None
+        accepted = parse_accept_encoding(accept_encoding)
+        for encoding in ("br", "gzip"):
+            if encoding in self.variants and (encoding in accepted or "*" in accepted):
+                return encoding
+        return None
+
+    def not_modified(self, if_none_match):
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            if tag in self.etags:
+                return True
+        return False
+
+    def response(self, request, status_code=200):
+        self.warm()
+        encoding = self.choose_encoding(request.headers.get("accept-encoding"))
+        body, etag = self.variants[encoding]
+        headers = {
+            "ETag": etag,
+            "Cache-Control": self.cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if status_code == 200 and self.not_modified(request.headers.get("if-none-match")):
+            return Response(status_code=304, headers=headers)
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, status_code=status_code, media_type=self.media_type, headers=headers)
+
+
+class RenderedPageCache:
+    """Keeps one StaticPage per input key and re-renders only when the key changes."""
+
+    def __init__(self, render):
+        self.render = render
+        self.key = None
+        self.page = None
+
+    def get(self, key):
+        if self.page is None or key != self.key:
+            self.page = StaticPage(self.render(key))
+            self.key = key
+        return self.page
@@ -0,0 +1,216 @@
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+
+from database import env_bool, env_int
+from metrics import SUBMISSIONS_REJECTED
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # redis is optional; without it only the in-process backend is available
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Duplicate suppression is always on; this switches the per-client limit
+RATE_LIMIT_ENABLED = env_bool("RATE_LIMIT_ENABLED", True)
+# Sustained POSTs per client address, and how many may arrive at once. A
+# whole lab behind one campus NAT shares an address, so the burst lets about
+# 400 students submit together at the end of a session
+RATE_LIMIT_PER_MINUTE = env_int("RATE_LIMIT_PER_MINUTE", 300)
+RATE_LIMIT_BURST = env_int("RATE_LIMIT_BURST", 500)
+# Client addresses tracked at once; the least recently seen are forgotten first
+RATE_LIMIT_MAX_CLIENTS = env_int("RATE_LIMIT_MAX_CLIENTS", 10000)
+# How long a form's submission_id is remembered, and how many are kept
+DEDUP_TTL_SECONDS = env_int("DEDUP_TTL_SECONDS", 600)
+DEDUP_MAX_ENTRIES = env_int("DEDUP_MAX_ENTRIES", 50000)
+# POSTs that never count against a client: timing beacons are tiny, counted
+# in memory, and sent by every page view
+RATE_LIMIT_EXEMPT_PATHS = ("/beacon",)
+# "memory" (per worker) or a redis:// URL shared by every worker
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+
+
+class MemoryBackend:
+    """Token buckets and recently seen nonces in this process, both bounded.
+
+    Buckets are evicted least recently used first (a forgotten client simply
+    starts again with a full bucket); nonces expire after their TTL, and the
+    oldest go first when the cache is full.
+    """
+
+    def __init__(self, max_clients=RATE_LIMIT_MAX_CLIENTS, max_nonces=DEDUP_MAX_ENTRIES):
+        self.max_clients = max_clients
+        self.max_nonces = max_nonces
+        self.buckets = OrderedDict()  # key -> (tokens, updated)
+        self.nonces = OrderedDict()  # nonce -> expires, in expiry order since the TTL is fixed
+
+    async def take(self, key, rate, burst):
+        """Take a token from ``key``'s bucket; returns 0, or the seconds until one is available."""
+        now = time.monotonic()
+        state = self.buckets.pop(key, None)
+        tokens = burst if state is None else min(burst, state[0] + (now - state[1]) * rate)
+        if tokens >= 1:
+            tokens, wait = tokens - 1, 0.0
+        else:
+            wait = (1 - tokens) / rate
+        self.buckets[key] = (tokens, now)
+        if len(self.buckets) > self.max_clients:
+            self.buckets.popitem(last=False)
+        return wait
+
+    async def claim(self, nonce, ttl):
+        """True the first time ``nonce`` is seen within ``ttl`` seconds."""
+        now = time.monotonic()
+        while self.nonces:
+            oldest, expires = next(iter(self.nonces.items()))
+            if expires > now:
+                break
+            del self.nonces[oldest]
+        if nonce in self.nonces:
+            return False
+        self.nonces[nonce] = now + ttl
+        if len(self.nonces) > self.max_nonces:
+            self.nonces.popitem(last=False)
+        return True
+
+    async def release(self, nonce):
+        self.nonces.pop(nonce, None)
+
+    async def close(self):
+        pass
+
+
+# Refill, take and store in one round trip, atomically for every worker
+TOKEN_BUCKET_SCRIPT = """
+local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisBackend:
+    """The same operations on Redis, so every worker shares one bucket per client.
+
+    Keys expire on their own (a full bucket needs no state), which bounds
+    memory without any sweeping here.
+    """
+
+    def __init__(self, url, prefix="survey:"):
+        if redis is None:
+            raise RuntimeError("RATE_LIMIT_BACKEND is a Redis URL but the redis package is not installed")
+        self.client = redis.from_url(url)
+        self.prefix = prefix
+        self.token_bucket = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def take(self, key, rate, burst):
+        wait = await self.token_bucket(keys=[f"{self.prefix}bucket:{key}"], args=[rate, burst, time.time()])
+        return float(wait)
+
+    async def claim(self, nonce, ttl):
+        return bool(await self.client.set(f"{self.prefix}nonce:{nonce}", 1, nx=True, ex=ttl))
+
+    async def release(self, nonce):
+        await self.client.delete(f"{self.prefix}nonce:{nonce}")
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def create_backend(spec=RATE_LIMIT_BACKEND):
+    if spec.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(spec)
+    if spec != "memory":
+        raise ValueError(f"Unknown RATE_LIMIT_BACKEND {spec!r}")
+    return MemoryBackend()
+
+
+class SubmissionGuard:
+    """Per-client rate limiting and duplicate suppression in front of the database.
+
+    Both checks answer from the backend alone, so a rejected request costs
+    no query. If a shared backend is unreachable the request is let through:
+    the unique submission_id index still stops duplicates.
+    """
+
+    def __init__(self, backend, per_minute=RATE_LIMIT_PER_MINUTE, burst=RATE_LIMIT_BURST,
+                 ttl=DEDUP_TTL_SECONDS):
+        self.backend = backend
+        self.rate = per_minute / 60
+        self.burst = burst
+        self.ttl = ttl
+
+    async def retry_after(self, client):
+        """0 if ``client`` may send a request now, otherwise seconds to wait."""
+        try:
+            return await self.backend.take(client, self.rate, self.burst)
+        except Exception:
+            logger.warning("Rate limit backend unavailable; allowing request", exc_info=True)
+            return 0.0
+
+    async def claim(self, nonce):
+        """False if a submission with this nonce was accepted in the last ``ttl`` seconds."""
+        try:
+            return await self.backend.claim(nonce, self.ttl)
+        except Exception:
+            logger.warning("Dedup backend unavailable; allowing submission", exc_info=True)
+            return True
+
+    async def release(self, nonce):
+        # The submission was not stored after all, so a retry must get through
+        try:
+            await self.backend.release(nonce)
+        except Exception:
+            logger.warning("Dedup backend unavailable; nonce not released", exc_info=True)
+
+
+class RateLimitMiddleware:
+    """Answers 429 to POSTs from a client that has used up its token bucket.
+
+    The client is the connection's address, which uvicorn takes from
+    X-Forwarded-For when the peer is in FORWARDED_ALLOW_IPS (every peer
+    under gunicorn.conf.py).
+    """
+
+    def __init__(self, app, guard, exempt_paths=RATE_LIMIT_EXEMPT_PATHS):
+        self.app = app
+        self.guard = guard
+        self.exempt_paths = frozenset(exempt_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        client = scope["client"][0] if scope.get("client") else "unknown"
+        wait = await self.guard.retry_after(client)
+        if not wait:
+            await self.app(scope, receive, send)
+            return
+
+        SUBMISSIONS_REJECTED.labels("rate_limited").inc()
+        logger.info("Rate limited POST %s", scope["path"], extra={"client": client})
+        seconds = str(max(1, math.ceil(wait)))
+        body = f"Too many submissions; try again in {seconds} seconds.\n".encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", seconds.encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+submission_guard = SubmissionGuard(create_backend())
@@ -0,0 +1,360 @@
+import argparse
+import asyncio
+import logging
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from sqlalchemy import delete, func, insert, select, text
+
+import database
+from database import (FIT5122ReportCell, FIT5122ReportRun, FIT5122SurveyResponse, env_int, new_read_session,
+                      new_session)
+from pages import StaticPage
+from stats import HISTOGRAM_COLUMNS, RATING_QUESTIONS, summarise
+from templating import render
+
+logger = logging.getLogger(__name__)
+
+# A report is materialised again once this many responses arrived since its last run...
+REPORTS_REFRESH_ROWS = env_int("REPORTS_REFRESH_ROWS", 200)
+# ...or, if any arrived at all, once its last run is this old
+REPORTS_REFRESH_SECONDS = env_int("REPORTS_REFRESH_SECONDS", 600)
+# How often each worker looks for due reports and for runs made by other workers
+REPORTS_CHECK_SECONDS = env_int("REPORTS_CHECK_SECONDS", 30)
+REPORTS_CACHE_SIZE = env_int("REPORTS_CACHE_SIZE", 64)
+# Backstop for cached reports; runs are normally noticed by the check above
+REPORTS_CACHE_TTL = env_int("REPORTS_CACHE_TTL", 300)
+
+# Advisory lock key that keeps workers from materialising at the same time (PostgreSQL)
+REPORTS_LOCK_KEY = 512202503
+
+DAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+SLOT_PATTERN = re.compile(r"\b(Mon|Tue|Wed|Thu|Fri|Sat|Sun)\w* (\d{1,2}):(\d{2})\b")
+UNSPECIFIED = "unspecified"
+# Column key of reports without a column dimension
+ALL = "all"
+
+
+def time_slot(lab_session):
+    """'01_OnCampus-P2 - Wed 12:00 (Group 17) - ...' -> 'Wed 12:00'; sessions without a time keep their name."""
+    if not lab_session:
+        return UNSPECIFIED
+    match = SLOT_PATTERN.search(lab_session)
+    if match is None:
+        return lab_session
+    day, hour, minute = match.groups()
+    return f"{day} {int(hour):02d}:{minute}"
+
+
+def slot_order(key):
+    # Weekday and time first, then the untimed sessions by name, then unspecified
+    match = SLOT_PATTERN.fullmatch(key)
+    if match is not None:
+        day, hour, minute = match.groups()
+        return (0, DAYS.index(day), int(hour), int(minute))
+    return (2,) if key == UNSPECIFIED else (1, key)
+
+
+class Dimension:
+    """How responses are grouped along one side of a cross-tab.
+
+    ``key(lab_session, participated_fully)`` names the group of a response;
+    ``order`` sorts the group names for display.
+    """
+
+    def __init__(self, label, key, order=None):
+        self.label = label
+        self.key = key
+        self.order = order or (lambda key: (key == UNSPECIFIED, key))
+
+
+DIMENSIONS = {
+    "time_slot": Dimension("Time slot", lambda lab, participated: time_slot(lab), slot_order),
+    "lab_session": Dimension("Lab session", lambda lab, participated: lab or UNSPECIFIED),
+    "participated_fully": Dimension("Participated fully",
+                                    lambda lab, participated: "yes" if participated else "no",
+                                    lambda key: key != "yes"),
+}
+
+
+class Report:
+    """A declared cross-tab: rating histograms of ``questions`` for each
+    group of ``rows``, split by ``columns`` when given."""
+
+    def __init__(self, name, title, rows, columns=None, questions=RATING_QUESTIONS):
+        self.name = name
+        self.title = title
+        self.rows = DIMENSIONS[rows]
+        self.columns = DIMENSIONS[columns] if columns else None
+        self.questions = tuple(questions)
+
+    def cells(self, cube):
+        """Roll the base histograms up into {(row, column, question): histogram}."""
+        cells = {}
+        for (lab, participated, question), histogram in cube.items():
+            if question not in self.questions:
+                continue
+            row = self.rows.key(lab, participated)
+            column = self.columns.key(lab, participated) if self.columns else ALL
+            total = cells.setdefault((row, column, question), [0] * 5)
+            for i, count in enumerate(histogram):
+                total[i] += count
+        return cells
+
+
+REPORTS = {report.name: report for report in (
+    Report("experience-by-time-slot", "Overall experience by time slot",
+           rows="time_slot", questions=("overall_experience",)),
+    Report("ratings-by-time-slot", "Ratings by time slot", rows="time_slot"),
+    Report("ratings-by-participation", "Ratings by participation", rows="participated_fully"),
+    Report("experience-by-time-slot-and-participation", "Overall experience by time slot and participation",
+           rows="time_slot", columns="participated_fully", questions=("overall_experience",)),
+    Report("ratings-by-lab-session", "Ratings by lab session", rows="lab_session"),
+)}
+
+
+async def load_cube(db):
+    """Histograms per (lab_session, participated_fully, question).
+
+    The only pass over the responses table: every report is rolled up
+    from this, however many reports there are.
+    """
+    table = FIT5122SurveyResponse.__table__
+    cube = {}
+    for question in RATING_QUESTIONS:
+        column = table.c[question]
+        result = await db.execute(
+            select(table.c.lab_session, table.c.participated_fully, column, func.count())
+            .where(column.between(1, 5))
+            .group_by(table.c.lab_session, table.c.participated_fully, column)
+        )
+        for lab, participated, value, count in result.all():
+            cube.setdefault((lab, bool(participated), question), [0] * 5)[value - 1] += count
+    return cube
+
+
+def as_utc(moment):
+    # SQLite hands timestamps back naive; they were written in UTC
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment
+
+
+def due(run, latest, now):
+    if run is None:
+        return True
+    new = (latest or 0) - run.watermark
+    age = (now - as_utc(run.materialised_at)).total_seconds()
+    return new >= REPORTS_REFRESH_ROWS or (new > 0 and age >= REPORTS_REFRESH_SECONDS)
+
+
+async def refresh(names=None):
+    """Materialise the reports that are due, or every report in ``names``.
+
+    Returns {report: materialised_at} for all reports after the pass, or
+    None if another process is materialising.
+    """
+    db = new_session()
+    try:
+        if database.DB_BACKEND == "postgresql":
+            acquired = await db.scalar(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": REPORTS_LOCK_KEY})
+            if not acquired:
+                return None
+        runs = {run.report: run for run in (await db.execute(select(FIT5122ReportRun.__table__))).all()}
+        latest = await db.scalar(select(func.max(FIT5122SurveyResponse.id)))
+        now = datetime.now(timezone.utc)
+        if names is None:
+            names = [name for name in REPORTS if due(runs.get(name), latest, now)]
+        if not names:
+            return {name: as_utc(run.materialised_at) for name, run in runs.items()}
+
+        started = time.perf_counter()
+        watermark, total = (await db.execute(
+            select(func.max(FIT5122SurveyResponse.id), func.count()).select_from(FIT5122SurveyResponse)
+        )).one()
+        cube = await load_cube(db)
+        params = [
+            {"report": name, "row_key": row, "column_key": column, "question": question,
+             **dict(zip(HISTOGRAM_COLUMNS, histogram))}
+            for name in names
+            for (row, column, question), histogram in REPORTS[name].cells(cube).items()
+        ]
+        await db.execute(delete(FIT5122ReportCell).where(FIT5122ReportCell.report.in_(names)))
+        await db.execute(delete(FIT5122ReportRun).where(FIT5122ReportRun.report.in_(names)))
+        if params:
+            await db.execute(insert(FIT5122ReportCell), params)
+        duration_ms = round((time.perf_counter() - started) * 1e3, 1)
+        await db.execute(insert(FIT5122ReportRun), [
+            {"report": name, "materialised_at": now, "watermark": watermark or 0, "source_rows": total,
+             "duration_ms": duration_ms}
+            for name in names
+        ])
+        await db.commit()
+    finally:
+        await db.close()
+    logger.info("Materialised reports", extra={"reports": names, "rows": total, "duration_ms": duration_ms})
+    materialised = {name: as_utc(run.materialised_at) for name, run in runs.items()}
+    materialised.update((name, now) for name in names)
+    return materialised
+
+
+async def load_report(report):
+    """The materialised report as a dict; reads only its own cells, so its cost doesn't grow with responses."""
+    db = new_read_session()
+    try:
+        run = (await db.execute(
+            select(FIT5122ReportRun.__table__).where(FIT5122ReportRun.report == report.name)
+        )).first()
+        cells = (await db.execute(
+            select(FIT5122ReportCell.__table__).where(FIT5122ReportCell.report == report.name)
+        )).all()
+    finally:
+        await db.close()
+
+    grid = {}
+    columns = set()
+    for cell in cells:
+        columns.add(cell.column_key)
+        histogram = [getattr(cell, col) for col in HISTOGRAM_COLUMNS]
+        grid.setdefault(cell.row_key, {}).setdefault(cell.column_key, {})[cell.question] = summarise(histogram)
+    return {
+        "name": report.name,
+        "title": report.title,
+        "rows_label": report.rows.label,
+        "columns_label": report.columns.label if report.columns else None,
+        "questions": list(report.questions),
+        "columns": sorted(columns, key=report.columns.order) if report.columns else [ALL],
+        "rows": [{"key": key, "cells": grid[key]} for key in sorted(grid, key=report.rows.order)],
+        "materialised_at": run.materialised_at.isoformat() if run else None,
+        "source_rows": run.source_rows if run else 0,
+    }
+
+
+class TTLCache:
+    """LRU cache of at most ``maxsize`` entries, each dropped ``ttl`` seconds after it was set."""
+
+    def __init__(self, maxsize=REPORTS_CACHE_SIZE, ttl=REPORTS_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if time.monotonic() >= expires:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self.entries[key] = (value, time.monotonic() + self.ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, name):
+        # Every cached form (data, page) of one report
+        for key in [key for key in self.entries if key[0] == name]:
+            del self.entries[key]
+
+
+class Reports:
+    """Serves materialised reports from a cache and keeps them up to date.
+
+    A background task in each worker runs refresh() every
+    ``check_interval`` seconds, and sooner once this worker alone has
+    stored ``refresh_rows`` responses (ingest calls notify()). A report is
+    dropped from the cache as soon as a run of it is seen, whichever
+    worker made it, so reads never hit the responses table.
+    """
+
+    def __init__(self, check_interval=REPORTS_CHECK_SECONDS, refresh_rows=REPORTS_REFRESH_ROWS):
+        self.check_interval = check_interval
+        self.refresh_rows = refresh_rows
+        self.cache = TTLCache()
+        self.seen = {}
+        self.pending = 0
+        self.wake = None
+        self.task = None
+
+    def notify(self, created):
+        # Called after responses are committed
+        self.pending += created
+        if self.wake is not None and self.pending >= self.refresh_rows:
+            self.wake.set()
+
+    async def data(self, name):
+        data = self.cache.get((name, "data"))
+        if data is None:
+            data = await load_report(REPORTS[name])
+            self.cache.set((name, "data"), data)
+        return data
+
+    async def page(self, name):
+        page = self.cache.get((name, "page"))
+        if page is None:
+            page = StaticPage(render("report.html", report=await self.data(name)))
+            self.cache.set((name, "page"), page)
+        return page
+
+    async def check(self):
+        self.pending = 0
+        materialised = await refresh()
+        if materialised is None:
+            return
+        for name, at in materialised.items():
+            if self.seen.get(name) != at:
+                self.cache.invalidate(name)
+                self.seen[name] = at
+
+    async def start(self):
+        self.wake = asyncio.Event()
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+
+    async def _run(self):
+        while True:
+            self.wake.clear()
+            try:
+                await self.check()
+            except Exception as e:
+                logger.warning("Report refresh failed: %s", e)
+            try:
+                await asyncio.wait_for(self.wake.wait(), self.check_interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+reports = Reports()
+
+
+async def materialise(names):
+    try:
+        return await refresh(names)
+    finally:
+        await database.dispose_engines()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Materialise the cross-tab reports")
+    parser.add_argument("--report", action="append", choices=sorted(REPORTS),
+                        help="report to materialise (repeatable); default: every report")
+    args = parser.parse_args()
+    names = args.report or list(REPORTS)
+    started = time.perf_counter()
+    if asyncio.run(materialise(names)) is None:
+        print("Another process is materialising the reports; try again shortly")
+    else:
+        print(f"Materialised {len(names)} report(s) in {time.perf_counter() - started:.2f}s")
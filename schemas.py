@@ -0,0 +1,41 @@
+from typing import Optional
+
+from pydantic import BaseModel, ConfigDict, Field
+
+Rating = Optional[int]
+
+
+class SurveySubmission(BaseModel):
+    """One FIT5122 response, as sent by the HTML form or the JSON API.
+
+    ``submission_id`` is chosen by the client (a UUID is typical); a response
+    whose id is already stored is reported as a duplicate, not inserted
+    again, so clients can safely retry.
+    """
+
+    model_config = ConfigDict(extra="forbid")
+
+    submission_id: Optional[str] = Field(None, min_length=1, max_length=64)
+    participated_fully: bool
+    lab_session: Optional[str] = Field(None, max_length=100)
+    unit_content_quality: Rating = Field(None, ge=1, le=5)
+    teaching_effectiveness: Rating = Field(None, ge=1, le=5)
+    assessment_fairness: Rating = Field(None, ge=1, le=5)
+    learning_resources: Rating = Field(None, ge=1, le=5)
+    overall_experience: Rating = Field(None, ge=1, le=5)
+    positive_aspects: Optional[str] = None
+    improvement_suggestions: Optional[str] = None
+    technical_issues: Optional[str] = None
+    additional_comments: Optional[str] = None
+    consent_given: bool = False
+
+    def to_row(self):
+        return self.model_dump()
+
+
+def error_details(error):
+    # Compact, JSON-safe form of a pydantic ValidationError
+    return [
+        {"field": ".".join(str(part) for part in item["loc"]) or None, "message": item["msg"]}
+        for item in error.errors()
+    ]
@@ -0,0 +1,234 @@
+import html
+import re
+
+from sqlalchemy import text
+
+from database import env_int
+
+SEARCH_MAX_LIMIT = env_int("SEARCH_MAX_LIMIT", 100)
+# Matches are ranked among the newest this many, and older ones follow newest
+# first; ranking every hit of a very common word would cost more than the search
+SEARCH_RANK_WINDOW = env_int("SEARCH_RANK_WINDOW", 5000)
+# Words of context around each highlighted match
+SEARCH_SNIPPET_WORDS = env_int("SEARCH_SNIPPET_WORDS", 12)
+
+TABLE = "fit5122_survey_responses"
+FTS_TABLE = "fit5122_survey_responses_fts"
+TEXT_FIELDS = ("positive_aspects", "improvement_suggestions", "technical_issues", "additional_comments")
+
+# Highlight markers that cannot occur in stored text; swapped for <mark> after escaping
+START, STOP = "\x02", "\x03"
+TERM_PATTERN = re.compile(r'(-?)"([^"]*)"?|(\S+)')
+# Stands between two terms either of which may match
+OR = object()
+
+
+class SearchQueryError(ValueError):
+    pass
+
+
+def parse_query(query):
+    """Split web-search style input into (terms, excluded) phrase lists and OR markers.
+
+    ``wifi "lab room" -zoom OR moodle`` gives terms ["wifi", "lab room", OR, "moodle"]
+    and excluded ["zoom"]. Quotes make a phrase, a leading '-' excludes.
+    """
+    terms, excluded = [], []
+    for negated, phrase, word in TERM_PATTERN.findall(query):
+        if word == "OR":
+            if terms and terms[-1] is not OR:
+                terms.append(OR)
+            continue
+        if word.startswith("-") and len(word) > 1:
+            negated, phrase = "-", word[1:]
+        elif word:
+            phrase = word
+        phrase = phrase.strip()
+        if phrase:
+            (excluded if negated else terms).append(phrase)
+    while terms and terms[-1] is OR:
+        terms.pop()
+    if not terms:
+        raise SearchQueryError("Search for at least one word or phrase")
+    return terms, excluded
+
+
+def fts5_query(terms, excluded):
+    # Every term becomes an FTS5 string, so user input can never be read as query syntax
+    def quoted(phrase):
+        return '"' + phrase.replace('"', '""') + '"'
+
+    parts = ["OR" if term is OR else quoted(term) for term in terms]
+    match = " ".join(parts)
+    if excluded:
+        match = f"({match}) NOT ({' OR '.join(quoted(phrase) for phrase in excluded)})"
+    return match
+
+
+def highlight(snippet):
+    return html.escape(snippet).replace(START, "<mark>").replace(STOP, "</mark>")
+
+
+def row_filters(lab_session, consent, alias="r"):
+    filters = ""
+    if lab_session is not None:
+        filters += f" AND {alias}.lab_session = :lab_session"
+    if consent is not None:
+        filters += f" AND {alias}.consent_given" if consent else f" AND NOT {alias}.consent_given"
+    return filters
+
+
+def postgres_window(query, lab_session, consent):
+    # (lowest id, count) of the newest SEARCH_RANK_WINDOW matches, read through the
+    # GIN index (rare terms) or the id index backwards (common ones)
+    filters = row_filters(lab_session, consent)
+    sql = f"""
+        SELECT coalesce(min(w.id), 0) AS bound, count(*) AS matches FROM (
+            SELECT r.id FROM {TABLE} r
+            WHERE r.search_vector @@ websearch_to_tsquery('english', :query){filters}
+            ORDER BY r.id DESC
+            LIMIT :window
+        ) AS w
+    """
+    return text(sql), {"query": query, "lab_session": lab_session, "window": SEARCH_RANK_WINDOW}
+
+
+def postgres_search(query, lab_session, consent, limit, offset, bound, ranked):
+    # websearch_to_tsquery understands the same syntax and never raises on bad input;
+    # parsing here only rejects queries with nothing to match, like on SQLite.
+    # Matches from bound up are ranked; older ones (ranked=False) come newest
+    # first with no rank. The costlier headlines are built for the returned page alone.
+    parse_query(query)
+    filters = row_filters(lab_session, consent)
+    options = f"StartSel={START}, StopSel={STOP}, MaxWords={SEARCH_SNIPPET_WORDS * 2}, " \
+              f"MinWords={SEARCH_SNIPPET_WORDS // 2}, MaxFragments=2, FragmentDelimiter=\" … \""
+    headlines = ", ".join(
+        f"CASE WHEN to_tsvector('english'::regconfig, coalesce(page.{field}, '')) @@ page.q "
+        f"THEN ts_headline('english', page.{field}, page.q, :options) END AS {field}"
+        for field in TEXT_FIELDS
+    )
+    if ranked:
+        rank, bounded, order = "ts_rank_cd(r.search_vector, q.q)", "r.id >= :bound", "rank DESC, r.id DESC"
+    else:
+        rank, bounded, order = "NULL::real", "r.id < :bound", "r.id DESC"
+    sql = f"""
+        SELECT page.id, page."timestamp", page.lab_session, page.rank, {headlines}
+        FROM (
+            SELECT r.id, r."timestamp", r.lab_session, {", ".join("r." + field for field in TEXT_FIELDS)},
+                   q.q, {rank} AS rank
+            FROM {TABLE} r, websearch_to_tsquery('english', :query) AS q(q)
+            WHERE r.search_vector @@ q.q{filters} AND {bounded}
+            ORDER BY {order}
+            LIMIT :limit OFFSET :offset
+        ) AS page
+        ORDER BY page.rank DESC, page.id DESC
+    """
+    params = {"query": query, "lab_session": lab_session, "options": options, "bound": bound,
+              "limit": limit, "offset": offset}
+    return text(sql), params
+
+
+def sqlite_window(query, lab_session, consent):
+    terms, excluded = parse_query(query)
+    filters = row_filters(lab_session, consent)
+    sql = f"""
+        SELECT coalesce(min(w.id), 0) AS bound, count(*) AS matches FROM (
+            SELECT r.id FROM {FTS_TABLE} JOIN {TABLE} r ON r.id = {FTS_TABLE}.rowid
+            WHERE {FTS_TABLE} MATCH :match{filters}
+            ORDER BY {FTS_TABLE}.rowid DESC
+            LIMIT :window
+        ) AS w
+    """
+    return text(sql), {"match": fts5_query(terms, excluded), "lab_session": lab_session,
+                       "window": SEARCH_RANK_WINDOW}
+
+
+def sqlite_search(query, lab_session, consent, limit, offset, bound, ranked):
+    terms, excluded = parse_query(query)
+    filters = row_filters(lab_session, consent)
+    # bm25 is lower-is-better; negated so rank reads the same way as on PostgreSQL.
+    # Matches from bound up are scored (the rowid bound is handed to FTS5); older
+    # ones (ranked=False) come newest first with no rank. Snippets are made for the
+    # returned page alone: the CROSS JOIN keeps FTS5 looking up the page's rowids
+    # instead of every match.
+    snippets = ", ".join(
+        f"snippet({FTS_TABLE}, {column}, :start, :stop, '…', :words) AS {field}"
+        for column, field in enumerate(TEXT_FIELDS)
+    )
+    if ranked:
+        score, bounded, order = f"bm25({FTS_TABLE})", f"{FTS_TABLE}.rowid >= :bound", "score, r.id DESC"
+    else:
+        score, bounded, order = "NULL", f"{FTS_TABLE}.rowid < :bound", "r.id DESC"
+    sql = f"""
+        WITH page AS (
+            SELECT r.id, {score} AS score
+            FROM {FTS_TABLE} JOIN {TABLE} r ON r.id = {FTS_TABLE}.rowid
+            WHERE {FTS_TABLE} MATCH :match AND {bounded}{filters}
+            ORDER BY {order}
+            LIMIT :limit OFFSET :offset
+        )
+        SELECT r.id, r."timestamp", r.lab_session, -page.score AS rank, {snippets}
+        FROM page
+        CROSS JOIN {FTS_TABLE}
+        JOIN {TABLE} r ON r.id = page.id
+        WHERE {FTS_TABLE} MATCH :match AND {FTS_TABLE}.rowid = page.id
+        ORDER BY page.score, r.id DESC
+    """
+    params = {
+        "match": fts5_query(terms, excluded), "lab_session": lab_session, "start": START, "stop": STOP,
+        "words": SEARCH_SNIPPET_WORDS * 2, "bound": bound, "limit": limit, "offset": offset,
+    }
+    return text(sql), params
+
+
+BACKENDS = {"postgresql": (postgres_window, postgres_search), "sqlite": (sqlite_window, sqlite_search)}
+
+
+async def search_responses(db, backend, query, lab_session=None, consent=None, limit=20, offset=0):
+    """Matches for ``query`` with highlighted snippets of the fields that matched.
+
+    The newest SEARCH_RANK_WINDOW matching responses come first, best ranked
+    first; paging on past them lists the older matches newest first, with
+    rank None. Returns (results, next_offset); next_offset is None on the last page.
+    """
+    builders = BACKENDS.get(backend)
+    if builders is None:
+        raise SearchQueryError(f"Full-text search is not available on {backend}")
+    if not query or not query.strip():
+        raise SearchQueryError("Search for at least one word or phrase")
+    window, build = builders
+    limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+    offset = max(0, offset)
+    if backend == "postgresql":
+        # A cached generic plan can't see how selective the terms are and picks
+        # badly for common words; plan each search for its actual query
+        await db.execute(text("SET LOCAL plan_cache_mode = force_custom_plan"))
+    statement, params = window(query, lab_session, consent)
+    bound, ranked_matches = (await db.execute(statement, params)).one()
+
+    # One row past the page tells whether there is another page
+    rows = []
+    if offset < ranked_matches:
+        statement, params = build(query, lab_session, consent, limit + 1, offset, bound, ranked=True)
+        rows = (await db.execute(statement, params)).all()
+    # A full window may have older matches below it
+    if len(rows) <= limit and ranked_matches == SEARCH_RANK_WINDOW:
+        statement, params = build(query, lab_session, consent, limit + 1 - len(rows),
+                                  max(0, offset - ranked_matches), bound, ranked=False)
+        rows += (await db.execute(statement, params)).all()
+
+    results = []
+    for row in rows[:limit]:
+        snippets = {
+            field: highlight(getattr(row, field))
+            for field in TEXT_FIELDS
+            if getattr(row, field) and START in getattr(row, field)
+        }
+        results.append({
+            "id": row.id,
+            "timestamp": row.timestamp,
+            "lab_session": row.lab_session,
+            "rank": None if row.rank is None else round(float(row.rank), 6),
+            "snippets": snippets,
+        })
+    return results, (offset + limit if len(rows) > limit else None)
@@ -0,0 +1,272 @@
+import argparse
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select
+
+from database import FIT5122SurveyResponse, env_int, stream_partitions
+from metrics import SNAPSHOT_BYTES, SNAPSHOT_ROWS
+from stats import RATING_QUESTIONS, summarise
+
+logger = logging.getLogger(__name__)
+
+# Reads refresh the snapshot first once it is older than this
+SNAPSHOT_MAX_STALENESS = env_int("SNAPSHOT_MAX_STALENESS", 10)
+# Ids are taken before commit, so a lower id can become visible after a
+# higher one has been read; rows this recent are read again on every refresh
+SNAPSHOT_SETTLE_SECONDS = env_int("SNAPSHOT_SETTLE_SECONDS", 60)
+SNAPSHOT_CHUNK_SIZE = env_int("SNAPSHOT_CHUNK_SIZE", 10000)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+NAIVE_EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+UNSPECIFIED = "unspecified"
+COLUMNS = ("ids", "timestamps", "lab_codes", "participated", "consented", "ratings", "answered")
+
+
+def epoch_us(moment):
+    if moment is None:
+        return 0
+    # SQLite hands timestamps back naive; they were written in UTC
+    return (moment - (EPOCH if moment.tzinfo is not None else NAIVE_EPOCH)) // MICROSECOND
+
+
+class ColumnarSnapshot:
+    """Read-side copy of the responses table as NumPy columns.
+
+    Only what analytics reads is kept: ``ratings`` is one int8 row per
+    question with ``answered`` as its null mask, ``lab_codes`` indexes
+    ``labels`` (seeded with the known lab sessions, -1 for none; int32,
+    as the API accepts any lab_session) and timestamps are int64
+    microseconds since the epoch, about 32 bytes a response. Refreshes
+    read only rows past the id watermark; the rows of the last
+    ``settle_seconds`` are read again each time so a late commit with a
+    lower id is not lost. Columns are replaced in one step after the
+    database reads, so a reader never sees a refresh half done.
+    """
+
+    def __init__(self, labels=(), max_staleness=SNAPSHOT_MAX_STALENESS,
+                 settle_seconds=SNAPSHOT_SETTLE_SECONDS, chunk_size=SNAPSHOT_CHUNK_SIZE):
+        self.max_staleness = max_staleness
+        self.settle_seconds = settle_seconds
+        self.chunk_size = chunk_size
+        self.labels = list(dict.fromkeys(labels))
+        self.codes = {label: code for code, label in enumerate(self.labels)}
+        self.size = 0
+        # Allocated by the first refresh, so building one doesn't import NumPy
+        self.ids = self.timestamps = self.lab_codes = self.participated = self.consented = None
+        self.ratings = self.answered = None
+        # (monotonic time, size, last id) after each refresh; the newest one
+        # older than the settle window is where the next refresh reads from
+        self.marks = deque()
+        self.settled = (0, 0)
+        self.refreshed_at = None
+        self._lock = asyncio.Lock()
+
+    def code(self, label):
+        if label is None:
+            return -1
+        code = self.codes.get(label)
+        if code is None:
+            code = self.codes[label] = len(self.labels)
+            self.labels.append(label)
+        return code
+
+    def _allocate(self):
+        import numpy as np
+
+        self.ids = np.empty(0, dtype=np.int64)
+        self.timestamps = np.empty(0, dtype=np.int64)
+        self.lab_codes = np.empty(0, dtype=np.int32)
+        self.participated = np.empty(0, dtype=bool)
+        self.consented = np.empty(0, dtype=bool)
+        self.ratings = np.empty((len(RATING_QUESTIONS), 0), dtype=np.int8)
+        self.answered = np.empty((len(RATING_QUESTIONS), 0), dtype=bool)
+
+    def encode(self, rows):
+        """Column arrays for rows of (id, timestamp, participated_fully, consent_given, lab_session, *ratings)."""
+        import numpy as np
+
+        n = len(rows)
+        columns = list(zip(*rows))
+        ratings = np.empty((len(RATING_QUESTIONS), n), dtype=np.int8)
+        answered = np.empty((len(RATING_QUESTIONS), n), dtype=bool)
+        for q, values in enumerate(columns[5:]):
+            # None becomes NaN, which fails the range check like any out-of-range value
+            values = np.array(values, dtype=float)
+            answered[q] = (values >= 1) & (values <= 5)
+            ratings[q] = np.where(answered[q], values, 0)
+        return {
+            "ids": np.fromiter(columns[0], dtype=np.int64, count=n),
+            "timestamps": np.fromiter((epoch_us(moment) for moment in columns[1]), dtype=np.int64, count=n),
+            "participated": np.fromiter((bool(v) for v in columns[2]), dtype=bool, count=n),
+            "consented": np.fromiter((bool(v) for v in columns[3]), dtype=bool, count=n),
+            "lab_codes": np.fromiter((self.code(v) for v in columns[4]), dtype=np.int32, count=n),
+            "ratings": ratings,
+            "answered": answered,
+        }
+
+    def _replace_tail(self, start, chunks):
+        import numpy as np
+
+        # Synchronous from here on: readers see the old columns or the new, nothing between
+        size = start + sum(len(chunk["ids"]) for chunk in chunks)
+        if size > self.ids.shape[-1]:
+            capacity = max(size, 2 * self.ids.shape[-1], 1024)
+            for name in COLUMNS:
+                old = getattr(self, name)
+                new = np.zeros(old.shape[:-1] + (capacity,), dtype=old.dtype)
+                new[..., :start] = old[..., :start]
+                setattr(self, name, new)
+        position = start
+        for chunk in chunks:
+            end = position + len(chunk["ids"])
+            for name, values in chunk.items():
+                getattr(self, name)[..., position:end] = values
+            position = end
+        self.size = size
+
+    async def refresh(self):
+        """Read the rows past the settled watermark and replace the tail with them."""
+        import numpy as np
+
+        if self.ids is None:
+            self._allocate()
+        started = time.monotonic()
+        while self.marks and self.marks[0][0] <= started - self.settle_seconds:
+            _, size, last_id = self.marks.popleft()
+            self.settled = (size, last_id)
+        start, after = self.settled
+
+        table = FIT5122SurveyResponse.__table__
+        query = (select(table.c.id, table.c.timestamp, table.c.participated_fully, table.c.consent_given,
+                        table.c.lab_session, *(table.c[q] for q in RATING_QUESTIONS))
+                 .where(table.c.id > after).order_by(table.c.id))
+        chunks = []
+        async for rows in stream_partitions(query, self.chunk_size, read=True):
+            chunks.append(self.encode(rows))
+        self._replace_tail(start, chunks)
+
+        if self.refreshed_at is None:
+            # First load: rows written before the settle window are settled already
+            cutoff = epoch_us(datetime.now(timezone.utc)) - self.settle_seconds * 1_000_000
+            young = self.timestamps[:self.size] >= cutoff
+            settled = int(np.argmax(young)) if young.any() else self.size
+            if settled:
+                self.settled = (settled, int(self.ids[settled - 1]))
+        last_id = int(self.ids[self.size - 1]) if self.size else after
+        self.marks.append((started, self.size, last_id))
+        self.refreshed_at = started
+        SNAPSHOT_ROWS.set(self.size)
+        SNAPSHOT_BYTES.set(self.memory()["allocated_bytes"])
+        return self.size - start
+
+    async def current(self):
+        """The snapshot, refreshed first if it is older than ``max_staleness``."""
+        if self.refreshed_at is None or time.monotonic() - self.refreshed_at >= self.max_staleness:
+            async with self._lock:
+                if self.refreshed_at is None or time.monotonic() - self.refreshed_at >= self.max_staleness:
+                    await self.refresh()
+        return self
+
+    def memory(self):
+        if self.ids is None:
+            return {"rows": 0, "bytes": 0, "allocated_bytes": 0, "bytes_per_100k_rows": None}
+        used = sum(getattr(self, name)[..., :self.size].nbytes for name in COLUMNS)
+        allocated = sum(getattr(self, name).nbytes for name in COLUMNS)
+        return {
+            "rows": self.size,
+            "bytes": used,
+            "allocated_bytes": allocated,
+            "bytes_per_100k_rows": round(used / self.size * 100000) if self.size else None,
+        }
+
+    # --- vectorized primitives; all take and return arrays over the first ``size`` rows
+
+    def where(self, since=None, until=None, lab_session=None, consent=None, participated_fully=None):
+        """Boolean row mask; the arguments mean what they do for export.build_query."""
+        import numpy as np
+
+        n = self.size
+        mask = np.ones(n, dtype=bool)
+        if since is not None:
+            mask &= self.timestamps[:n] >= epoch_us(since)
+        if until is not None:
+            mask &= self.timestamps[:n] < epoch_us(until)
+        if lab_session is not None:
+            code = self.codes.get(lab_session)
+            if code is None:
+                return np.zeros(n, dtype=bool)
+            mask &= self.lab_codes[:n] == code
+        if consent is not None:
+            mask &= self.consented[:n] == consent
+        if participated_fully is not None:
+            mask &= self.participated[:n] == participated_fully
+        return mask
+
+    def groups(self, by):
+        """(group index per row, group names) for "lab_session" or "participated_fully"."""
+        import numpy as np
+
+        n = self.size
+        if by == "lab_session":
+            # Code -1 (no session given) becomes group 0
+            return self.lab_codes[:n].astype(np.intp) + 1, [UNSPECIFIED] + self.labels
+        if by == "participated_fully":
+            return self.participated[:n].astype(np.intp), ["false", "true"]
+        raise ValueError(f"Cannot group by {by}")
+
+    def histograms(self, mask=None, groups=None, n_groups=1):
+        """Rating counts as an int64 array of shape (n_groups, questions, 5)."""
+        import numpy as np
+
+        n = self.size
+        counts = np.zeros((n_groups, len(RATING_QUESTIONS), 5), dtype=np.int64)
+        for q in range(len(RATING_QUESTIONS)):
+            selected = self.answered[q, :n] if mask is None else self.answered[q, :n] & mask
+            bins = self.ratings[q, :n][selected].astype(np.intp) - 1
+            if groups is not None:
+                bins += groups[selected] * 5
+            counts[:, q] = np.bincount(bins, minlength=n_groups * 5).reshape(n_groups, 5)
+        return counts
+
+    def rating_stats(self, mask=None):
+        """Same shape as stats.rating_stats.snapshot(), over the rows in ``mask``."""
+        result = {"overall": {}, "by_lab_session": {}, "by_participated_fully": {}}
+        overall = self.histograms(mask)[0]
+        for q, question in enumerate(RATING_QUESTIONS):
+            result["overall"][question] = summarise(overall[q].tolist())
+        for by in ("lab_session", "participated_fully"):
+            groups, names = self.groups(by)
+            counts = self.histograms(mask, groups, len(names))
+            for g, name in enumerate(names):
+                # Like the stored histograms, a group lists only the questions it has answers to
+                answered = {question: summarise(counts[g, q].tolist())
+                            for q, question in enumerate(RATING_QUESTIONS) if counts[g, q].any()}
+                if answered:
+                    result[f"by_{by}"][name] = answered
+        result["age_seconds"] = round(time.monotonic() - self.refreshed_at, 1)
+        return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the columnar snapshot and report its size")
+    parser.add_argument("--chunk-size", type=int, default=SNAPSHOT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    async def main():
+        import database
+
+        snapshot = ColumnarSnapshot(chunk_size=args.chunk_size)
+        started = time.perf_counter()
+        await snapshot.refresh()
+        elapsed = time.perf_counter() - started
+        await database.dispose_engines()
+        return snapshot.memory(), elapsed
+
+    memory, elapsed = asyncio.run(main())
+    print(f"Loaded {memory['rows']} responses in {elapsed:.2f}s: {memory['bytes']} bytes "
+          f"({memory['bytes_per_100k_rows']} per 100k rows, {memory['allocated_bytes']} allocated)")
@@ -0,0 +1,232 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+from database import env_bool, env_int
+
+logger = logging.getLogger(__name__)
+
+# Submissions are written here while the database is unreachable, and
+# replayed into it once it is back (see ingest.SpoolReplayer)
+SPOOL_ENABLED = env_bool("SPOOL_ENABLED", True)
+# Set it to a persistent volume: the default, inside the app directory, is
+# replaced on every deploy (on Railway, say), losing whatever is still spooled
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+SPOOL_DIR = os.getenv("SPOOL_DIR") or os.path.join(APP_DIR, "spool")
+# A segment is closed and a new one started past this size
+SPOOL_SEGMENT_BYTES = env_int("SPOOL_SEGMENT_BYTES", 16 * 1024 * 1024)
+# Appends made while an fsync runs already share the next one; a window
+# above 0 also waits this long for more before syncing
+SPOOL_FSYNC_MS = env_int("SPOOL_FSYNC_MS", 0)
+# Past this much pending data new submissions are refused rather than filling the disk
+SPOOL_MAX_BYTES = env_int("SPOOL_MAX_BYTES", 1024 * 1024 * 1024)
+
+SEGMENT_SUFFIX = ".ndjson"
+REJECTED_SUFFIX = ".rejected"
+
+
+class SpoolFull(Exception):
+    pass
+
+
+def encode(row):
+    return json.dumps(row, separators=(",", ":"), default=str).encode() + b"\n"
+
+
+def decode(line):
+    row = json.loads(line)
+    if row.get("timestamp"):
+        row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+    return row
+
+
+class Spool:
+    """Append-only write-ahead log of survey rows, one NDJSON record per line.
+
+    Each process appends to its own segment (``<created ms>-<pid>-<n>.ndjson``),
+    holding an flock on it while it is open. Concurrent appends are made
+    durable by a single fsync (group commit), and append() returns only
+    after the fsync covering its rows. Closed segments are claimed by
+    whichever process's replayer locks them first and are deleted once every
+    record is in the database. A torn last line (a crash mid-append) is
+    skipped on read.
+    """
+
+    def __init__(self, directory=SPOOL_DIR, segment_bytes=SPOOL_SEGMENT_BYTES,
+                 fsync_ms=SPOOL_FSYNC_MS, max_bytes=SPOOL_MAX_BYTES):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_window = fsync_ms / 1000
+        self.max_bytes = max_bytes
+        self.fd = None
+        self.segment = None
+        self.segment_size = 0
+        self.segments_opened = 0
+        self.sync_future = None
+        self.records_written = 0
+        self._lock = asyncio.Lock()
+
+    async def append(self, rows):
+        """Write rows to the current segment; returns once they are on disk."""
+        if self.pending_bytes() >= self.max_bytes:
+            raise SpoolFull(f"spool holds more than {self.max_bytes} bytes")
+        now = datetime.now(timezone.utc).isoformat()
+        # The database would stamp replayed rows with the replay time instead
+        data = b"".join(encode({**row, "timestamp": row.get("timestamp") or now}) for row in rows)
+        async with self._lock:
+            if self.fd is None or self.segment_size + len(data) > self.segment_bytes:
+                await self._close()
+                self._open()
+            os.write(self.fd, data)
+            self.segment_size += len(data)
+            self.records_written += len(rows)
+            if self.sync_future is None:
+                self.sync_future = asyncio.get_running_loop().create_future()
+                asyncio.create_task(self._sync(self.sync_future))
+            future = self.sync_future
+        await asyncio.shield(future)
+
+    async def _sync(self, future):
+        # Let concurrent appends join this fsync, then detach it so later appends wait for the next
+        await asyncio.sleep(self.fsync_window)
+        async with self._lock:
+            if future.done():
+                # _close() synced these appends along with their segment
+                return
+            self.sync_future = None
+            try:
+                await asyncio.to_thread(os.fsync, self.fd)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(None)
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.segments_opened += 1
+        name = f"{int(time.time() * 1000):013d}-{os.getpid()}-{self.segments_opened}{SEGMENT_SUFFIX}"
+        self.segment = os.path.join(self.directory, name)
+        self.fd = os.open(self.segment, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        # Keeps other processes' replayers off the segment while it is written
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        self.segment_size = 0
+        fsync_directory(self.directory)
+
+    async def _close(self):
+        # Caller holds the lock; anything not yet synced is synced before the fd goes
+        if self.fd is None:
+            return
+        future, self.sync_future = self.sync_future, None
+        await asyncio.to_thread(os.fsync, self.fd)
+        os.close(self.fd)
+        self.fd = self.segment = None
+        if future is not None and not future.done():
+            future.set_result(None)
+
+    async def seal(self):
+        """Close the current segment so it can be replayed."""
+        async with self._lock:
+            await self._close()
+
+    def segments(self):
+        """Paths of the pending segments, oldest first."""
+        try:
+            names = sorted(name for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX))
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.directory, name) for name in names]
+
+    def pending_bytes(self):
+        total = 0
+        for path in self.segments():
+            try:
+                total += os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+        return total
+
+    def ephemeral(self):
+        """True if the spool lives inside the app directory, which a redeploy replaces."""
+        directory = os.path.realpath(self.directory)
+        return os.path.commonpath([directory, os.path.realpath(APP_DIR)]) == os.path.realpath(APP_DIR)
+
+    def status(self):
+        segments = self.segments()
+        oldest = None
+        if segments:
+            created_ms = int(os.path.basename(segments[0]).split("-", 1)[0])
+            oldest = round(max(0.0, time.time() - created_ms / 1000), 1)
+        return {"segments": len(segments), "pending_bytes": self.pending_bytes(), "oldest_seconds": oldest}
+
+    def claim(self, path):
+        """Open a closed segment for replay; None if another process has it."""
+        try:
+            fd = os.open(path, os.O_RDWR)
+        except FileNotFoundError:
+            return None
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        if not os.path.exists(path):
+            # Replayed and deleted between listdir and the lock
+            os.close(fd)
+            return None
+        return ClaimedSegment(path, fd)
+
+
+class ClaimedSegment:
+    """A segment locked by this process's replayer; close() releases it."""
+
+    def __init__(self, path, fd):
+        self.path = path
+        self.fd = fd
+
+    def records(self):
+        with os.fdopen(os.dup(self.fd), "rb") as f:
+            lines = f.read().split(b"\n")
+        rows = []
+        # The last element is what follows the final newline: empty, or a torn append
+        for number, line in enumerate(lines[:-1], start=1):
+            try:
+                rows.append(decode(line))
+            except ValueError:
+                logger.warning("Skipping unreadable spool record",
+                               extra={"segment": os.path.basename(self.path), "line": number})
+        if lines[-1]:
+            logger.warning("Skipping incomplete last spool record", extra={"segment": os.path.basename(self.path)})
+        return rows
+
+    def reject(self, rows):
+        # Rows the database refused; kept for an operator instead of being retried forever
+        with open(self.path + REJECTED_SUFFIX, "ab") as f:
+            f.write(b"".join(encode(row) for row in rows))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def remove(self):
+        os.unlink(self.path)
+        fsync_directory(os.path.dirname(self.path))
+        self.close()
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def fsync_directory(path):
+    # Makes a file's creation or removal durable, not just its contents
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+spool = Spool() if SPOOL_ENABLED else None
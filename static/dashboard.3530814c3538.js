@@ -0,0 +1,2 @@
+document.addEventListener('DOMContentLoaded',function(){const status=document.getElementById('live-status');const total=document.getElementById('total-responses');const added=document.getElementById('new-responses');const source=new EventSource('/events');source.addEventListener('open',function(){status.textContent='Live';});source.addEventListener('error',function(){status.textContent='Reconnecting…';});source.addEventListener('update',function(event){const update=JSON.parse(event.data);status.textContent='Live';total.textContent=update.total_responses===null?'–':update.total_responses;added.textContent=update.new_responses>0?'+'+update.new_responses+' just now':'';document.querySelectorAll('[data-question]').forEach(row=>{const rating=update.ratings[row.dataset.question];if(!rating){return;}
+const hasMean=rating.mean!==null&&rating.mean!==undefined;row.querySelector('.rating-mean').textContent=hasMean?rating.mean.toFixed(2):'–';row.querySelector('.rating-count').textContent='('+rating.count+')';row.querySelector('.rating-bar').style.width=hasMean?(rating.mean/5*100)+'%':'0%';});});});
\ No newline at end of file
@@ -0,0 +1,220 @@
+import argparse
+import asyncio
+import random
+import time
+
+from sqlalchemy import delete, func, insert, select, text
+
+import database
+from database import FIT5122RatingSummary, FIT5122SurveyResponse, dialect_insert, env_int, new_read_session
+
+RATING_QUESTIONS = (
+    "unit_content_quality",
+    "teaching_effectiveness",
+    "assessment_fairness",
+    "learning_resources",
+    "overall_experience",
+)
+HISTOGRAM_COLUMNS = ("h1", "h2", "h3", "h4", "h5")
+
+# Workers reload the persisted summary at most this often to see each other's inserts
+STATS_MAX_STALENESS = env_int("STATS_MAX_STALENESS", 30)
+# Each insert adds to one randomly chosen copy of the summary rows, so
+# concurrent transactions rarely wait on each other's row locks
+RATING_SUMMARY_SHARDS = env_int("RATING_SUMMARY_SHARDS", 16)
+
+
+def group_keys(lab_session, participated_fully):
+    return (
+        "all",
+        f"lab_session:{lab_session or ''}",
+        f"participated_fully:{'true' if participated_fully else 'false'}",
+    )
+
+
+def histogram_deltas(rows):
+    """Per-(group, question) histogram increments for a batch of new responses."""
+    deltas = {}
+    for row in rows:
+        keys = group_keys(row.get("lab_session"), row.get("participated_fully"))
+        for question in RATING_QUESTIONS:
+            value = row.get(question)
+            if value is None or not 1 <= value <= 5:
+                continue
+            for key in keys:
+                deltas.setdefault((key, question), [0] * 5)[value - 1] += 1
+    return deltas
+
+
+def summarise(histogram):
+    n = sum(histogram)
+    if n == 0:
+        return {"count": 0, "mean": None, "variance": None,
+                "histogram": {str(i): 0 for i in range(1, 6)}}
+    total = sum(i * h for i, h in enumerate(histogram, start=1))
+    total_sq = sum(i * i * h for i, h in enumerate(histogram, start=1))
+    mean = total / n
+    return {
+        "count": n,
+        "mean": round(mean, 4),
+        "variance": round(total_sq / n - mean * mean, 4),
+        "histogram": {str(i): h for i, h in enumerate(histogram, start=1)},
+    }
+
+
+class RatingStats:
+    """In-memory 1-5 histograms for every rating question and breakdown group.
+
+    Each insert adds its deltas to ``fit5122_rating_summary`` in the same
+    transaction as the response row, then to the in-memory copy once that
+    transaction commits. The persisted rows are split over ``shards``
+    copies, one picked at random per transaction, and loading sums them,
+    so concurrent inserts only wait on each other when they pick the same
+    shard. Reads never scan the responses table.
+    """
+
+    def __init__(self, max_staleness=STATS_MAX_STALENESS, shards=RATING_SUMMARY_SHARDS):
+        self.max_staleness = max_staleness
+        self.shards = max(1, shards)
+        self.histograms = {}
+        self.loaded_at = None
+        self._lock = asyncio.Lock()
+
+    async def record(self, db, rows):
+        # Call before commit; pass the returned deltas to apply() after commit
+        deltas = histogram_deltas(rows)
+        if not deltas:
+            return deltas
+        stmt = dialect_insert(database.DB_BACKEND)(FIT5122RatingSummary)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["group_key", "question", "shard"],
+            set_={col: getattr(FIT5122RatingSummary, col) + getattr(stmt.excluded, col)
+                  for col in HISTOGRAM_COLUMNS},
+        )
+        # Sorted so concurrent transactions on the same shard lock its rows in the same order
+        shard = random.randrange(self.shards)
+        params = [
+            {"group_key": key, "question": question, "shard": shard, **dict(zip(HISTOGRAM_COLUMNS, counts))}
+            for (key, question), counts in sorted(deltas.items())
+        ]
+        await db.execute(stmt, params)
+        return deltas
+
+    def apply(self, deltas):
+        for key, counts in deltas.items():
+            histogram = self.histograms.setdefault(key, [0] * 5)
+            for i, count in enumerate(counts):
+                histogram[i] += count
+
+    async def load(self):
+        db = new_read_session()
+        try:
+            result = await db.execute(
+                select(FIT5122RatingSummary.group_key, FIT5122RatingSummary.question,
+                       *(func.sum(getattr(FIT5122RatingSummary, col)) for col in HISTOGRAM_COLUMNS))
+                .group_by(FIT5122RatingSummary.group_key, FIT5122RatingSummary.question)
+            )
+            rows = result.all()
+        finally:
+            await db.close()
+        self.histograms = {(key, question): [int(count) for count in counts] for key, question, *counts in rows}
+        self.loaded_at = time.monotonic()
+
+    async def snapshot(self):
+        if self.loaded_at is None or time.monotonic() - self.loaded_at >= self.max_staleness:
+            async with self._lock:
+                if self.loaded_at is None or time.monotonic() - self.loaded_at >= self.max_staleness:
+                    await self.load()
+
+        result = {"overall": {}, "by_lab_session": {}, "by_participated_fully": {}}
+        for question in RATING_QUESTIONS:
+            result["overall"][question] = summarise(self.histograms.get(("all", question), [0] * 5))
+        for (key, question), histogram in self.histograms.items():
+            kind, _, value = key.partition(":")
+            if kind == "lab_session":
+                group = result["by_lab_session"].setdefault(value or "unspecified", {})
+            elif kind == "participated_fully":
+                group = result["by_participated_fully"].setdefault(value, {})
+            else:
+                continue
+            group[question] = summarise(histogram)
+        result["age_seconds"] = round(time.monotonic() - self.loaded_at, 1)
+        return result
+
+
+rating_stats = RatingStats()
+
+
+def compute_histograms(conn, chunk_size=50000):
+    """Recompute every histogram from the responses table with NumPy.
+
+    Rows are streamed in chunks; each chunk is reduced with bincount, so
+    memory stays bounded by ``chunk_size`` regardless of table size.
+    """
+    import numpy as np
+
+    n_questions = len(RATING_QUESTIONS)
+    overall = np.zeros((n_questions, 5), dtype=np.int64)
+    by_participation = np.zeros((2, n_questions, 5), dtype=np.int64)
+    by_lab = np.zeros((0, n_questions, 5), dtype=np.int64)
+    lab_codes = {}
+
+    columns = [FIT5122SurveyResponse.lab_session, FIT5122SurveyResponse.participated_fully]
+    columns += [getattr(FIT5122SurveyResponse, q) for q in RATING_QUESTIONS]
+    result = conn.execution_options(yield_per=chunk_size).execute(select(*columns))
+
+    for chunk in result.partitions():
+        labs = np.fromiter((lab_codes.setdefault(row[0] or "", len(lab_codes)) for row in chunk),
+                           dtype=np.int64, count=len(chunk))
+        participated = np.fromiter((1 if row[1] else 0 for row in chunk), dtype=np.int64, count=len(chunk))
+        # None becomes NaN, then 0, which the range mask below drops
+        ratings = np.nan_to_num(np.array([row[2:] for row in chunk], dtype=float)).astype(np.int64)
+
+        if len(lab_codes) > by_lab.shape[0]:
+            by_lab = np.pad(by_lab, ((0, len(lab_codes) - by_lab.shape[0]), (0, 0), (0, 0)))
+
+        for q in range(n_questions):
+            values = ratings[:, q]
+            valid = (values >= 1) & (values <= 5)
+            bins = values[valid] - 1
+            overall[q] += np.bincount(bins, minlength=5)
+            by_participation[:, q] += np.bincount(participated[valid] * 5 + bins, minlength=10).reshape(2, 5)
+            by_lab[:, q] += np.bincount(labs[valid] * 5 + bins, minlength=len(lab_codes) * 5).reshape(-1, 5)
+
+    histograms = {}
+    for q, question in enumerate(RATING_QUESTIONS):
+        histograms[("all", question)] = overall[q].tolist()
+        histograms[("participated_fully:false", question)] = by_participation[0, q].tolist()
+        histograms[("participated_fully:true", question)] = by_participation[1, q].tolist()
+        for lab, code in lab_codes.items():
+            histograms[(f"lab_session:{lab}", question)] = by_lab[code, q].tolist()
+    return {key: counts for key, counts in histograms.items() if any(counts)}
+
+
+def rebuild(engine, chunk_size=50000):
+    """Recovery path: replace the persisted summary with a full recomputation."""
+    with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            # Block inserts (not reads) so no response is counted twice or missed
+            conn.execute(text("LOCK TABLE fit5122_survey_responses IN SHARE MODE"))
+        histograms = compute_histograms(conn, chunk_size)
+        conn.execute(delete(FIT5122RatingSummary))
+        if histograms:
+            conn.execute(insert(FIT5122RatingSummary), [
+                {"group_key": key, "question": question, "shard": 0, **dict(zip(HISTOGRAM_COLUMNS, counts))}
+                for (key, question), counts in histograms.items()
+            ])
+    return histograms
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rating statistics maintenance")
+    parser.add_argument("--rebuild", action="store_true", help="recompute the summary table from all responses")
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    args = parser.parse_args()
+    if args.rebuild:
+        started = time.perf_counter()
+        histograms = rebuild(database.get_engine(), args.chunk_size)
+        print(f"Rebuilt {len(histograms)} rating histograms in {time.perf_counter() - started:.2f}s")
+    else:
+        parser.print_help()
@@ -0,0 +1,334 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+
+from sqlalchemy import func, select, tuple_
+
+import database
+from database import SurveyDefinition, dialect_insert, env_int, new_session
+from pages import StaticPage
+from templating import render
+
+logger = logging.getLogger(__name__)
+
+SURVEYS_DIR = os.getenv("SURVEYS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "surveys"))
+# Workers pick up definitions published by other processes at most this late
+SURVEY_DEFINITIONS_MAX_STALENESS = env_int("SURVEY_DEFINITIONS_MAX_STALENESS", 60)
+TEXT_MAX_LENGTH = 5000
+
+SLUG_PATTERN = re.compile(r"^[a-z0-9][a-z0-9-]{0,99}$")
+NAME_PATTERN = re.compile(r"^[a-z_][a-z0-9_]{0,49}$")
+QUESTION_TYPES = ("rating", "choice", "boolean", "text", "consent")
+
+
+class SurveyDefinitionError(ValueError):
+    pass
+
+
+class SurveyValidationError(ValueError):
+    def __init__(self, errors):
+        super().__init__("; ".join(f"{name}: {message}" for name, message in errors.items()))
+        self.errors = errors
+
+
+# --- Validation: one parser per question, built once per definition ---
+
+def _blank(raw):
+    return raw is None or (isinstance(raw, str) and raw.strip() == "")
+
+
+def _rating_parser(question):
+    scale = question.get("scale", 5)
+
+    def parse(raw):
+        try:
+            value = int(raw)
+        except ValueError:
+            raise ValueError("must be a whole number") from None
+        if not 1 <= value <= scale:
+            raise ValueError(f"must be between 1 and {scale}")
+        return value
+    return parse
+
+
+def _choice_parser(question):
+    options = frozenset(question["options"])
+
+    def parse(raw):
+        if raw not in options:
+            raise ValueError("is not one of the listed options")
+        return raw
+    return parse
+
+
+def _boolean_parser(question):
+    def parse(raw):
+        value = str(raw).strip().lower()
+        if value not in ("true", "false"):
+            raise ValueError("must be true or false")
+        return value == "true"
+    return parse
+
+
+def _text_parser(question):
+    max_length = question.get("max_length", TEXT_MAX_LENGTH)
+
+    def parse(raw):
+        value = raw.strip()
+        if len(value) > max_length:
+            raise ValueError(f"must be at most {max_length} characters")
+        return value
+    return parse
+
+
+PARSERS = {
+    "rating": _rating_parser,
+    "choice": _choice_parser,
+    "boolean": _boolean_parser,
+    "text": _text_parser,
+}
+
+
+def check_definition(definition):
+    slug = definition.get("slug")
+    if not isinstance(slug, str) or not SLUG_PATTERN.match(slug):
+        raise SurveyDefinitionError(f"invalid slug: {slug!r}")
+    if not isinstance(definition.get("version"), int) or definition["version"] < 1:
+        raise SurveyDefinitionError(f"{slug}: version must be a positive integer")
+    if not definition.get("title"):
+        raise SurveyDefinitionError(f"{slug}: title is required")
+    questions = definition.get("questions")
+    if not questions:
+        raise SurveyDefinitionError(f"{slug}: at least one question is required")
+    seen = set()
+    for question in questions:
+        name, kind = question.get("name"), question.get("type")
+        if not isinstance(name, str) or not NAME_PATTERN.match(name) or name in seen:
+            raise SurveyDefinitionError(f"{slug}: invalid or duplicate question name {name!r}")
+        if kind not in QUESTION_TYPES:
+            raise SurveyDefinitionError(f"{slug}.{name}: unknown type {kind!r}")
+        if kind == "choice" and not question.get("options"):
+            raise SurveyDefinitionError(f"{slug}.{name}: choice questions need options")
+        # Answers run from 1 to scale, so a scale needs at least two points
+        scale = question.get("scale", 5)
+        if kind == "rating" and (not isinstance(scale, int) or isinstance(scale, bool) or scale < 2):
+            raise SurveyDefinitionError(f"{slug}.{name}: scale must be an integer of at least 2")
+        max_length = question.get("max_length", TEXT_MAX_LENGTH)
+        if kind == "text" and (not isinstance(max_length, int) or isinstance(max_length, bool) or max_length < 1):
+            raise SurveyDefinitionError(f"{slug}.{name}: max_length must be a positive integer")
+        seen.add(name)
+
+
+# --- Rendering ---
+
+# What a question's template sees for each key the definition leaves out
+QUESTION_DEFAULTS = {
+    "help": "", "required": False, "scale": 5, "options": (), "choices": ("Yes", "No"),
+    "rows": 4, "max_length": TEXT_MAX_LENGTH, "placeholder": "", "text": "",
+}
+
+
+def page_context(definition):
+    survey = {
+        "slug": definition["slug"],
+        "title": definition["title"],
+        "description": definition.get("description", ""),
+        "thank_you": definition.get("thank_you", "Your feedback has been recorded."),
+    }
+    questions = [{**QUESTION_DEFAULTS, "label": question["name"], **question} for question in definition["questions"]]
+    return {"survey": survey, "questions": questions}
+
+
+def render_form(definition):
+    return render("survey_form.html", **page_context(definition))
+
+
+def render_thank_you(definition):
+    return render("survey_thank_you.html", **page_context(definition))
+
+
+def render_errors(definition, errors):
+    return render("survey_errors.html", errors=errors, **page_context(definition))
+
+
+class CompiledSurvey:
+    """A survey definition turned into a validator and lazily built pages.
+
+    Built once per (slug, version); requests only look it up. Answers are
+    stored as a positional list in question order, so the row holds values
+    only, never the question names.
+    """
+
+    def __init__(self, definition):
+        check_definition(definition)
+        self.definition = definition
+        self.slug = definition["slug"]
+        self.version = definition["version"]
+        self.title = definition["title"]
+        self.names = [question["name"] for question in definition["questions"]]
+        self.fields = [
+            (question["name"], question["type"], bool(question.get("required")),
+             PARSERS[question["type"]](question) if question["type"] in PARSERS else None)
+            for question in definition["questions"]
+        ]
+        self._form_page = None
+        self._thank_you_page = None
+
+    @property
+    def form_page(self):
+        if self._form_page is None:
+            self._form_page = StaticPage(render_form(self.definition))
+        return self._form_page
+
+    @property
+    def thank_you_page(self):
+        if self._thank_you_page is None:
+            self._thank_you_page = StaticPage(render_thank_you(self.definition))
+        return self._thank_you_page
+
+    def validate(self, form):
+        """Parse submitted form values into the stored answers list."""
+        answers, errors = [], {}
+        for name, kind, required, parse in self.fields:
+            raw = form.get(name)
+            if raw is not None and not isinstance(raw, str):
+                # A multipart form can send any field as a file
+                errors[name] = "must be a plain form value"
+                answers.append(None)
+                continue
+            if kind == "consent":
+                value = not _blank(raw) and str(raw).lower() not in ("false", "0", "off")
+                if required and not value:
+                    errors[name] = "is required"
+                answers.append(value)
+                continue
+            if _blank(raw):
+                if required:
+                    errors[name] = "is required"
+                answers.append(None)
+                continue
+            try:
+                answers.append(parse(raw))
+            except ValueError as e:
+                errors[name] = str(e)
+                answers.append(None)
+        if errors:
+            raise SurveyValidationError(errors)
+        return answers
+
+    def decode(self, answers):
+        return dict(zip(self.names, answers))
+
+
+# --- Loading definitions ---
+
+def load_definition_files(directory=SURVEYS_DIR):
+    definitions = []
+    if not os.path.isdir(directory):
+        return definitions
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".json"):
+            continue
+        with open(os.path.join(directory, name)) as f:
+            definitions.append(json.load(f))
+    return definitions
+
+
+async def publish_definitions(definitions):
+    """Store definitions that are not in survey_definitions yet; existing versions are never changed."""
+    published = 0
+    db = new_session()
+    try:
+        for definition in definitions:
+            try:
+                check_definition(definition)
+            except SurveyDefinitionError as e:
+                logger.warning("Skipping survey definition: %s", e)
+                continue
+            stmt = dialect_insert(database.DB_BACKEND)(SurveyDefinition).values(
+                slug=definition["slug"], version=definition["version"], definition=definition,
+            ).on_conflict_do_nothing(index_elements=["slug", "version"])
+            result = await db.execute(stmt)
+            published += result.rowcount or 0
+        await db.commit()
+    finally:
+        await db.close()
+    return published
+
+
+class SurveyRegistry:
+    """Compiled surveys by slug, kept in step with survey_definitions.
+
+    A refresh reads only (slug, latest version) pairs and fetches and
+    compiles the definitions that changed; everything else is reused.
+    """
+
+    def __init__(self, max_staleness=SURVEY_DEFINITIONS_MAX_STALENESS):
+        self.max_staleness = max_staleness
+        self.surveys = {}
+        # (slug, version) pairs that failed check_definition; stored versions never change
+        self.rejected = set()
+        self.refreshed_at = None
+        self._lock = asyncio.Lock()
+
+    async def refresh(self):
+        db = new_session()
+        try:
+            result = await db.execute(
+                select(SurveyDefinition.slug, func.max(SurveyDefinition.version)).group_by(SurveyDefinition.slug)
+            )
+            latest = dict(result.all())
+            changed = [(slug, version) for slug, version in latest.items()
+                       if (slug not in self.surveys or self.surveys[slug].version != version)
+                       and (slug, version) not in self.rejected]
+            rows = []
+            if changed:
+                result = await db.execute(
+                    select(SurveyDefinition.definition)
+                    .where(tuple_(SurveyDefinition.slug, SurveyDefinition.version).in_(changed))
+                )
+                rows = result.scalars().all()
+        finally:
+            await db.close()
+
+        surveys = {slug: survey for slug, survey in self.surveys.items() if slug in latest}
+        for definition in rows:
+            try:
+                survey = CompiledSurvey(definition)
+            except SurveyDefinitionError as e:
+                logger.warning("Invalid survey definition in database: %s", e)
+                self.rejected.add((definition.get("slug"), definition.get("version")))
+                continue
+            surveys[survey.slug] = survey
+        self.surveys = surveys
+        self.refreshed_at = time.monotonic()
+
+    def is_stale(self):
+        return self.refreshed_at is None or time.monotonic() - self.refreshed_at >= self.max_staleness
+
+    async def ensure_fresh(self):
+        if self.is_stale():
+            async with self._lock:
+                # Another caller may have refreshed while we waited for the lock
+                if self.is_stale():
+                    try:
+                        await self.refresh()
+                    except Exception:
+                        # Keep serving what we have; the next attempt waits a full max_staleness
+                        logger.exception("Survey definitions refresh failed; serving the cached ones")
+                        self.refreshed_at = time.monotonic()
+
+    async def get(self, slug):
+        await self.ensure_fresh()
+        return self.surveys.get(slug)
+
+    async def listing(self):
+        await self.ensure_fresh()
+        return [{"slug": s.slug, "version": s.version, "title": s.title}
+                for s in sorted(self.surveys.values(), key=lambda s: s.slug)]
+
+
+survey_registry = SurveyRegistry()
@@ -0,0 +1,71 @@
+import functools
+import os
+import re
+
+from assets import asset_url
+from database import env_bool
+from pages import StaticPage
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+# Compiled templates are shared here by every worker (and kept across restarts);
+# unset uses a per-user directory under the system temp dir
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR") or None
+# Re-read templates that change on disk; only worth it while editing them
+TEMPLATE_AUTO_RELOAD = env_bool("TEMPLATE_AUTO_RELOAD", False)
+
+
+@functools.lru_cache(maxsize=None)
+def get_environment():
+    # Built on the first render, so importing this module doesn't load jinja2
+    from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, StrictUndefined, select_autoescape
+
+    environment = Environment(
+        loader=FileSystemLoader(TEMPLATE_DIR),
+        bytecode_cache=FileSystemBytecodeCache(TEMPLATE_CACHE_DIR),
+        autoescape=select_autoescape(["html"]),
+        auto_reload=TEMPLATE_AUTO_RELOAD,
+        # A misspelt variable fails the render instead of becoming an empty string
+        undefined=StrictUndefined,
+        trim_blocks=True,
+        lstrip_blocks=True,
+    )
+    environment.globals["asset_url"] = asset_url
+    return environment
+
+
+# Indentation is only there for whoever edits the templates; no template keeps
+# text in <pre> or <textarea>, where it would matter
+INDENTATION = re.compile(r"\n[ \t]+")
+
+
+def render(name, **context):
+    return INDENTATION.sub("\n", get_environment().get_template(name).render(**context))
+
+
+@functools.lru_cache(maxsize=None)
+def render_static(name):
+    """HTML of a template that takes no context, rendered once per process."""
+    return render(name)
+
+
+def precompile():
+    """Load every template now, writing the bytecode cache for processes that start later."""
+    environment = get_environment()
+    names = environment.list_templates(extensions=["html"])
+    for name in names:
+        environment.get_template(name)
+    return len(names)
+
+
+class TemplatePage(StaticPage):
+    """A StaticPage whose HTML is rendered from a template on first use."""
+
+    def __init__(self, name, **context):
+        super().__init__(None)
+        self.name = name
+        self.context = context
+
+    def warm(self):
+        if self.html is None:
+            self.html = render(self.name, **self.context)
+        return super().warm()